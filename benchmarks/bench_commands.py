@@ -0,0 +1,248 @@
+# coding=utf-8
+"""Replay lookoutside commands against recorded provider responses.
+
+Run from the repository root::
+
+    python benchmarks/bench_commands.py --rounds 5 --latency 150
+
+A local stand-in HTTP server answers LocationIQ, OneCall and AirNow requests
+from ``benchmarks/fixtures`` after an injected delay. The plugin's transport
+is pointed at it, so no network access is needed. Each command in the script
+runs through a ``MockSopel`` with a real SQLite database. The report gives
+wall time, upstream requests and database calls per command.
+
+Pass ``--cold`` to clear the plugin's caches before every round.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import argparse
+import collections
+import json
+import os
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from common import FIXTURES, make_bot, make_trigger, summarize
+
+# (command, nick, arguments); nicks without a place use their saved location
+SCRIPT = [
+    ('setlocation', 'alice', 'Seattle, US'),
+    ('setlocation', 'bob', '90210'),
+    ('weather', 'alice', ''),
+    ('weather', 'bob', ''),
+    ('weather', 'carol', 'Portland, OR'),
+    ('forecast', 'alice', ''),
+    ('forecast', 'carol', 'portland or'),
+    ('aqi', 'bob', ''),
+    ('aqi', 'dave', 'London'),
+    ('weather', 'dave', 'london'),
+    ('weather', 'erin', 'seattle us'),
+]
+
+ROUTES = {
+    '/v1/search.php': 'locationiq',
+    '/data/2.5/onecall': 'openweathermap',
+    '/aq/observation/latLong/current/': 'airnow',
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as fixture:
+        return json.load(fixture)
+
+
+def nearest(fixtures, lat, lon):
+    """Return the fixture recorded closest to ``lat``/``lon``, and its distance in degrees."""
+    def distance(key):
+        flat, flon = (float(part) for part in key.split(','))
+        return ((flat - lat) ** 2 + (flon - lon) ** 2) ** 0.5
+    key = min(fixtures, key=distance)
+    return fixtures[key], distance(key)
+
+
+class StandIn(ThreadingHTTPServer):
+    """Serves recorded provider responses after a per-provider delay."""
+    daemon_threads = True
+
+    def __init__(self, latency):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.latency = latency
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.locationiq = load_fixture('locationiq.json')
+        self.onecall = load_fixture('onecall.json')
+        self.airnow = load_fixture('airnow.json')
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+    def respond(self, provider, query):
+        from sopel_modules.lookoutside.lookoutside import normalize_location
+
+        if provider == 'locationiq':
+            results = self.locationiq.get(normalize_location(query['q'][0]))
+            if results is None:
+                return 404, {'error': 'Unable to geocode'}
+            return 200, results
+
+        lat, lon = float(query['lat' if provider == 'openweathermap' else 'latitude'][0]), \
+            float(query['lon' if provider == 'openweathermap' else 'longitude'][0])
+        if provider == 'openweathermap':
+            return 200, nearest(self.onecall, lat, lon)[0]
+
+        # AirNow: only answer when a recorded monitor is within the search distance
+        observations, degrees = nearest(self.airnow, lat, lon)
+        if degrees * 69 > float(query['distance'][0]):
+            return 200, []
+        return 200, observations
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        provider = ROUTES.get(parts.path)
+        if provider is None:
+            status, body = 404, {'error': 'no route'}
+        else:
+            with self.server.lock:
+                self.server.calls[provider] += 1
+            time.sleep(self.server.latency.get(provider, 0))
+            status, body = self.server.respond(provider, parse_qs(parts.query))
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class Redirect(object):
+    """Wraps the plugin's transport, sending every request to the stand-in server."""
+
+    def __init__(self, transport, base_url):
+        self.transport = transport
+        self.base_url = base_url
+
+    def get(self, provider, url, params=None, ttl=0, charge=True):
+        parts = urlsplit(url)
+        local = self.base_url + parts.path + ('?' + parts.query if parts.query else '')
+        return self.transport.get(provider, local, params=params, ttl=ttl, charge=charge)
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
+class CountingDB(object):
+    """Counts calls made on the bot database."""
+
+    def __init__(self, db):
+        self.db = db
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self.db, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+
+def run(args):
+    from sopel_modules.lookoutside import lookoutside
+
+    handlers = {
+        'weather': lookoutside.weather_command,
+        'forecast': lookoutside.forecast_command,
+        'aqi': lookoutside.aqi_command,
+        'setlocation': lookoutside.update_location,
+    }
+    latency = {
+        'locationiq': args.latency_locationiq,
+        'openweathermap': args.latency_openweathermap,
+        'airnow': args.latency_airnow,
+    }
+    latency = dict((name, (args.latency if value is None else value) / 1000.0) for name, value in latency.items())
+
+    server = StandIn(latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = collections.defaultdict(lambda: {'times': [], 'upstream': collections.Counter(), 'db': 0})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bot = make_bot(os.path.join(tmpdir, 'bench.db'))
+        lookoutside.setup(bot)
+        bot.memory['lookoutside_http'] = Redirect(bot.memory['lookoutside_http'], server.url)
+        db = bot.db = CountingDB(bot.db)
+
+        try:
+            for _ in range(args.rounds):
+                if args.cold:
+                    for cache in bot.memory['lookoutside_caches'].values():
+                        cache.clear()
+                for command, nick, arguments in SCRIPT:
+                    trigger = make_trigger(bot, nick, '.{} {}'.format(command, arguments).strip())
+                    calls_before, db_before = server.calls.copy(), db.calls
+                    start = time.perf_counter()
+                    handlers[command](bot, trigger)
+                    elapsed = time.perf_counter() - start
+
+                    name = '.{} {}'.format(command, arguments or '(saved)')
+                    results[name]['times'].append(elapsed)
+                    results[name]['upstream'].update(server.calls - calls_before)
+                    results[name]['db'] += db.calls - db_before
+        finally:
+            lookoutside.shutdown(bot)
+            server.shutdown()
+
+    return results, server.calls
+
+
+def report(results, totals, rounds):
+    print('{:<28} {:>4} {:>9} {:>9} {:>9} {:>7} {:>6}  {}'.format(
+        'command', 'n', 'min ms', 'p50 ms', 'max ms', 'up/cmd', 'db/cmd', 'upstream'))
+    for name, result in results.items():
+        count = len(result['times'])
+        print('{:<28} {:>4} {:>9.1f} {:>9.1f} {:>9.1f} {:>7.2f} {:>6.1f}  {}'.format(
+            name[:28], count,
+            *summarize(result['times']) + (
+                sum(result['upstream'].values()) / float(count),
+                result['db'] / float(count),
+                ', '.join('{}={}'.format(*item) for item in sorted(result['upstream'].items())))))
+
+    wall = sum(sum(result['times']) for result in results.values())
+    print()
+    print('{} rounds, {:.1f} ms total wall time, upstream requests: {}'.format(
+        rounds, wall * 1000, ', '.join('{}={}'.format(*item) for item in sorted(totals.items())) or 'none'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--cold', action='store_true', help='clear caches before every round')
+    parser.add_argument('--latency', type=float, default=100, help='injected upstream latency (ms)')
+    parser.add_argument('--latency-locationiq', type=float, default=None, metavar='MS')
+    parser.add_argument('--latency-openweathermap', type=float, default=None, metavar='MS')
+    parser.add_argument('--latency-airnow', type=float, default=None, metavar='MS')
+    args = parser.parse_args()
+
+    results, totals = run(args)
+    report(results, totals, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# coding=utf-8
+"""Measure how long lookoutside takes to import and to set up.
+
+Run from the repository root::
+
+    python benchmarks/bench_startup.py --runs 20
+
+Import time is measured in a fresh interpreter for every run, after Sopel
+itself is imported, since that is what the plugin adds to a bot's startup.
+``setup(bot)`` is timed against a ``MockSopel`` with a throwaway database
+and connection warming turned off.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, make_bot, summarize
+
+IMPORT_SNIPPET = """
+import time
+import sopel.config.types, sopel.module, sopel.tools
+start = time.perf_counter()
+import sopel_modules.lookoutside
+print(time.perf_counter() - start)
+"""
+
+def time_import(runs):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_SNIPPET], cwd=ROOT, env=env)
+        samples.append(float(output))
+    return samples
+
+
+def import_breakdown(limit):
+    """Return the ``limit`` slowest modules imported by the plugin, per ``-X importtime``."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    snippet = 'import sopel.config.types, sopel.module, sopel.tools; import sopel_modules.lookoutside'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', snippet],
+                            cwd=ROOT, env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    rows = []
+    seen = False
+    for line in result.stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        # only count what's imported from the plugin onwards
+        seen = seen or 'sopel_modules' in name
+        if seen:
+            rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def time_setup(runs):
+    from sopel_modules.lookoutside import lookoutside
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bot = make_bot(os.path.join(tmpdir, 'bench.db'))
+        for _ in range(runs):
+            start = time.perf_counter()
+            lookoutside.setup(bot)
+            samples.append(time.perf_counter() - start)
+            lookoutside.shutdown(bot)
+    return samples
+
+
+def report(name, samples):
+    print('{:<8} min {:7.2f} ms   median {:7.2f} ms   max {:7.2f} ms   ({} runs)'.format(
+        name, *summarize(samples) + (len(samples),)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--breakdown', type=int, default=0, metavar='N',
+                        help='also list the N slowest modules imported by the plugin')
+    args = parser.parse_args()
+
+    report('import', time_import(args.runs))
+    report('setup', time_setup(args.runs))
+    if args.breakdown:
+        print()
+        for cumulative, name in import_breakdown(args.breakdown):
+            print('{:9.2f} ms  {}'.format(cumulative / 1000, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# coding=utf-8
+"""Helpers shared by the benchmark scripts."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import contextlib
+import io
+import os
+import re
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+WEATHER_SETTINGS = {
+    'weather_provider': 'openweathermap',
+    'weather_api_key': 'benchmark',
+    'geocoords_api_key': 'benchmark',
+    'airnow_api_key': 'benchmark',
+    'http_warm': 'false',
+}
+
+COMMAND_RE = re.compile(r'\.(\S+)(?: +(.*))?')
+
+
+def make_bot(db_filename, settings=None):
+    """Return a ``MockSopel`` with a real database at ``db_filename``."""
+    import sopel.tools.target  # noqa: F401 -- MockSopel needs it loaded
+    from sopel.db import SopelDB
+    from sopel.test_tools import MockSopel
+
+    # MockSopel is deprecated and says so on stderr; that's just noise here
+    with contextlib.redirect_stderr(io.StringIO()):
+        bot = MockSopel('Sopel')
+    bot.config.parser.set('core', 'db_filename', db_filename)
+    bot.config.parser.add_section('weather')
+    for name, value in dict(WEATHER_SETTINGS, **(settings or {})).items():
+        bot.config.parser.set('weather', name, value)
+    bot.db = SopelDB(bot.config)
+    return bot
+
+
+def make_trigger(bot, nick, text, channel='#bench'):
+    from sopel.tools import Identifier
+    from sopel.trigger import PreTrigger, Trigger
+
+    line = ':{}!{}@example.com PRIVMSG {} :{}'.format(nick, nick.lower(), channel, text)
+    pretrigger = PreTrigger(Identifier(bot.nick), line)
+    return Trigger(bot.config, pretrigger, COMMAND_RE.match(text))
+
+
+def summarize(samples):
+    """Return ``(min, median, max)`` of ``samples`` in milliseconds."""
+    return min(samples) * 1000, statistics.median(samples) * 1000, max(samples) * 1000
@@ -37,6 +37,7 @@ setup(
     packages=find_packages('.'),
     namespace_packages=['sopel_modules'],
     include_package_data=True,
+    python_requires='>=3.6',
     install_requires=requirements,
     tests_require=dev_requirements,
     test_suite='tests',
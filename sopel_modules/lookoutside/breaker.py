@@ -0,0 +1,88 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    """Stops requests to a provider that is failing, so callers fail over at once.
+
+    While closed, the outcomes of the last ``window`` requests are kept; a
+    request that errors, gets a 5xx or takes longer than ``slow_call``
+    seconds is a failure. Once at least ``min_calls`` are recorded and
+    ``error_rate`` of them failed, the breaker opens and refuses everything
+    for ``reset_timeout`` seconds. It then lets a single trial request
+    through (half-open): success closes it, failure opens it again.
+    """
+
+    def __init__(self, error_rate=0.5, min_calls=5, window=20, slow_call=5.0, reset_timeout=30,
+                 clock=time.time):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.trips = 0
+        self.refused = 0
+        self._state = CLOSED
+        self._opened = 0
+        self._trial = False
+        self._outcomes = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return whether a request may be made now; in half-open, only the first caller may."""
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._trial = False
+            if self._state == CLOSED or (self._state == HALF_OPEN and not self._trial):
+                self._trial = self._state == HALF_OPEN
+                return True
+            self.refused += 1
+            return False
+
+    def cancel(self):
+        """Give back an allowed request that was never made."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok, duration=0):
+        """Count the outcome of an allowed request."""
+        failed = not ok or duration > self.slow_call
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial = False
+                if failed:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            if self._state == OPEN:
+                # started before the breaker opened; it has already been judged
+                return
+            self._outcomes.append(failed)
+            if (len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) >= self.error_rate * len(self._outcomes)):
+                self._open()
+
+    def _open(self):
+        # called with the lock held
+        self._state = OPEN
+        self._opened = self.clock()
+        self._outcomes.clear()
+        self.trips += 1
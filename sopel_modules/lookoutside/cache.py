@@ -0,0 +1,135 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """Thread-safe LRU mapping whose entries expire after ``ttl`` seconds.
+
+    Expiry times are wall-clock timestamps so entries can be dumped to the
+    bot database and reloaded after a restart. An expired entry is kept for
+    a further ``stale_ttl`` seconds, where only :meth:`lookup` will return it.
+    """
+
+    def __init__(self, maxsize=128, ttl=3600, clock=time.time, stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > self.clock()
+
+    def _expire(self, key, entry, now):
+        # called with the lock held; drops ``entry`` once it is past its stale window
+        if entry is not None and entry[1] + self.stale_ttl <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            now = self.clock()
+            entry = self._expire(key, self._data.get(key), now)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def lookup(self, key):
+        """Return ``(value, age)``, where age is None for a fresh entry or the seconds since a stale one was set.
+
+        Returns None if there is neither.
+        """
+        with self._lock:
+            now = self.clock()
+            entry = self._expire(key, self._data.get(key), now)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if entry[1] > now:
+                self.hits += 1
+                return entry[0], None
+            self.stale_hits += 1
+            return entry[0], now - entry[2]
+
+    def peek(self, key):
+        """Return ``(value, expires)`` for an unexpired entry, or None, without counting a hit or miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= self.clock():
+                return None
+            return entry[:2]
+
+    def set(self, key, value, ttl=None, expires=None):
+        now = self.clock()
+        if expires is None:
+            expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires, now)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def dump(self):
+        """Return unexpired entries as ``[key, value, expires]`` lists, oldest first."""
+        now = self.clock()
+        with self._lock:
+            return [[key, value, expires]
+                    for key, (value, expires, _) in self._data.items()
+                    if expires > now]
+
+    def load(self, entries):
+        """Restore entries produced by :meth:`dump`, skipping any that have expired."""
+        now = self.clock()
+        for key, value, expires in entries or []:
+            if expires > now:
+                self.set(key, value, expires=expires)
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+
+def grid_key(latitude, longitude, precision=2):
+    """Snap coordinates to a grid cell; ``precision`` is the number of decimals kept.
+
+    Two decimals is a cell of roughly 1km, which is finer than any of the
+    upstream forecast models.
+    """
+    return '{:.{p}f},{:.{p}f}'.format(float(latitude), float(longitude), p=precision)
@@ -0,0 +1,49 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import asyncio
+import concurrent.futures
+import functools
+import threading
+
+
+class Engine(object):
+    """An asyncio event loop running in its own thread.
+
+    Command handlers submit coroutines with :meth:`submit` or :meth:`run` and
+    block on the result; the coroutines fan out on the loop. ``requests`` has
+    no async API, so blocking upstream calls are handed to ``executor`` with
+    :meth:`call` while cache hits are answered on the loop itself.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name='lookoutside-loop')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule ``coro`` on the loop and return a :class:`concurrent.futures.Future`."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run ``coro`` on the loop and wait up to ``timeout`` seconds for its result."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def call(self, function, *args, **kwargs):
+        """Await a blocking ``function`` call from a coroutine, via the worker pool."""
+        return self.loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
@@ -0,0 +1,199 @@
+# coding=utf-8
+"""Offline geocoding for coordinates, US ZIP codes and US city names.
+
+The index is a single file, built once from the GeoNames US postal code
+dump (https://download.geonames.org/export/zip/US.zip)::
+
+    python -m sopel_modules.lookoutside.gazetteer US.txt gazetteer.idx
+
+and memory-mapped at startup, so it costs no memory until pages are read.
+Layout, all little-endian:
+
+* header: magic, record count, key width, offset of the string table
+* prefix table: 257 record indexes, where keys starting with byte ``b``
+  begin (entry 256 is the count)
+* records sorted by key: the NUL-padded normalized key, then latitude,
+  longitude (float32), label offset (uint32) and label length (uint16)
+* string table: UTF-8 labels
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+import io
+import mmap
+import re
+import struct
+import sys
+import threading
+
+MAGIC = b'LOGAZ01\0'
+HEADER = struct.Struct('<8sIHI')
+PREFIX = struct.Struct('<257I')
+RECORD = struct.Struct('<ffIH')
+# longer keys aren't indexed
+MAX_KEY_WIDTH = 48
+
+# ZIP or ZIP+4, optionally followed by the country
+ZIP_RE = re.compile(r'^(\d{5})(?:[ -]?\d{4})?(?: us| usa)?$')
+# "47.6 -122.3", as normalize_location() leaves "47.6, -122.3"
+COORDINATES_RE = re.compile(r'^(-?\d{1,2}(?:\.\d+)?) (-?\d{1,3}(?:\.\d+)?)$')
+
+
+def normalize_location(query):
+    """Reduce a location query to a cache key: "Seattle,  US" and "seattle us" match."""
+    query = query.lower()
+    # keep dots and dashes that belong to numbers so coordinates survive
+    query = re.sub(r'(?<!\d)\.|\.(?!\d)|-(?![\d.])', ' ', query)
+    query = re.sub(r'[^\w\s.-]', ' ', query, flags=re.UNICODE)
+    query = ' '.join(query.split())
+
+    zip_code = ZIP_RE.match(query)
+    if zip_code:
+        return zip_code.group(1)
+    return query
+
+
+def parse_coordinates(key):
+    """Return ``(latitude, longitude, label)`` if normalized ``key`` is a coordinate pair."""
+    match = COORDINATES_RE.match(key)
+    if match is None:
+        return None
+    latitude, longitude = match.groups()
+    if abs(float(latitude)) > 90 or abs(float(longitude)) > 180:
+        return None
+    return latitude, longitude, '{}, {}'.format(latitude, longitude)
+
+
+class Gazetteer(object):
+    """Read-only view of an index file written by :func:`build`."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.key_width, self._strings = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise Exception('Error: {} is not a lookoutside gazetteer'.format(path))
+        self._prefix = PREFIX.unpack_from(self._map, HEADER.size)
+        self._records = HEADER.size + PREFIX.size
+        self._record_size = self.key_width + RECORD.size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, index):
+        offset = self._records + index * self._record_size
+        return self._map[offset:offset + self.key_width].rstrip(b'\0')
+
+    def _find(self, key):
+        key = key.encode('utf-8')
+        if not key or len(key) > self.key_width:
+            return None
+        # the prefix table narrows the search to keys sharing the first byte
+        lo, hi = self._prefix[key[0]], self._prefix[key[0] + 1]
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self._key(middle) < key:
+                lo = middle + 1
+            else:
+                hi = middle
+        if lo < self._prefix[key[0] + 1] and self._key(lo) == key:
+            return lo
+        return None
+
+    def lookup(self, key):
+        """Return ``(latitude, longitude, label)`` for a normalized key, or None."""
+        index = self._find(key)
+        if index is None and key.endswith((' us', ' usa')):
+            index = self._find(key.rsplit(' ', 1)[0])
+        with self._lock:
+            if index is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        latitude, longitude, label_offset, label_length = RECORD.unpack_from(
+            self._map, self._records + index * self._record_size + self.key_width)
+        start = self._strings + label_offset
+        label = self._map[start:start + label_length].decode('utf-8')
+        return '{:.4f}'.format(latitude), '{:.4f}'.format(longitude), label
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def build(entries, path):
+    """Write an index of ``entries``, a mapping of normalized key to ``(latitude, longitude, label)``."""
+    keys = sorted(key.encode('utf-8') for key in entries if len(key.encode('utf-8')) <= MAX_KEY_WIDTH)
+    key_width = max(len(key) for key in keys) if keys else 1
+
+    prefix = [0] * 257
+    for key in keys:
+        prefix[key[0] + 1] += 1
+    for byte in range(256):
+        prefix[byte + 1] += prefix[byte]
+
+    records = io.BytesIO()
+    strings = io.BytesIO()
+    labels = {}
+    for key in keys:
+        latitude, longitude, label = entries[key.decode('utf-8')]
+        if label not in labels:
+            labels[label] = strings.tell()
+            strings.write(label.encode('utf-8'))
+        records.write(key.ljust(key_width, b'\0'))
+        records.write(RECORD.pack(float(latitude), float(longitude), labels[label], len(label.encode('utf-8'))))
+
+    with open(path, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, len(keys), key_width, HEADER.size + PREFIX.size + len(records.getvalue())))
+        output.write(PREFIX.pack(*prefix))
+        output.write(records.getvalue())
+        output.write(strings.getvalue())
+    return len(keys)
+
+
+def geonames_entries(lines):
+    """Turn GeoNames postal code rows into index entries for ZIP codes, "city st" and "city state".
+
+    A city's coordinates are the mean of its ZIP codes'. Bare city names
+    aren't indexed: "London" or "Paris" alone is far more likely to mean
+    somewhere outside the US, so those are left to the upstream geocoder.
+    """
+    entries = {}
+    cities = collections.defaultdict(list)
+    for line in lines:
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 11 or fields[0] != 'US':
+            continue
+        postal_code, place, state, state_code = fields[1], fields[2], fields[3], fields[4]
+        latitude, longitude = float(fields[9]), float(fields[10])
+        label = '{}, {}, US'.format(place, state)
+        entries[normalize_location(postal_code)] = (latitude, longitude, label)
+        cities[place, state, state_code].append((latitude, longitude))
+
+    for (place, state, state_code), points in cities.items():
+        latitude = sum(point[0] for point in points) / len(points)
+        longitude = sum(point[1] for point in points) / len(points)
+        label = '{}, {}, US'.format(place, state)
+        entries[normalize_location('{} {}'.format(place, state_code))] = (latitude, longitude, label)
+        entries[normalize_location('{} {}'.format(place, state))] = (latitude, longitude, label)
+    return entries
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print('usage: python -m sopel_modules.lookoutside.gazetteer US.txt gazetteer.idx', file=sys.stderr)
+        return 2
+    with io.open(argv[0], encoding='utf-8') as source:
+        count = build(geonames_entries(source), argv[1])
+    print('{} keys written to {}'.format(count, argv[1]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
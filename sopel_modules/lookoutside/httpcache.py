@@ -0,0 +1,140 @@
+# coding=utf-8
+"""Upstream responses kept on disk, so a restarted bot doesn't refetch everything.
+
+Entries live in a SQLite database in WAL mode (readers never wait on the
+writer). Keys are hashes of the full request URL, so API keys in query
+strings are never written out.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import email.utils
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    expires REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    used REAL NOT NULL,
+    size INTEGER NOT NULL
+)
+"""
+
+MAX_AGE_RE = re.compile(r'(?:^|,)\s*(s-maxage|max-age)\s*=\s*"?(\d+)', re.IGNORECASE)
+
+# Response headers worth keeping with the body
+KEPT_HEADERS = ('Content-Type', 'Cache-Control', 'Expires', 'ETag', 'Last-Modified', 'Date')
+
+
+def cache_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def freshness(headers, now, default_ttl=0):
+    """Return when a response with ``headers`` stops being fresh, or None if it mustn't be stored.
+
+    ``Cache-Control`` wins over ``Expires``; with neither, the response is
+    fresh for ``default_ttl`` seconds.
+    """
+    cache_control = headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control or 'private' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return now
+    age = headers.get('Age', '')
+    age = int(age) if age.isdigit() else 0
+    max_ages = dict((name.lower(), int(value)) for name, value in MAX_AGE_RE.findall(cache_control))
+    if max_ages:
+        return now + max_ages.get('s-maxage', max_ages.get('max-age')) - age
+    if headers.get('Expires'):
+        expires = email.utils.parsedate_tz(headers['Expires'])
+        # an invalid date (e.g. "0") means already expired
+        return email.utils.mktime_tz(expires) if expires else now
+    return now + default_ttl
+
+
+class DiskCache(object):
+    """Size-capped store of response bodies, evicting the least recently used past ``max_bytes``."""
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, clock=time.time):
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.revalidated = 0
+        self.stale = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(SCHEMA)
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+        self.size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def count(self, outcome):
+        """Add one to the ``hits``, ``revalidated``, ``stale`` or ``misses`` counter."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def get(self, key):
+        """Return ``(headers, body, expires, etag, last_modified)`` for ``key``, fresh or not, or None."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT headers, body, expires, etag, last_modified FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE responses SET used = ? WHERE key = ?', (self.clock(), key))
+        return (json.loads(row[0]), bytes(row[1])) + tuple(row[2:])
+
+    def set(self, key, headers, body, expires):
+        headers = dict((name, headers[name]) for name in KEPT_HEADERS if name in headers)
+        size = len(body) + len(key)
+        with self._lock:
+            old = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, json.dumps(headers), body, expires, headers.get('ETag'), headers.get('Last-Modified'),
+                 self.clock(), size))
+            self.size += size - (old[0] if old else 0)
+            self._evict()
+
+    def refresh(self, key, expires):
+        """Mark ``key`` fresh until ``expires``, after the upstream confirmed it hasn't changed."""
+        with self._lock:
+            self._db.execute('UPDATE responses SET expires = ?, used = ? WHERE key = ?',
+                             (expires, self.clock(), key))
+
+    def delete(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.size -= row[0]
+
+    def _evict(self):
+        # called with the lock held
+        while self.size > self.max_bytes:
+            row = self._db.execute('SELECT key, size FROM responses ORDER BY used LIMIT 1').fetchone()
+            if row is None:
+                break
+            self._db.execute('DELETE FROM responses WHERE key = ?', (row[0],))
+            self.size -= row[1]
+            self.evictions += 1
+
+    def close(self):
+        with self._lock:
+            self._db.close()
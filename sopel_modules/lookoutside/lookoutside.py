@@ -6,44 +6,289 @@
 # Licensed under the Eiffel Forum License 2.
 from __future__ import unicode_literals, absolute_import, print_function, division
 
-import requests
+import datetime
+import functools
 import re
-
-from datetime import datetime
+import threading
+import time
 
 from sopel.config.types import NO_DEFAULT, ChoiceAttribute, StaticSection, ValidatedAttribute
-from sopel.module import commands, example, NOLIMIT
-from sopel.modules.units import c_to_f
-
-from .providers.weather.openweathermap import openweathermap_forecast, openweathermap_weather
-from .providers.weather.airnow import airnow_aqi
-
+from sopel.module import commands, example, interval, NOLIMIT, require_owner
+from sopel.tools import Identifier
+
+from .cache import TTLCache, grid_key
+from .gazetteer import normalize_location, parse_coordinates
+from .metrics import Metrics, write_atomically
+from .prefetch import DECAY_INTERVAL, HeavyHitters, due, record
+from .prefs import get_prefs, reset_prefs, saved_prefs, set_prefs
+from .singleflight import SingleFlight
+from .solar import sun_times
+from .spatial import parse_boxes
+from .timezones import format_time, get_timezone, resolve_timezone, solar_offset
+from .providers import call_chain, call_chain_async, get_provider, provider_names
+from .render import age_marker, forecast_renderer, hourly_renderer, render_many, weather_renderer
+
+# requests, asyncio, pytz and the provider modules are imported on first use
+# (in setup() or later) so loading the plugin stays cheap; see
+# benchmarks/bench_startup.py
+
+# Built-in choices; others can be installed through the provider entry point group
 WEATHER_PROVIDERS = [
     'openweathermap',
 ]
+GEOCOORDS_PROVIDERS = [
+    'locationiq',
+]
+
+# set_plugin_value() checks then inserts, so concurrent saves of the geocache can collide
+_geocache_lock = threading.Lock()
+
+# Bytes of text per reply line; leaves room for the prefix and target under IRC's 512
+MAX_LINE_BYTES = 350
 
 
 # Define our sopel weather configuration
 class WeatherSection(StaticSection):
     geocoords_provider = ValidatedAttribute('geocoords_provider', str, default='locationiq')
     geocoords_api_key = ValidatedAttribute('geocoords_api_key', str, default='')
-    weather_provider = ChoiceAttribute('weather_provider', WEATHER_PROVIDERS, default=NO_DEFAULT)
+    geocoords_region = ChoiceAttribute('geocoords_region', ['us', 'eu'], default='us')
+    weather_provider = ValidatedAttribute('weather_provider', str, default=NO_DEFAULT)
     weather_api_key = ValidatedAttribute('weather_api_key', str, default='')
     weather_units = ValidatedAttribute('weather_units', str, default='')
     airnow_api_key = ValidatedAttribute('airnow_api_key', str, default='')
+    aqi_provider = ValidatedAttribute('aqi_provider', str, default='airnow')
     sunrise_sunset = ValidatedAttribute('sunrise_sunset', str, default=False)
+    geocache_size = ValidatedAttribute('geocache_size', int, default=1000)
+    geocache_ttl = ValidatedAttribute('geocache_ttl', int, default=30 * 24 * 60 * 60)
+    http_connect_timeout = ValidatedAttribute('http_connect_timeout', float, default=3.05)
+    http_read_timeout = ValidatedAttribute('http_read_timeout', float, default=10)
+    http_pool_size = ValidatedAttribute('http_pool_size', int, default=10)
+    http_warm = ValidatedAttribute('http_warm', bool, default=True)
+    # SQLite file of upstream responses kept across restarts, capped at http_cache_mb; '' disables
+    http_cache_file = ValidatedAttribute('http_cache_file', str, default='')
+    http_cache_mb = ValidatedAttribute('http_cache_mb', int, default=50)
+    max_workers = ValidatedAttribute('max_workers', int, default=8)
+    command_timeout = ValidatedAttribute('command_timeout', float, default=30)
+    grid_precision = ValidatedAttribute('grid_precision', int, default=2)
+    onecall_cache_size = ValidatedAttribute('onecall_cache_size', int, default=500)
+    onecall_cache_ttl = ValidatedAttribute('onecall_cache_ttl', int, default=10 * 60)
+    onecall_stale_ttl = ValidatedAttribute('onecall_stale_ttl', int, default=60 * 60)
+    aqi_stale_ttl = ValidatedAttribute('aqi_stale_ttl', int, default=2 * 60 * 60)
+    show_age = ValidatedAttribute('show_age', bool, default=True)
+    prefs_cache_size = ValidatedAttribute('prefs_cache_size', int, default=1000)
+    airnow_max_distance = ValidatedAttribute('airnow_max_distance', int, default=100)
+    airnow_miss_ttl = ValidatedAttribute('airnow_miss_ttl', int, default=6 * 60 * 60)
+    airnow_publish_delay = ValidatedAttribute('airnow_publish_delay', int, default=20 * 60)
+    # "west,south,east,north; ..." boxes (or "all") answered from AirNow's hourly bulk file
+    airnow_regions = ValidatedAttribute('airnow_regions', str, default='')
+    metrics_file = ValidatedAttribute('metrics_file', str, default='')
+    metrics_interval = ValidatedAttribute('metrics_interval', int, default=60)
+    prefetch_size = ValidatedAttribute('prefetch_size', int, default=100)
+    prefetch_budget = ValidatedAttribute('prefetch_budget', int, default=10)
+    prefetch_margin = ValidatedAttribute('prefetch_margin', int, default=90)
+    max_locations = ValidatedAttribute('max_locations', int, default=5)
+    # .hourly shows every hourly_step hours of the next hourly_hours (OneCall has 48)
+    hourly_hours = ValidatedAttribute('hourly_hours', int, default=24)
+    hourly_step = ValidatedAttribute('hourly_step', int, default=3)
+    board_concurrency = ValidatedAttribute('board_concurrency', int, default=4)
+    board_max_areas = ValidatedAttribute('board_max_areas', int, default=10)
+    # per-minute and per-day request limits by provider; 0 (the default) is unlimited
+    locationiq_per_minute = ValidatedAttribute('locationiq_per_minute', int, default=0)
+    locationiq_per_day = ValidatedAttribute('locationiq_per_day', int, default=0)
+    openweathermap_per_minute = ValidatedAttribute('openweathermap_per_minute', int, default=0)
+    openweathermap_per_day = ValidatedAttribute('openweathermap_per_day', int, default=0)
+    airnow_per_minute = ValidatedAttribute('airnow_per_minute', int, default=0)
+    airnow_per_day = ValidatedAttribute('airnow_per_day', int, default=0)
+    quota_wait = ValidatedAttribute('quota_wait', float, default=2)
+    # comma-separated providers to try, in order, when the configured one fails or is down
+    weather_fallback = ValidatedAttribute('weather_fallback', str, default='')
+    aqi_fallback = ValidatedAttribute('aqi_fallback', str, default='')
+    geocoords_fallback = ValidatedAttribute('geocoords_fallback', str, default='')
+    # a provider failing (or answering slower than breaker_slow_call seconds) breaker_error_rate
+    # of its recent requests is skipped for breaker_reset seconds, then tried with one request
+    breaker_error_rate = ValidatedAttribute('breaker_error_rate', float, default=0.5)
+    breaker_min_calls = ValidatedAttribute('breaker_min_calls', int, default=5)
+    breaker_slow_call = ValidatedAttribute('breaker_slow_call', float, default=5)
+    breaker_reset = ValidatedAttribute('breaker_reset', int, default=30)
+    # index built by "python -m sopel_modules.lookoutside.gazetteer"; '' geocodes everything upstream
+    gazetteer_file = ValidatedAttribute('gazetteer_file', str, default='')
 
 
 def setup(bot):
+    from concurrent.futures import ThreadPoolExecutor
+    from .breaker import CircuitBreaker
+    from .engine import Engine
+    from .quota import Quota
+    from .transport import Transport
+
     bot.config.define_section('weather', WeatherSection)
 
+    # Geocoding results rarely change, so keep them around (and across restarts)
+    bot.memory['lookoutside_geocache'] = TTLCache(
+        maxsize=bot.config.weather.geocache_size,
+        ttl=bot.config.weather.geocache_ttl
+    )
+    bot.memory['lookoutside_geocache'].load(bot.db.get_plugin_value('lookoutside', 'geocode-cache'))
+    # set on every new result; save_geocache() writes the cache out when it is
+    bot.memory['lookoutside_geocache_dirty'] = False
+
+    # ZIP codes and city names answered from a local index before asking the geocoder
+    bot.memory['lookoutside_gazetteer'] = None
+    if bot.config.weather.gazetteer_file:
+        from .gazetteer import Gazetteer
+        bot.memory['lookoutside_gazetteer'] = Gazetteer(bot.config.weather.gazetteer_file)
+
+    # Timezone names learned from weather lookups, so .sun can show local times offline
+    bot.memory['lookoutside_timezones'] = TTLCache(
+        maxsize=bot.config.weather.geocache_size,
+        ttl=bot.config.weather.geocache_ttl
+    )
+    bot.memory['lookoutside_timezones'].load(bot.db.get_plugin_value('lookoutside', 'timezone-cache'))
+
+    # OneCall snapshots, shared by .weather and .forecast for every location in a grid cell
+    bot.memory['lookoutside_onecall'] = TTLCache(
+        maxsize=bot.config.weather.onecall_cache_size,
+        ttl=bot.config.weather.onecall_cache_ttl,
+        stale_ttl=bot.config.weather.onecall_stale_ttl
+    )
+
+    # AirNow observations by reporting area, and the reporting area for each grid cell
+    bot.memory['lookoutside_aqi'] = TTLCache(
+        maxsize=bot.config.weather.onecall_cache_size,
+        ttl=60 * 60,
+        stale_ttl=bot.config.weather.aqi_stale_ttl
+    )
+    bot.memory['lookoutside_aqi_areas'] = TTLCache(
+        maxsize=bot.config.weather.onecall_cache_size,
+        ttl=24 * 60 * 60
+    )
+
+    # Latest observation for every AirNow reporting area in airnow_regions, refreshed hourly
+    bot.memory['lookoutside_airnow_regions'] = parse_boxes(bot.config.weather.airnow_regions)
+    bot.memory['lookoutside_airnow_snapshot'] = None
+
+    # Grid cells with no AirNow monitor in range
+    bot.memory['lookoutside_airnow_miss'] = TTLCache(
+        maxsize=bot.config.weather.onecall_cache_size,
+        ttl=bot.config.weather.airnow_miss_ttl
+    )
+
+    # Write-through copy of each nick's preference record
+    bot.memory['lookoutside_prefs'] = TTLCache(
+        maxsize=bot.config.weather.prefs_cache_size,
+        ttl=24 * 60 * 60
+    )
+
+    # Upstream latency and status counts, and per-command totals, for .weatherstats
+    bot.memory['lookoutside_metrics'] = Metrics()
+    bot.memory['lookoutside_metrics_written'] = 0
+
+    # Request limits for each configured provider; ones without settings are unlimited.
+    # The day's usage survives restarts
+    bot.memory['lookoutside_quotas'] = {}
+    for name in (bot.config.weather.geocoords_provider,
+                 bot.config.weather.weather_provider,
+                 bot.config.weather.aqi_provider):
+        bot.memory['lookoutside_quotas'][name] = Quota(
+            per_minute=getattr(bot.config.weather, '{}_per_minute'.format(name), 0),
+            per_day=getattr(bot.config.weather, '{}_per_day'.format(name), 0)
+        )
+        bot.memory['lookoutside_quotas'][name].load(
+            bot.db.get_plugin_value('lookoutside', 'quota-{}'.format(name)))
+
+    # A circuit breaker for every provider that might be asked, fallbacks included, and for
+    # AirNow's file host when the regional snapshot is used
+    bot.memory['lookoutside_breakers'] = {}
+    names = set(name for capability in ('weather', 'aqi', 'geocode') for name in provider_names(bot, capability))
+    if bot.memory['lookoutside_airnow_regions']:
+        names.add('airnow-files')
+    for name in names:
+        bot.memory['lookoutside_breakers'][name] = CircuitBreaker(
+            error_rate=bot.config.weather.breaker_error_rate,
+            min_calls=bot.config.weather.breaker_min_calls,
+            slow_call=bot.config.weather.breaker_slow_call,
+            reset_timeout=bot.config.weather.breaker_reset
+        )
+
+    # Upstream responses on disk, so a restart doesn't start cold
+    bot.memory['lookoutside_http_cache'] = None
+    if bot.config.weather.http_cache_file:
+        from .httpcache import DiskCache
+        bot.memory['lookoutside_http_cache'] = DiskCache(
+            bot.config.weather.http_cache_file,
+            max_bytes=bot.config.weather.http_cache_mb * 1024 * 1024
+        )
+
+    # One pooled session for every provider, with its connections opened up front
+    bot.memory['lookoutside_http'] = Transport(
+        connect_timeout=bot.config.weather.http_connect_timeout,
+        read_timeout=bot.config.weather.http_read_timeout,
+        pool_size=bot.config.weather.http_pool_size,
+        metrics=bot.memory['lookoutside_metrics'],
+        quotas=bot.memory['lookoutside_quotas'],
+        quota_wait=bot.config.weather.quota_wait,
+        cache=bot.memory['lookoutside_http_cache'],
+        breakers=bot.memory['lookoutside_breakers']
+    )
+    if bot.config.weather.http_warm:
+        # a generator, so the providers are imported on the warming thread rather than here
+        names = (bot.config.weather.geocoords_provider,
+                 bot.config.weather.weather_provider,
+                 bot.config.weather.aqi_provider)
+        bot.memory['lookoutside_http'].warm(url for name in names for url in get_provider(name).warm_urls(bot))
+
+    # Identical upstream requests made at the same moment share one call
+    bot.memory['lookoutside_flight'] = SingleFlight()
+
+    # Worker pool for the blocking upstream requests
+    bot.memory['lookoutside_executor'] = ThreadPoolExecutor(
+        max_workers=bot.config.weather.max_workers,
+        thread_name_prefix='lookoutside'
+    )
+
+    # Event loop that commands hand their lookups to; blocking calls go to the pool above
+    bot.memory['lookoutside_engine'] = Engine(bot.memory['lookoutside_executor'])
+
+    # load the AQI snapshot now rather than at the first interval
+    refresh_airnow_snapshot(bot)
+
+    # The most requested grid cells, kept fresh in the background
+    bot.memory['lookoutside_hot'] = HeavyHitters(bot.config.weather.prefetch_size)
+    bot.memory['lookoutside_prefetches'] = 0
+
+    # Every cache, by name, for .weatherstats
+    bot.memory['lookoutside_caches'] = {
+        'geocode': bot.memory['lookoutside_geocache'],
+        'timezones': bot.memory['lookoutside_timezones'],
+        'onecall': bot.memory['lookoutside_onecall'],
+        'aqi': bot.memory['lookoutside_aqi'],
+        'aqi-areas': bot.memory['lookoutside_aqi_areas'],
+        'aqi-miss': bot.memory['lookoutside_airnow_miss'],
+        'prefs': bot.memory['lookoutside_prefs'],
+    }
+
+
+def shutdown(bot):
+    save_geocache(bot, force=True)
+    save_quotas(bot)
+    if 'lookoutside_timezones' in bot.memory:
+        bot.db.set_plugin_value('lookoutside', 'timezone-cache', bot.memory['lookoutside_timezones'].dump())
+    if 'lookoutside_engine' in bot.memory:
+        bot.memory['lookoutside_engine'].stop()
+    if 'lookoutside_executor' in bot.memory:
+        bot.memory['lookoutside_executor'].shutdown(wait=False)
+    if 'lookoutside_http' in bot.memory:
+        bot.memory['lookoutside_http'].close()
+    if bot.memory.get('lookoutside_gazetteer') is not None:
+        bot.memory['lookoutside_gazetteer'].close()
+
 
 # Walk the user through defining variables required
 def configure(config):
     config.define_section('weather', WeatherSection, validate=False)
     config.weather.configure_setting(
         'geocoords_provider',
-        'Enter GeoCoords API Provider:',
+        'Enter GeoCoords API Provider: ({}):'.format(', '.join(GEOCOORDS_PROVIDERS)),
         default=NO_DEFAULT
     )
     config.weather.configure_setting(
@@ -78,163 +323,206 @@ def configure(config):
     )
 
 
-def get_temp(weather_units, temp):
-    try:
-        temp = float(temp)
-    except (KeyError, TypeError, ValueError):
-        return 'unknown'
-    
-    # check user preferences, default to both if unset
-    if weather_units == "both" or weather_units is None:
-        return u'%d\u00B0C (%d\u00B0F)' % (round(temp), round(c_to_f(temp)))
-    elif weather_units == "metric":
-        return u'%d\u00B0C' % (round(temp))
-    elif weather_units == "imperial":
-        return u'%d\u00B0F' % (round(c_to_f(temp)))
-
-def get_humidity(humidity):
-    try:
-        humidity = int(humidity * 100)
-    except (KeyError, TypeError, ValueError):
-        return 'unknown'
-    return "Humidity: %s%%" % humidity
-
-
-def get_wind(weather_units, speed, bearing):
-    m_s = float(round(speed, 1))
-    mph = round(m_s * 2.237)
-    speed = int(round(m_s * 1.94384, 0))
-    bearing = int(bearing)
-
-    if speed < 1:
-        description = 'Calm'
-    elif speed < 4:
-        description = 'Light air'
-    elif speed < 7:
-        description = 'Light breeze'
-    elif speed < 11:
-        description = 'Gentle breeze'
-    elif speed < 16:
-        description = 'Moderate breeze'
-    elif speed < 22:
-        description = 'Fresh breeze'
-    elif speed < 28:
-        description = 'Strong breeze'
-    elif speed < 34:
-        description = 'Near gale'
-    elif speed < 41:
-        description = 'Gale'
-    elif speed < 48:
-        description = 'Strong gale'
-    elif speed < 56:
-        description = 'Storm'
-    elif speed < 64:
-        description = 'Violent storm'
-    else:
-        description = 'Hurricane'
-
-    if (bearing <= 22.5) or (bearing > 337.5):
-        bearing = u'\u2193'
-    elif (bearing > 22.5) and (bearing <= 67.5):
-        bearing = u'\u2199'
-    elif (bearing > 67.5) and (bearing <= 112.5):
-        bearing = u'\u2190'
-    elif (bearing > 112.5) and (bearing <= 157.5):
-        bearing = u'\u2196'
-    elif (bearing > 157.5) and (bearing <= 202.5):
-        bearing = u'\u2191'
-    elif (bearing > 202.5) and (bearing <= 247.5):
-        bearing = u'\u2197'
-    elif (bearing > 247.5) and (bearing <= 292.5):
-        bearing = u'\u2192'
-    elif (bearing > 292.5) and (bearing <= 337.5):
-        bearing = u'\u2198'
-
-    # check user preferences, default to both if unset
-    if weather_units == "both" or weather_units is None:
-        formSpeed = "{} m/s ({} mph)".format(str(m_s), str(mph))
-    elif weather_units == "metric":
-        formSpeed = "{} m/s)".format(str(m_s))
-    elif weather_units == "imperial":
-        formSpeed = "{} mph".format(str(mph))
-
-    return description + ' ' + formSpeed + ' (' + bearing + ')'
-
-
-def get_geocoords(bot, trigger):
-    url = "https://us1.locationiq.com/v1/search.php"  # This can be updated to their EU endpoint for EU users
-    data = {
-        'key': bot.config.weather.geocoords_api_key,
-        'q': trigger.group(2),
-        'format': 'json',
-        'addressdetails': 1,
-        'limit': 1
-    }
-    r = requests.get(url, params=data)
-    if r.status_code != 200:
-        raise Exception(r.json()['error'])
-    latitude = r.json()[0]['lat']
-    longitude = r.json()[0]['lon']
-    address = r.json()[0]['address']
-
-    # Zip codes give us town versus city
-    if 'city' in address.keys():
-        location = '{}, {}, {}'.format(address['city'],
-                                       address['state'],
-                                       address['country_code'].upper())
-    elif 'town' in address.keys():
-        location = '{}, {}, {}'.format(address['town'],
-                                       address['state'],
-                                       address['country_code'].upper())
-    elif 'county' in address.keys():
-        location = '{}, {}, {}'.format(address['county'],
-                                       address['state'],
-                                       address['country_code'].upper())
-    elif 'city_district' in address.keys():
-        location = '{}, {}'.format(address['city_district'],
-                                   address['country_code'].upper())
-    else:
-        location = 'Unknown'
+def timed(name):
+    """Record how long the decorated command takes, and whether it raised."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(bot, trigger):
+            start = time.perf_counter()
+            error = True
+            try:
+                result = function(bot, trigger)
+                error = False
+                return result
+            finally:
+                metrics = bot.memory.get('lookoutside_metrics')
+                if metrics is not None:
+                    metrics.observe_command(name, time.perf_counter() - start, error)
+        return wrapper
+    return decorator
+
+
+@interval(60)
+def save_geocache(bot, force=False):
+    """Write the geocode cache to the bot database if it has gained results since it was last saved."""
+    geocache = bot.memory.get('lookoutside_geocache')
+    if geocache is None or not (force or bot.memory['lookoutside_geocache_dirty']):
+        return
+    with _geocache_lock:
+        # cleared first, so a result added during the dump is saved next time
+        bot.memory['lookoutside_geocache_dirty'] = False
+        bot.db.set_plugin_value('lookoutside', 'geocode-cache', geocache.dump())
+
+
+@interval(300)
+def save_quotas(bot):
+    """Save each provider's requests used today, so a restart doesn't forget them."""
+    for name, quota in bot.memory.get('lookoutside_quotas', {}).items():
+        bot.db.set_plugin_value('lookoutside', 'quota-{}'.format(name), quota.dump())
+
+
+def geocode_locally(bot, key):
+    """Answer coordinates and places in the gazetteer without a request; None otherwise."""
+    found = parse_coordinates(key)
+    if found is None and bot.memory.get('lookoutside_gazetteer') is not None:
+        found = bot.memory['lookoutside_gazetteer'].lookup(key)
+    return found
+
+
+async def lookup_geocoords_async(bot, query):
+    key = normalize_location(query)
+    cached = geocode_locally(bot, key) or bot.memory['lookoutside_geocache'].get(key)
+    if cached is None:
+        # concurrent lookups of the same place wait on a single request
+        cached = await bot.memory['lookoutside_flight'].do_async(
+            (bot.config.weather.geocoords_provider, key), bot.memory['lookoutside_engine'],
+            fetch_geocoords, bot, query, key)
+    latitude, longitude, location = cached
+    return latitude, longitude, location
+
+
+def fetch_geocoords(bot, query, key):
+    """Geocode ``query`` upstream, unless ``key`` has been cached by now."""
+    cached = bot.memory['lookoutside_geocache'].peek(key)
+    if cached is not None:
+        return cached[0]
+    latitude, longitude, location = call_chain(bot, 'geocode', 'geocode', query)
+
+    bot.memory['lookoutside_geocache'].set(key, (latitude, longitude, location))
+    bot.memory['lookoutside_geocache_dirty'] = True
 
     return latitude, longitude, location
 
 
+def get_location(bot, trigger):
+    if not trigger.group(2):
+        prefs = get_prefs(bot, trigger.nick)
+        return prefs['latitude'], prefs['longitude'], prefs['location']
+    return bot.memory['lookoutside_engine'].run(lookup_geocoords_async(bot, trigger.group(2)),
+                                                bot.config.weather.command_timeout)
+
+
+async def get_hourly_async(bot, latitude, longitude, location):
+    return await call_chain_async(bot, 'hourly', 'hourly_forecast_async', latitude, longitude, location)
+
+
 # 24h Forecast: Oshkosh, US: Broken Clouds, High: 0°C (32°F), Low: -7°C (19°F)
-def get_forecast(bot, trigger):
-    location = trigger.group(2)
-    if not location:
-        latitude = bot.db.get_nick_value(trigger.nick, 'latitude')
-        longitude = bot.db.get_nick_value(trigger.nick, 'longitude')
-        location = bot.db.get_nick_value(trigger.nick, 'location')
-    else:
-        latitude, longitude, location = get_geocoords(bot, trigger)
+async def get_forecast_async(bot, latitude, longitude, location):
+    return await call_chain_async(bot, 'forecast', 'forecast_async', latitude, longitude, location)
 
-    # OpenWeatherMap
-    if bot.config.weather.weather_provider == 'openweathermap':
-        return openweathermap_forecast(bot, latitude, longitude, location)
-    # Unsupported Provider
-    else:
-        raise Exception('Error: Unsupported Provider')
 
+async def get_weather_async(bot, latitude, longitude, location):
+    return await call_chain_async(bot, 'weather', 'weather_async', latitude, longitude, location)
 
-def get_weather(bot, trigger):
-    location = trigger.group(2)
-    if not location:
-        latitude = bot.db.get_nick_value(trigger.nick, 'latitude')
-        longitude = bot.db.get_nick_value(trigger.nick, 'longitude')
-        location = bot.db.get_nick_value(trigger.nick, 'location')
-    else:
-        latitude, longitude, location = get_geocoords(bot, trigger)
 
-    # OpenWeatherMap
-    if bot.config.weather.weather_provider == 'openweathermap':
-        return openweathermap_weather(bot, latitude, longitude, location)
-    # Unsupported Provider
-    else:
-        raise Exception('Error: Unsupported Provider')
+def split_locations(query):
+    """Split "Seattle; Portland; 90210" into places, dropping repeats."""
+    places = []
+    seen = set()
+    for place in query.split(';'):
+        key = normalize_location(place)
+        if key and key not in seen:
+            seen.add(key)
+            places.append(place.strip())
+    return places
+
+
+def pack_lines(parts, separator=' | ', limit=MAX_LINE_BYTES):
+    """Join ``parts`` into as few lines as fit ``limit`` bytes, never splitting a part."""
+    lines = []
+    for part in parts:
+        if lines and len((lines[-1] + separator + part).encode('utf-8')) <= limit:
+            lines[-1] += separator + part
+        else:
+            lines.append(part)
+    return lines
+
+
+async def gather_locations_async(bot, places, fetch):
+    """Geocode and fetch every place at once; each result is the data or the exception raised."""
+    import asyncio
+
+    async def one(place):
+        latitude, longitude, location = await lookup_geocoords_async(bot, place)
+        record(bot, 'weather', latitude, longitude)
+        return await fetch(bot, latitude, longitude, location)
+
+    return await asyncio.gather(*[one(place) for place in places], return_exceptions=True)
+
+
+def multi_location(bot, trigger, fetch, renderer):
+    # nearby places share a grid cell, so they also share the upstream fetch
+    places = split_locations(trigger.group(2))
+    if len(places) > bot.config.weather.max_locations:
+        return bot.reply('I can look up at most {} locations at once.'.format(bot.config.weather.max_locations))
+
+    results = bot.memory['lookoutside_engine'].run(gather_locations_async(bot, places, fetch),
+                                                   bot.config.weather.command_timeout)
+    render = renderer(get_prefs(bot, trigger.nick), compact=True, show_age=bot.config.weather.show_age)
+    parts = render_many(render, results, places)
+    for line in pack_lines(parts):
+        bot.say(line)
+
+
+async def board_async(bot, points):
+    """Fetch current conditions for every point, at most ``board_concurrency`` at a time."""
+    import asyncio
+
+    provider = get_provider(bot.config.weather.weather_provider, 'weather')
+    if provider.multi_point:
+        return await provider.weather_many_async(bot, points)
+
+    semaphore = asyncio.Semaphore(bot.config.weather.board_concurrency)
+
+    async def one(point):
+        async with semaphore:
+            return await call_chain_async(bot, 'weather', 'weather_async', *point)
+
+    return await asyncio.gather(*[one(point) for point in points], return_exceptions=True)
+
+
+def show_board(bot, trigger, channel):
+    if channel not in bot.channels:
+        return bot.reply("I'm not in {}.".format(channel))
+    # members only, so nobody can see where a channel's people are without joining it
+    if trigger.nick not in bot.channels[channel].users:
+        return bot.reply("You're not in {}.".format(channel))
+
+    # everyone in the same grid cell is answered by one fetch
+    areas = {}
+    # a copy: the bot's main thread changes the member list on every JOIN, PART and QUIT
+    for nick in list(bot.channels[channel].users):
+        prefs = saved_prefs(bot, nick)
+        if not prefs or not prefs['latitude'] or not prefs['longitude']:
+            continue
+        cell = grid_key(prefs['latitude'], prefs['longitude'], bot.config.weather.grid_precision)
+        if cell not in areas:
+            areas[cell] = {'point': (prefs['latitude'], prefs['longitude'], prefs['location']), 'people': 0}
+        areas[cell]['people'] += 1
+    if not areas:
+        return bot.say("Nobody in {} has set a location.".format(channel))
+
+    ranked = sorted(areas.values(), key=lambda area: -area['people'])
+    shown = ranked[:bot.config.weather.board_max_areas]
+    results = bot.memory['lookoutside_engine'].run(board_async(bot, [area['point'] for area in shown]),
+                                                   bot.config.weather.command_timeout)
+
+    # counts rather than nicks, so the board doesn't highlight the whole channel
+    render = weather_renderer(get_prefs(bot, trigger.nick), compact=True, show_age=bot.config.weather.show_age)
+    parts = []
+    for area, data in zip(shown, results):
+        if isinstance(data, Exception):
+            parts.append('{}: {}'.format(area['point'][2], data))
+        else:
+            parts.append(u'{} ({})'.format(render(data), area['people']))
+    if len(ranked) > len(shown):
+        parts.append('+{} more areas'.format(len(ranked) - len(shown)))
+    for line in pack_lines(parts):
+        bot.say(line)
 
 
 @commands('weatherset', 'wset')
+@timed('weatherset')
 def weather_set(bot, trigger):
     if trigger.is_privmsg is False:
         return(bot.say("These commands must be sent in privmsg to avoid channel spam"))
@@ -255,7 +543,7 @@ def weather_set(bot, trigger):
 
     if re.search("units", wsetting):
         if wvalue == "imperial" or wvalue == "metric" or wvalue == "both":
-            bot.db.set_nick_value(trigger.nick, 'weather-units', wvalue)
+            set_prefs(bot, trigger.nick, units=wvalue)
             return(bot.say("Preference set {wsetting}: {wvalue}".format(wsetting=wsetting, wvalue=wvalue)))
         else:
             return bot.say("sorry, {wvalue} isn't a valid option for {wsetting}. Please use {opt1}, {opt2}, or {opt3}.".format(
@@ -263,12 +551,12 @@ def weather_set(bot, trigger):
                 wsetting=wsetting,
                 opt1='metric',
                 opt2='imperial',
-                op3='both'
+                opt3='both'
             ))
     
     if re.search("condition", wsetting):
         if wvalue == "true" or wvalue == "false":
-            bot.db.set_nick_value(trigger.nick, 'weather-show-condition', wvalue)
+            set_prefs(bot, trigger.nick, show_condition=(wvalue == "true"))
             return(bot.say("Preference set {wsetting}: {wvalue}".format(wsetting=wsetting, wvalue=wvalue)))
         else:
             return bot.say("sorry, {wvalue} isn't a valid option for {wsetting}. Please use {opt1}, {opt2}.".format(
@@ -280,7 +568,7 @@ def weather_set(bot, trigger):
     
     if re.search("humidity", wsetting):
         if wvalue == "true" or wvalue == "false":
-            bot.db.set_nick_value(trigger.nick, 'weather-show-humidity', wvalue)
+            set_prefs(bot, trigger.nick, show_humidity=(wvalue == "true"))
             return(bot.say("Preference set {wsetting}: {wvalue}".format(wsetting=wsetting, wvalue=wvalue)))
         else:
             return bot.say("sorry, {wvalue} isn't a valid option for {wsetting}. Please use {opt1}, {opt2}.".format(
@@ -292,7 +580,7 @@ def weather_set(bot, trigger):
 
     if re.search("sunrise", wsetting):
         if wvalue == "true" or wvalue == "false":
-            bot.db.set_nick_value(trigger.nick, 'weather-show-sunriseset', wvalue)
+            set_prefs(bot, trigger.nick, show_sunriseset=(wvalue == "true"))
             return(bot.say("Preference set {wsetting}: {wvalue}".format(wsetting=wsetting, wvalue=wvalue)))
         else:
             return bot.say("sorry, {wvalue} isn't a valid option for {wsetting}. Please use {opt1}, {opt2}.".format(
@@ -304,7 +592,7 @@ def weather_set(bot, trigger):
     
     if re.search("wind", wsetting):
         if wvalue == "true" or wvalue == "false":
-            bot.db.set_nick_value(trigger.nick, 'weather-show-wind', wvalue)
+            set_prefs(bot, trigger.nick, show_wind=(wvalue == "true"))
             return(bot.say("Preference set {wsetting}: {wvalue}".format(wsetting=wsetting, wvalue=wvalue)))
         else:
             return bot.say("sorry, {wvalue} isn't a valid option for {wsetting}. Please use {opt1}, {opt2}.".format(
@@ -316,7 +604,7 @@ def weather_set(bot, trigger):
     
     if re.search("aqi", wsetting):
         if wvalue == "true" or wvalue == "false":
-            bot.db.set_nick_value(trigger.nick, 'weather-show-aqi', wvalue)
+            set_prefs(bot, trigger.nick, show_aqi=(wvalue == "true"))
             return(bot.say("Preference set {wsetting}: {wvalue}".format(wsetting=wsetting, wvalue=wvalue)))
         else:
             return bot.say("sorry, {wvalue} isn't a valid option for {wsetting}. Please use {opt1}, {opt2}.".format(
@@ -328,8 +616,7 @@ def weather_set(bot, trigger):
     
     if re.search("reset", wsetting):
         if wvalue == "true":
-            for wsetting in ['weather-units', 'weather-show-condition', 'weather-show-humidity', 'weather-show-sunriseset', 'weather-show-wind', 'weather-show-aqi']:
-                bot.db.delete_nick_value(trigger.nick, wsetting)
+            reset_prefs(bot, trigger.nick)
             return(bot.say("Preferences reset to default"))
         else:
             return bot.say("sorry, {wvalue} isn't a valid option for {wsetting}. Please use {opt1}, {opt2}.".format(
@@ -344,31 +631,48 @@ def weather_set(bot, trigger):
 @example('.weather London')
 @example('.weather Seattle, US')
 @example('.weather 90210')
+@example('.weather Seattle; Portland; 90210')
+@example('.weather #channel')
+@timed('weather')
 def weather_command(bot, trigger):
-    """.weather location - Show the weather at the given location."""
+    """.weather location[; location...] - Show the weather at the given location(s)."""
     if bot.config.weather.weather_api_key is None or bot.config.weather.weather_api_key == '':
         return bot.reply("Weather API key missing. Please configure this module.")
     if bot.config.weather.geocoords_api_key is None or bot.config.weather.geocoords_api_key == '':
         return bot.reply("GeoCoords API key missing. Please configure this module.")
 
-    # Ensure we have a location for the user
-    location = trigger.group(2)
-    if not location:
-        latitude = bot.db.get_nick_value(trigger.nick, 'latitude')
-        longitude = bot.db.get_nick_value(trigger.nick, 'longitude')
-        if not latitude or not longitude:
-            return bot.say("I don't know where you live. "
-                           "Give me a location, like {pfx}{command} London, "
-                           "or tell me where you live by saying {pfx}setlocation "
-                           "London, for example.".format(command=trigger.group(1),
-                                                         pfx=bot.config.core.help_prefix))
-
-    data = get_weather(bot, trigger)
+    if trigger.group(2) and ';' in trigger.group(2):
+        return multi_location(bot, trigger, get_weather_async, weather_renderer)
+    if trigger.group(2) and trigger.group(2).startswith('#'):
+        return show_board(bot, trigger, Identifier(trigger.group(2).split()[0]))
 
+    # Ensure we have a location for the user
+    latitude, longitude, location = get_location(bot, trigger)
+    if not latitude or not longitude:
+        return bot.say("I don't know where you live. "
+                       "Give me a location, like {pfx}{command} London, "
+                       "or tell me where you live by saying {pfx}setlocation "
+                       "London, for example.".format(command=trigger.group(1),
+                                                     pfx=bot.config.core.help_prefix))
+    prefs = get_prefs(bot, trigger.nick)
+    record(bot, 'weather', latitude, longitude)
+    if prefs['show_aqi']:
+        record(bot, 'aqi', latitude, longitude)
+
+    # Current conditions and AQI come from different upstreams, so fetch them side by side
+    engine = bot.memory['lookoutside_engine']
+    timeout = bot.config.weather.command_timeout
+    # both share one deadline, so the command waits at most command_timeout in all
+    deadline = time.perf_counter() + timeout
+    weather_future = engine.submit(get_weather_async(bot, latitude, longitude, location))
+    aqi_future = None
+    if prefs['show_aqi']:
+        aqi_method = "weather" # to handle how we build the string
+        aqi_future = engine.submit(get_aqi_async(bot, latitude, longitude, aqi_method))
 
     # check to see the user has configured their preferences
-    if bot.db.get_nick_value(trigger.nick, 'weather-units') is None:
-        nagcount = bot.db.get_nick_value(trigger.nick, 'weather-config-nag', default=0)
+    if prefs['units'] is None:
+        nagcount = prefs['nag']
         if nagcount == 0:
             helpmsg = ("I noticed that you have not told me how you like to see your weather!  "
             "You can tailor your experience by using the .weatherset (or .wset) command."
@@ -383,40 +687,28 @@ def weather_command(bot, trigger):
         nagcount += 1
         if nagcount >= 10:
             nagcount = 0 #reset
-        bot.db.set_nick_value(trigger.nick, 'weather-config-nag', nagcount)
-
-    # start customizing the return string
-
-    # get weather units preference
-    if bot.db.get_nick_value(trigger.nick, 'weather-units') is not None:
-        weather_units = bot.db.get_nick_value(trigger.nick, 'weather-units')
-    else:
-        weather_units = 'both'
-
-    weather = u'{location}: {temp}'.format(
-        location=data['location'],
-        temp=get_temp(weather_units, data['temp'])
-    )
+        set_prefs(bot, trigger.nick, nag=nagcount)
 
-    if bot.db.get_nick_value(trigger.nick, 'weather-show-condition') is True or bot.db.get_nick_value(trigger.nick, 'weather-show-condition') is None:
-        weather += ', {condition}'.format(condition=data['condition'])
-    
-    if bot.db.get_nick_value(trigger.nick, 'weather-show-humidity') is True or bot.db.get_nick_value(trigger.nick, 'weather-show-humidity') is None:
-        weather += ', {humidity}'.format(humidity=get_humidity(data['humidity']))
-
-    # # Some providers don't give us UV Index
-    # if 'uvindex' in data.keys():
-    #     weather += ', UV Index: {uvindex}'.format(uvindex=data['uvindex'])
-
-    if bot.db.get_nick_value(trigger.nick, 'weather-show-sunriseset') is True or bot.db.get_nick_value(trigger.nick, 'weather-show-sunriseset') is None:
-        weather += ', Sunrise: {sunrise} Sunset: {sunset}'.format(sunrise=data['sunrise'], sunset=data['sunset'])
-    
-    if bot.db.get_nick_value(trigger.nick, 'weather-show-wind') is True or bot.db.get_nick_value(trigger.nick, 'weather-show-wind') is None:
-        weather += ', {wind}'.format(wind=get_wind(weather_units, data['wind']['speed'], data['wind']['bearing']))
-    
-    if bot.db.get_nick_value(trigger.nick, 'weather-show-aqi') is True or bot.db.get_nick_value(trigger.nick, 'weather-show-aqi') is None:
-        aqi_method = "weather" # to handle how we build the string
-        weather += ',{aqi_data}'.format(aqi_data=get_aqi(bot, latitude, longitude, aqi_method))
+    try:
+        data = weather_future.result(timeout)
+    except Exception:
+        # there is no reply to add the AQI to
+        weather_future.cancel()
+        if aqi_future is not None:
+            aqi_future.cancel()
+        raise
+
+    # one precompiled renderer per combination of units and shown fields
+    weather = weather_renderer(prefs, show_age=bot.config.weather.show_age)(data)
+
+    if aqi_future is not None:
+        # the weather is still worth sending when the AQI lookup fails
+        try:
+            aqi_data = aqi_future.result(max(0, deadline - time.perf_counter()))
+        except Exception:
+            aqi_future.cancel()
+            aqi_data = ' AQI unavailable'
+        weather += ',{aqi_data}'.format(aqi_data=aqi_data)
 
     return bot.say(weather)
 
@@ -426,6 +718,8 @@ def weather_command(bot, trigger):
 @example('.forecast London')
 @example('.forecast Seattle, US')
 @example('.forecast 90210')
+@example('.forecast Seattle; Portland; 90210')
+@timed('forecast')
 def forecast_command(bot, trigger):
     aqi_method = "forecast" # to handle how we build the string
     """.forecast location - Show the weather forecast for tomorrow at the given location."""
@@ -434,67 +728,93 @@ def forecast_command(bot, trigger):
     if bot.config.weather.geocoords_api_key is None or bot.config.weather.geocoords_api_key == '':
         return bot.reply("GeoCoords API key missing. Please configure this module.")
 
+    if trigger.group(2) and ';' in trigger.group(2):
+        return multi_location(bot, trigger, get_forecast_async, forecast_renderer)
+
     # Ensure we have a location for the user
-    location = trigger.group(2)
-    if not location:
-        latitude = bot.db.get_nick_value(trigger.nick, 'latitude')
-        longitude = bot.db.get_nick_value(trigger.nick, 'longitude')
-        if not latitude or not longitude:
-            return bot.say("I don't know where you live. "
-                           "Give me a location, like {pfx}{command} London, "
-                           "or tell me where you live by saying {pfx}setlocation "
-                           "London, for example.".format(command=trigger.group(1),
-                                                         pfx=bot.config.core.help_prefix))
-
-    data = get_forecast(bot, trigger)
-
-    # # start customizing the return string
-
-    # get weather units preference
-    if bot.db.get_nick_value(trigger.nick, 'weather-units') is not None:
-        weather_units = bot.db.get_nick_value(trigger.nick, 'weather-units')
-    else:
-        weather_units = 'both'
+    latitude, longitude, location = get_location(bot, trigger)
+    if not latitude or not longitude:
+        return bot.say("I don't know where you live. "
+                       "Give me a location, like {pfx}{command} London, "
+                       "or tell me where you live by saying {pfx}setlocation "
+                       "London, for example.".format(command=trigger.group(1),
+                                                     pfx=bot.config.core.help_prefix))
+    record(bot, 'weather', latitude, longitude)
 
-    forecast = '{location}'.format(location=data['location'])
+    data = bot.memory['lookoutside_engine'].run(get_forecast_async(bot, latitude, longitude, location),
+                                               bot.config.weather.command_timeout)
 
-    for day in data['data']:
-        forecast += ' :: {dow} - {summary} - {high_temp} / {low_temp}'.format(
-            dow=day.get('dow'),
-            summary=day.get('summary'),
-            high_temp=get_temp(weather_units, day.get('high_temp')),
-            low_temp=get_temp(weather_units, day.get('low_temp'))
-        )
+    forecast = forecast_renderer(get_prefs(bot, trigger.nick), show_age=bot.config.weather.show_age)(data)
     return bot.say(forecast)
 
+
+@commands('hourly')
+@example('.hourly')
+@example('.hourly London')
+@example('.hourly 90210')
+@example('.hourly Seattle; Portland')
+@timed('hourly')
+def hourly_command(bot, trigger):
+    """.hourly location - Show the next day's weather every few hours, from the same lookup as .weather."""
+    if bot.config.weather.weather_api_key is None or bot.config.weather.weather_api_key == '':
+        return bot.reply("Weather API key missing. Please configure this module.")
+    if bot.config.weather.geocoords_api_key is None or bot.config.weather.geocoords_api_key == '':
+        return bot.reply("GeoCoords API key missing. Please configure this module.")
+
+    if trigger.group(2) and ';' in trigger.group(2):
+        return multi_location(bot, trigger, get_hourly_async, hourly_renderer)
+
+    latitude, longitude, location = get_location(bot, trigger)
+    if not latitude or not longitude:
+        return bot.say("I don't know where you live. "
+                       "Give me a location, like {pfx}{command} London, "
+                       "or tell me where you live by saying {pfx}setlocation "
+                       "London, for example.".format(command=trigger.group(1),
+                                                     pfx=bot.config.core.help_prefix))
+    record(bot, 'weather', latitude, longitude)
+
+    data = bot.memory['lookoutside_engine'].run(get_hourly_async(bot, latitude, longitude, location),
+                                               bot.config.weather.command_timeout)
+
+    hourly = hourly_renderer(get_prefs(bot, trigger.nick), show_age=bot.config.weather.show_age)(data)
+    return bot.say(hourly)
+
+
 @commands('aqi')
 @example('.aqi')
 @example('.aqi London')
 @example('.aqi Seattle, US')
 @example('.aqi 90210')
+@timed('aqi')
 def aqi_command(bot, trigger):
-    """.aqi location - Show the air quality index within 5miles of set or given location."""
+    """.aqi location - Show the air quality index from the AirNow monitor nearest the set or given location, up to airnow_max_distance miles away (100 by default)."""
     aqi_method = "aqi" # to handle how we build the string
     # Ensure we have a location for the user
-    location = trigger.group(2)
-    if not location:
-        latitude = bot.db.get_nick_value(trigger.nick, 'latitude')
-        longitude = bot.db.get_nick_value(trigger.nick, 'longitude')
-        location = bot.db.get_nick_value(trigger.nick, 'location')
-    else:
-        latitude, longitude, location = get_geocoords(bot, trigger)
+    latitude, longitude, location = get_location(bot, trigger)
     if not latitude or not longitude:
         return bot.say("I don't know where you live. "
                         "Tell me where you live by saying {pfx}setlocation "
                         "Los Angeles, for example.".format(command=trigger.group(1),
                                                         pfx=bot.config.core.help_prefix))
+    record(bot, 'aqi', latitude, longitude)
 
-    aqi = get_aqi(bot, latitude, longitude, aqi_method)
+    aqi = bot.memory['lookoutside_engine'].run(get_aqi_async(bot, latitude, longitude, aqi_method),
+                                              bot.config.weather.command_timeout)
 
     return bot.say(aqi)
 
-def get_aqi(bot, latitude, longitude, aqi_method):
-    data = airnow_aqi(bot, latitude, longitude)
+
+async def get_aqi_async(bot, latitude, longitude, aqi_method):
+    return format_aqi(bot, await call_chain_async(bot, 'aqi', 'aqi_async', latitude, longitude), aqi_method)
+
+
+def format_aqi(bot, data, aqi_method):
+    if data is None:
+        no_monitor = "monitor within {} miles".format(bot.config.weather.airnow_max_distance)
+        if aqi_method == "aqi":
+            return "No air quality {}".format(no_monitor)
+        return " AQI: no {}".format(no_monitor)
+
     aqi = ""
     # Fremont, CA: O3 Good (AQI: 28), PM2.5 Good (AQI: 18)
     if aqi_method == "aqi":
@@ -518,13 +838,59 @@ def get_aqi(bot, latitude, longitude, aqi_method):
     if 'pm_aqi' in data.keys():
         aqi += " (AQI: {})".format(data['pm_aqi'])
 
+    if bot.config.weather.show_age:
+        aqi += age_marker(data.get('age'))
+
     return aqi
         
+@commands('sun')
+@example('.sun')
+@example('.sun Seattle, US')
+@timed('sun')
+def sun_command(bot, trigger):
+    """.sun [location] - Show today's sunrise, sunset, twilight and day length, worked out without a weather lookup."""
+    latitude, longitude, location = get_location(bot, trigger)
+    if not latitude or not longitude:
+        return bot.say("I don't know where you live. "
+                       "Give me a location, like {pfx}{command} London, "
+                       "or tell me where you live by saying {pfx}setlocation "
+                       "London, for example.".format(command=trigger.group(1),
+                                                     pfx=bot.config.core.help_prefix))
+
+    # without a timezone from an earlier weather lookup, fall back to the sun's own offset
+    tz_name = resolve_timezone(bot, latitude, longitude)
+    if tz_name is not None:
+        tz = get_timezone(tz_name)
+        zone = ''
+    else:
+        tz = solar_offset(longitude)
+        zone = ' (UTC{:+d})'.format(int(tz.utcoffset(None).total_seconds() // 3600))
+
+    sun = sun_times(latitude, longitude, datetime.datetime.now(tz).date())
+    if sun['polar'] == 'day':
+        return bot.say('{}: The sun stays up all day today'.format(location))
+    if sun['polar'] == 'night':
+        return bot.say('{}: The sun stays down all day today'.format(location))
+
+    return bot.say('{location}: Dawn {dawn}, Sunrise {sunrise}, Sunset {sunset}, Dusk {dusk}, '
+                   'Day length {hours}h {minutes:02d}m{zone}'.format(
+                       location=location,
+                       dawn=format_time(sun['dawn'], tz),
+                       sunrise=format_time(sun['sunrise'], tz),
+                       sunset=format_time(sun['sunset'], tz),
+                       dusk=format_time(sun['dusk'], tz),
+                       hours=int(sun['day_length'] // 3600),
+                       minutes=int(sun['day_length'] % 3600 // 60),
+                       zone=zone
+                   ))
+
+
 @commands('setlocation')
 @example('.setlocation London')
 @example('.setlocation Seattle, US')
 @example('.setlocation 90210')
 @example('.setlocation w7174408')
+@timed('setlocation')
 def update_location(bot, trigger):
     if bot.config.weather.geocoords_api_key is None or bot.config.weather.geocoords_api_key == '':
         return bot.reply("GeoCoords API key missing. Please configure this module.")
@@ -535,11 +901,142 @@ def update_location(bot, trigger):
         return NOLIMIT
 
     # Get GeoCoords
-    latitude, longitude, location = get_geocoords(bot, trigger)
+    latitude, longitude, location = get_location(bot, trigger)
 
     # Assign Latitude & Longitude to user
-    bot.db.set_nick_value(trigger.nick, 'latitude', latitude)
-    bot.db.set_nick_value(trigger.nick, 'longitude', longitude)
-    bot.db.set_nick_value(trigger.nick, 'location', location)
+    set_prefs(bot, trigger.nick, latitude=latitude, longitude=longitude, location=location)
 
     return bot.reply('I now have you at {}'.format(location))
+
+
+@commands('wboard')
+@example('.wboard')
+@example('.wboard #channel')
+@timed('wboard')
+def weather_board(bot, trigger):
+    """.wboard [#channel] - Show the weather for everyone in a channel who has set a location."""
+    if bot.config.weather.weather_api_key is None or bot.config.weather.weather_api_key == '':
+        return bot.reply("Weather API key missing. Please configure this module.")
+
+    if trigger.group(2):
+        channel = Identifier(trigger.group(2).split()[0])
+    elif not trigger.is_privmsg:
+        channel = trigger.sender
+    else:
+        return bot.reply('Which channel? Try {}wboard #channel'.format(bot.config.core.help_prefix))
+    return show_board(bot, trigger, channel)
+
+
+@require_owner
+@commands('weatherstats')
+def weather_stats(bot, trigger):
+    """.weatherstats - Show lookoutside cache, quota and latency statistics (owner only)."""
+    stats = []
+    for name, cache in sorted(bot.memory['lookoutside_caches'].items()):
+        line = ('{name}: {size}/{maxsize} entries, {hits} hits, {misses} misses '
+                '({rate:.0f}% hit rate), {evictions} evictions'.format(
+                    name=name,
+                    rate=cache.stats()['hit_rate'] * 100,
+                    **cache.stats()
+                ))
+        if cache.stale_ttl:
+            line += ', {} served stale'.format(cache.stale_hits)
+        stats.append(line)
+    flight = bot.memory['lookoutside_flight']
+    stats.append('single-flight: {} upstream calls, {} shared'.format(flight.calls, flight.shared))
+    stats.append('prefetch: {} hot cells tracked, {} refreshes'.format(
+        len(bot.memory['lookoutside_hot']), bot.memory['lookoutside_prefetches']))
+    http_cache = bot.memory.get('lookoutside_http_cache')
+    if http_cache is not None:
+        stats.append('http cache: {} responses, {:.1f}/{} MB, {} hits, {} revalidated, {} served stale, '
+                     '{} misses, {} evictions'.format(
+                         len(http_cache), http_cache.size / 1024 / 1024, bot.config.weather.http_cache_mb,
+                         http_cache.hits, http_cache.revalidated, http_cache.stale, http_cache.misses,
+                         http_cache.evictions))
+    snapshot = bot.memory.get('lookoutside_airnow_snapshot')
+    if snapshot is not None:
+        stats.append('airnow snapshot: {} reporting areas, fetched {:.0f} min ago'.format(
+            len(snapshot['index']), (time.time() - snapshot['fetched']) / 60))
+    gazetteer = bot.memory.get('lookoutside_gazetteer')
+    if gazetteer is not None:
+        stats.append('gazetteer: {} places, {} hits, {} misses'.format(
+            len(gazetteer), gazetteer.hits, gazetteer.misses))
+    for name, quota in sorted(bot.memory['lookoutside_quotas'].items()):
+        minute, day = quota.remaining()
+        stats.append('quota {name}: {minute} left this minute, {day} left today, {rejected} refused'.format(
+            name=name,
+            minute='unlimited' if minute is None else '{}/{}'.format(minute, quota.per_minute),
+            day='unlimited' if day is None else '{}/{}'.format(day, quota.per_day),
+            rejected=quota.rejected
+        ))
+
+    for name, breaker in sorted(bot.memory['lookoutside_breakers'].items()):
+        stats.append('breaker {}: {}, {} trips, {} refused'.format(name, breaker.state, breaker.trips, breaker.refused))
+
+    metrics = bot.memory['lookoutside_metrics']
+    for provider, histogram in sorted(metrics.latency.items()):
+        stats.append('{provider}: {count} requests, p50 {p50:.0f} ms, p95 {p95:.0f} ms, {errors} errors'.format(
+            provider=provider,
+            count=histogram.count,
+            p50=histogram.quantile(0.5) * 1000,
+            p95=histogram.quantile(0.95) * 1000,
+            errors=metrics.errors[provider]
+        ))
+    for command, histogram in sorted(metrics.commands.items()):
+        stats.append('.{command}: {count} runs, {total:.1f} s total, p95 {p95:.0f} ms, {errors} errors'.format(
+            command=command,
+            count=histogram.count,
+            total=histogram.sum,
+            p95=histogram.quantile(0.95) * 1000,
+            errors=metrics.command_errors[command]
+        ))
+
+    # packed, so the reply doesn't trip flood protection
+    for line in pack_lines(stats):
+        bot.say(line, trigger.nick)
+
+
+@interval(60)
+def prefetch_hot(bot):
+    """Refresh the most requested weather and AQI cells shortly before their cache entries expire."""
+    if 'lookoutside_hot' not in bot.memory:
+        return
+    now = time.time()
+    hot = bot.memory['lookoutside_hot']
+    if now - hot.decayed >= DECAY_INTERVAL:
+        hot.decay()
+
+    # failures are counted by the transport; the next request just fetches as usual
+    for provider, latitude, longitude in due(bot, now):
+        bot.memory['lookoutside_executor'].submit(provider.refresh, bot, latitude, longitude)
+        bot.memory['lookoutside_prefetches'] += 1
+
+
+@interval(60)
+def refresh_airnow_snapshot(bot):
+    """Fetch AirNow's reporting areas for airnow_regions in bulk once a new hour is published."""
+    if not bot.memory.get('lookoutside_airnow_regions'):
+        return
+    snapshot = bot.memory['lookoutside_airnow_snapshot']
+    if snapshot is not None and time.time() < snapshot['expires']:
+        return
+    from .providers.weather.airnow import refresh_snapshot
+
+    # failures are counted by the transport; until one succeeds, lookups query AirNow per point
+    bot.memory['lookoutside_executor'].submit(
+        bot.memory['lookoutside_flight'].do, ('airnow', 'snapshot'), refresh_snapshot, bot)
+
+
+@interval(15)
+def write_metrics(bot):
+    """Write the Prometheus text file every ``metrics_interval`` seconds, when configured."""
+    path = bot.config.weather.metrics_file
+    if not path or 'lookoutside_metrics' not in bot.memory:
+        return
+    now = time.time()
+    if now - bot.memory['lookoutside_metrics_written'] < bot.config.weather.metrics_interval:
+        return
+    bot.memory['lookoutside_metrics_written'] = now
+    write_atomically(path, bot.memory['lookoutside_metrics'].prometheus(
+        bot.memory['lookoutside_caches'], bot.memory['lookoutside_flight'], bot.memory['lookoutside_quotas'],
+        bot.memory['lookoutside_breakers']))
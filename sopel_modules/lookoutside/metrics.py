@@ -0,0 +1,140 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import bisect
+import collections
+import os
+import threading
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """Fixed-bucket histogram; observing a value is one bisect and two additions."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def cumulative(self):
+        """Yield ``(le, cumulative count)`` pairs, Prometheus style."""
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            yield repr(bound), seen
+        yield '+Inf', self.count
+
+
+class Metrics(object):
+    """Upstream latency, status and error counts, and per-command totals."""
+
+    def __init__(self):
+        self.latency = collections.defaultdict(Histogram)
+        self.statuses = collections.Counter()
+        self.errors = collections.Counter()
+        self.commands = collections.defaultdict(Histogram)
+        self.command_errors = collections.Counter()
+        self._lock = threading.Lock()
+
+    def observe_request(self, provider, seconds, status):
+        """Record one upstream call; ``status`` is the HTTP status or an exception name."""
+        with self._lock:
+            self.latency[provider].observe(seconds)
+            self.statuses[provider, str(status)] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[provider] += 1
+
+    def observe_command(self, command, seconds, error=False):
+        with self._lock:
+            self.commands[command].observe(seconds)
+            if error:
+                self.command_errors[command] += 1
+
+    def prometheus(self, caches=None, flight=None, quotas=None, breakers=None):
+        """Render everything in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            _histogram(lines, 'lookoutside_upstream_request_duration_seconds',
+                       'Upstream request latency.', 'provider', self.latency)
+            lines.append('# HELP lookoutside_upstream_requests_total Upstream requests by status.')
+            lines.append('# TYPE lookoutside_upstream_requests_total counter')
+            for (provider, status), count in sorted(self.statuses.items()):
+                lines.append('lookoutside_upstream_requests_total{{provider="{}",status="{}"}} {}'.format(
+                    provider, status, count))
+            _histogram(lines, 'lookoutside_command_duration_seconds',
+                       'Command handling time.', 'command', self.commands)
+            lines.append('# HELP lookoutside_command_errors_total Commands that raised.')
+            lines.append('# TYPE lookoutside_command_errors_total counter')
+            for command, count in sorted(self.command_errors.items()):
+                lines.append('lookoutside_command_errors_total{{command="{}"}} {}'.format(command, count))
+
+        for field, kind in (('hits', 'counter'), ('stale_hits', 'counter'), ('misses', 'counter'),
+                            ('evictions', 'counter'), ('size', 'gauge')):
+            name = 'lookoutside_cache_{}'.format(field if kind == 'gauge' else field + '_total')
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for cache_name, cache in sorted((caches or {}).items()):
+                lines.append('{}{{cache="{}"}} {}'.format(name, cache_name, cache.stats()[field]))
+
+        if flight is not None:
+            lines.append('# TYPE lookoutside_singleflight_calls_total counter')
+            lines.append('lookoutside_singleflight_calls_total {}'.format(flight.calls))
+            lines.append('# TYPE lookoutside_singleflight_shared_total counter')
+            lines.append('lookoutside_singleflight_shared_total {}'.format(flight.shared))
+
+        if quotas:
+            lines.append('# TYPE lookoutside_quota_remaining gauge')
+            for name, quota in sorted(quotas.items()):
+                for window, left in zip(('minute', 'day'), quota.remaining()):
+                    if left is not None:
+                        lines.append('lookoutside_quota_remaining{{provider="{}",window="{}"}} {}'.format(
+                            name, window, left))
+            lines.append('# TYPE lookoutside_quota_rejected_total counter')
+            for name, quota in sorted(quotas.items()):
+                lines.append('lookoutside_quota_rejected_total{{provider="{}"}} {}'.format(name, quota.rejected))
+        if breakers:
+            lines.append('# TYPE lookoutside_breaker_open gauge')
+            for name, breaker in sorted(breakers.items()):
+                lines.append('lookoutside_breaker_open{{provider="{}"}} {}'.format(
+                    name, int(breaker.state != 'closed')))
+            lines.append('# TYPE lookoutside_breaker_trips_total counter')
+            for name, breaker in sorted(breakers.items()):
+                lines.append('lookoutside_breaker_trips_total{{provider="{}"}} {}'.format(name, breaker.trips))
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram(lines, name, help_text, label, histograms):
+    lines.append('# HELP {} {}'.format(name, help_text))
+    lines.append('# TYPE {} histogram'.format(name))
+    for key, histogram in sorted(histograms.items()):
+        for le, count in histogram.cumulative():
+            lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(name, label, key, le, count))
+        lines.append('{}_sum{{{}="{}"}} {}'.format(name, label, key, histogram.sum))
+        lines.append('{}_count{{{}="{}"}} {}'.format(name, label, key, histogram.count))
+
+
+def write_atomically(path, text):
+    """Replace ``path`` with ``text`` so a scraper never reads half a file."""
+    tmp = '{}.tmp'.format(path)
+    with open(tmp, 'w') as output:
+        output.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,99 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+
+from .cache import grid_key
+from .providers import get_provider
+
+# Counts are halved this often, so the sketch follows what is popular now
+DECAY_INTERVAL = 60 * 60
+# Cells asked for fewer times than this since the last decay aren't worth an upstream call
+MIN_HITS = 2
+
+
+class HeavyHitters(object):
+    """Space-Saving sketch of the most requested keys.
+
+    At most ``capacity`` keys are tracked however many distinct ones are
+    seen. A newcomer replaces the least counted key and inherits its count,
+    so a key that really is among the most frequent is never pushed out.
+    """
+
+    def __init__(self, capacity=100, clock=time.time):
+        self.capacity = capacity
+        self.clock = clock
+        self.decayed = clock()
+        self._counts = {}
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, key, payload=None):
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                count = 0
+                if len(self._counts) >= self.capacity:
+                    victim = min(self._counts, key=self._counts.get)
+                    count = self._counts.pop(victim)
+                    del self._payloads[victim]
+            self._counts[key] = count + 1
+            self._payloads[key] = payload
+
+    def decay(self):
+        """Halve every count, forgetting keys that drop to zero."""
+        with self._lock:
+            for key in list(self._counts):
+                self._counts[key] //= 2
+                if not self._counts[key]:
+                    del self._counts[key]
+                    del self._payloads[key]
+            self.decayed = self.clock()
+
+    def top(self):
+        """Return ``(key, count, payload)`` for every tracked key, most counted first."""
+        with self._lock:
+            return [(key, count, self._payloads[key])
+                    for key, count in sorted(self._counts.items(), key=lambda item: -item[1])]
+
+
+def record(bot, capability, latitude, longitude):
+    """Count a request for ``capability`` ('weather' or 'aqi') at this point."""
+    cell = grid_key(latitude, longitude, bot.config.weather.grid_precision)
+    bot.memory['lookoutside_hot'].add((capability, cell), (latitude, longitude))
+
+
+def due(bot, now):
+    """Return up to ``prefetch_budget`` ``(provider, latitude, longitude)`` hot points about to go stale."""
+    budget = bot.config.weather.prefetch_budget
+    margin = bot.config.weather.prefetch_margin
+    providers = {
+        'weather': bot.config.weather.weather_provider,
+        'aqi': bot.config.weather.aqi_provider,
+    }
+
+    refreshes = []
+    for (capability, cell), count, (latitude, longitude) in bot.memory['lookoutside_hot'].top():
+        if count < MIN_HITS or len(refreshes) >= budget:
+            break
+        provider = get_provider(providers[capability], capability)
+        # leave what is left of a provider's limits to people who are waiting
+        quota = bot.memory['lookoutside_quotas'].get(providers[capability])
+        if quota is not None and not quota.spare():
+            continue
+        # nor spend a half-open breaker's one trial request on it
+        breaker = bot.memory['lookoutside_breakers'].get(providers[capability])
+        if breaker is not None and breaker.state != 'closed':
+            continue
+        stale_at = provider.stale_at(bot, latitude, longitude)
+        if stale_at is None:
+            continue
+        if provider.refresh_early:
+            stale_at -= margin
+        if stale_at <= now:
+            refreshes.append((provider, latitude, longitude))
+    return refreshes
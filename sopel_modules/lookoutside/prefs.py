@@ -0,0 +1,152 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+
+PREFS_KEY = 'lookoutside'
+
+DEFAULTS = {
+    'latitude': None,
+    'longitude': None,
+    'location': None,
+    'units': None,
+    'show_condition': True,
+    'show_humidity': True,
+    'show_sunriseset': True,
+    'show_wind': True,
+    'show_aqi': True,
+    'nag': 0,
+}
+
+# Display preferences cleared by ".weatherset reset"; the saved location is kept
+DISPLAY_PREFS = ['units', 'show_condition', 'show_humidity', 'show_sunriseset', 'show_wind', 'show_aqi']
+
+# Also kept in their own per-nick keys, which other plugins may read
+SHARED_PREFS = ['latitude', 'longitude', 'location']
+
+# Per-nick keys used before everything moved into one record
+LEGACY_KEYS = {
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'location': 'location',
+    'units': 'weather-units',
+    'show_condition': 'weather-show-condition',
+    'show_humidity': 'weather-show-humidity',
+    'show_sunriseset': 'weather-show-sunriseset',
+    'show_wind': 'weather-show-wind',
+    'show_aqi': 'weather-show-aqi',
+    'nag': 'weather-config-nag',
+}
+
+# Cached for a nick without a record, so boards don't query for them every time; short-lived,
+# since another plugin may save their location
+NO_RECORD = {}
+NO_RECORD_TTL = 10 * 60
+
+_lock = threading.Lock()
+
+
+def _cache_key(nick):
+    return nick.lower()
+
+
+def _migrate(bot, nick):
+    prefs = dict(DEFAULTS)
+    found = []
+    for name, legacy_key in LEGACY_KEYS.items():
+        value = bot.db.get_nick_value(nick, legacy_key)
+        if value is None:
+            continue
+        found.append(name)
+        if name.startswith('show_'):
+            # stored as the strings "true"/"false" by .weatherset
+            value = value not in (False, 'false')
+        prefs[name] = value
+
+    bot.db.set_nick_value(nick, PREFS_KEY, prefs)
+    # latitude/longitude/location may be shared with other plugins, so keep those
+    for name in found:
+        if name not in SHARED_PREFS:
+            bot.db.delete_nick_value(nick, LEGACY_KEYS[name])
+    return prefs
+
+
+def _observe_db(bot, start):
+    metrics = bot.memory.get('lookoutside_metrics')
+    if metrics is not None:
+        metrics.observe_request('db', time.perf_counter() - start, 200)
+
+
+def _load(bot, nick):
+    cache = bot.memory['lookoutside_prefs']
+    prefs = cache.get(_cache_key(nick))
+    # NO_RECORD is empty, so a nick known to have no record gets one created here
+    if not prefs:
+        start = time.perf_counter()
+        prefs = bot.db.get_nick_value(nick, PREFS_KEY)
+        _observe_db(bot, start)
+        if prefs is None:
+            prefs = _migrate(bot, nick)
+        else:
+            prefs = dict(DEFAULTS, **prefs)
+        cache.set(_cache_key(nick), prefs)
+    return prefs
+
+
+def get_prefs(bot, nick):
+    """Return a copy of ``nick``'s lookoutside record, loading it with a single query on a cache miss."""
+    with _lock:
+        return dict(_load(bot, nick))
+
+
+def saved_prefs(bot, nick):
+    """Like :func:`get_prefs`, but return None rather than create a record for a nick that has none."""
+    cache = bot.memory['lookoutside_prefs']
+    prefs = cache.get(_cache_key(nick))
+    if prefs is None:
+        # read without the lock, so a board of a big channel doesn't hold up every other lookup
+        start = time.perf_counter()
+        prefs = bot.db.get_nick_value(nick, PREFS_KEY)
+        _observe_db(bot, start)
+        if prefs is not None:
+            prefs = dict(DEFAULTS, **prefs)
+        elif bot.db.get_nick_value(nick, LEGACY_KEYS['latitude']) is None:
+            prefs = NO_RECORD
+        with _lock:
+            # a record saved meanwhile wins over what was read
+            cached = cache.peek(_cache_key(nick))
+            if cached is not None:
+                prefs = cached[0]
+            elif prefs is None:
+                prefs = _load(bot, nick)
+            elif prefs is NO_RECORD:
+                cache.set(_cache_key(nick), prefs, ttl=NO_RECORD_TTL)
+            else:
+                cache.set(_cache_key(nick), prefs)
+    if prefs is NO_RECORD:
+        return None
+    return dict(prefs)
+
+
+def set_prefs(bot, nick, **changes):
+    """Update fields of ``nick``'s record, writing through to the database.
+
+    A changed latitude, longitude or location is also written to its own
+    key, so other plugins see where the nick is now.
+    """
+    with _lock:
+        old = _load(bot, nick)
+        prefs = dict(old, **changes)
+        start = time.perf_counter()
+        bot.db.set_nick_value(nick, PREFS_KEY, prefs)
+        for name in SHARED_PREFS:
+            if prefs[name] != old[name]:
+                bot.db.set_nick_value(nick, LEGACY_KEYS[name], prefs[name])
+        _observe_db(bot, start)
+        bot.memory['lookoutside_prefs'].set(_cache_key(nick), prefs)
+        return dict(prefs)
+
+
+def reset_prefs(bot, nick):
+    return set_prefs(bot, nick, **dict((name, DEFAULTS[name]) for name in DISPLAY_PREFS))
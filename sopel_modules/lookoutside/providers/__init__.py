@@ -0,0 +1,181 @@
+# coding=utf-8
+"""Provider registry.
+
+Providers are looked up by name, first among the built-ins below and then
+in the ``sopel_modules.lookoutside.providers`` entry point group, so a
+separately installed package can add a backend. Nothing is imported until
+a provider is first asked for.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import importlib
+import threading
+
+ENTRY_POINT_GROUP = 'sopel_modules.lookoutside.providers'
+
+# name -> "module:attribute" of a Provider instance
+BUILTIN_PROVIDERS = {
+    'openweathermap': 'sopel_modules.lookoutside.providers.weather.openweathermap:PROVIDER',
+    'airnow': 'sopel_modules.lookoutside.providers.weather.airnow:PROVIDER',
+    'locationiq': 'sopel_modules.lookoutside.providers.geocoords.locationiq:PROVIDER',
+}
+
+# capability -> settings naming its provider and the comma-separated ones to fall back to
+CHAIN_SETTINGS = {
+    'weather': ('weather_provider', 'weather_fallback'),
+    'forecast': ('weather_provider', 'weather_fallback'),
+    'hourly': ('weather_provider', 'weather_fallback'),
+    'aqi': ('aqi_provider', 'aqi_fallback'),
+    'geocode': ('geocoords_provider', 'geocoords_fallback'),
+}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+class Provider(object):
+    """Common interface for weather, forecast, AQI and geocoding backends.
+
+    A provider lists what it can do in ``capabilities`` and implements the
+    matching methods; each has a sync and a coroutine form, and the
+    coroutine form defaults to running the sync one on the worker pool,
+    once for all identical calls in flight. Geocoding is only ever done
+    on the pool, so :meth:`geocode` has no coroutine form.
+    """
+    name = None
+    capabilities = frozenset()
+    # one upstream request can answer several coordinates
+    multi_point = False
+    # has hour-by-hour data, not just current conditions and days
+    hourly = False
+    # endpoints worth opening a connection to at startup
+    urls = ()
+    # refreshing shortly before stale_at() can return newer data
+    refresh_early = True
+
+    def weather(self, bot, latitude, longitude, location):
+        raise NotImplementedError
+
+    def forecast(self, bot, latitude, longitude, location):
+        raise NotImplementedError
+
+    def hourly_forecast(self, bot, latitude, longitude, location):
+        raise NotImplementedError
+
+    def aqi(self, bot, latitude, longitude):
+        raise NotImplementedError
+
+    def geocode(self, bot, query):
+        """Return ``(latitude, longitude, location)`` for ``query``."""
+        raise NotImplementedError
+
+    async def weather_many_async(self, bot, points):
+        """Return current conditions for each ``(latitude, longitude, location)`` in ``points``.
+
+        Only called when ``multi_point`` is set, so a provider can answer
+        them all with one upstream request.
+        """
+        raise NotImplementedError
+
+    def warm_urls(self, bot):
+        """Return the endpoints to open a connection to at startup; ``urls`` unless they depend on config."""
+        return self.urls
+
+    def stale_at(self, bot, latitude, longitude):
+        """Return when the cached answer for a point stops being current.
+
+        0 means nothing is cached; None means the point can't be prefetched.
+        """
+        return None
+
+    def refresh(self, bot, latitude, longitude):
+        """Fetch a point from upstream, replacing its cached answer."""
+        raise NotImplementedError
+
+    async def weather_async(self, bot, latitude, longitude, location):
+        return await self._call_async(bot, self.weather, latitude, longitude, location)
+
+    async def forecast_async(self, bot, latitude, longitude, location):
+        return await self._call_async(bot, self.forecast, latitude, longitude, location)
+
+    async def hourly_forecast_async(self, bot, latitude, longitude, location):
+        return await self._call_async(bot, self.hourly_forecast, latitude, longitude, location)
+
+    async def aqi_async(self, bot, latitude, longitude):
+        return await self._call_async(bot, self.aqi, latitude, longitude)
+
+    async def _call_async(self, bot, method, *args):
+        # identical lookups in flight share one worker thread; the rest wait on the loop
+        return await bot.memory['lookoutside_flight'].do_async(
+            (self.name, method.__name__) + args, bot.memory['lookoutside_engine'], method, bot, *args)
+
+
+def revalidate(bot, cache, key, flight_key, function, *args):
+    """Refresh a stale ``cache`` entry on the worker pool, unless it is fresh again by then."""
+    def refresh():
+        if key not in cache:
+            bot.memory['lookoutside_flight'].do(flight_key, function, *args)
+    # a failure leaves the stale entry in place; the transport has already counted it
+    bot.memory['lookoutside_executor'].submit(refresh)
+
+
+def _load(name):
+    target = BUILTIN_PROVIDERS.get(name)
+    if target is not None:
+        module_name, attribute = target.split(':')
+        return getattr(importlib.import_module(module_name), attribute)
+
+    # only pay for scanning installed packages when a non-builtin is configured
+    import pkg_resources
+    for entry_point in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP, name):
+        return entry_point.load()
+    return None
+
+
+def get_provider(name, capability=None):
+    """Return the provider called ``name``, checking it supports ``capability``."""
+    with _lock:
+        if name not in _loaded:
+            _loaded[name] = _load(name)
+        provider = _loaded[name]
+
+    if provider is None:
+        raise Exception('Error: Unknown Provider {}'.format(name))
+    if capability is not None and capability not in provider.capabilities:
+        raise Exception('Error: Unsupported Provider {} for {}'.format(name, capability))
+    return provider
+
+
+def provider_names(bot, capability):
+    """Return the configured provider for ``capability`` followed by its fallbacks, in order."""
+    primary, fallbacks = CHAIN_SETTINGS[capability]
+    names = [getattr(bot.config.weather, primary)]
+    for name in getattr(bot.config.weather, fallbacks).split(','):
+        if name.strip() and name.strip() not in names:
+            names.append(name.strip())
+    return names
+
+
+def call_chain(bot, capability, method, *args):
+    """Call ``method`` on each provider for ``capability`` until one answers; raise the last error if none does.
+
+    A provider whose breaker is open fails at once without a request, so
+    the next one is tried straight away.
+    """
+    error = None
+    for name in provider_names(bot, capability):
+        try:
+            return getattr(get_provider(name, capability), method)(bot, *args)
+        except Exception as e:
+            error = e
+    raise error
+
+
+async def call_chain_async(bot, capability, method, *args):
+    error = None
+    for name in provider_names(bot, capability):
+        try:
+            return await getattr(get_provider(name, capability), method)(bot, *args)
+        except Exception as e:
+            error = e
+    raise error
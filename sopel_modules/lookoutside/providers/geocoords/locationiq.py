@@ -0,0 +1,61 @@
+# coding=utf-8
+from .. import Provider
+
+LOCATIONIQ_URLS = {
+    'us': 'https://us1.locationiq.com/v1/search.php',
+    'eu': 'https://eu1.locationiq.com/v1/search.php',
+}
+
+
+def locationiq_geocode(bot, query):
+    url = LOCATIONIQ_URLS[bot.config.weather.geocoords_region]
+    data = {
+        'key': bot.config.weather.geocoords_api_key,
+        'q': query,
+        'format': 'json',
+        'addressdetails': 1,
+        'limit': 1
+    }
+    r = bot.memory['lookoutside_http'].get('locationiq', url, params=data, ttl=bot.config.weather.geocache_ttl)
+    results = r.json()
+    if r.status_code != 200:
+        raise Exception(results['error'])
+    latitude = results[0]['lat']
+    longitude = results[0]['lon']
+    address = results[0]['address']
+
+    # Zip codes give us town versus city
+    if 'city' in address.keys():
+        location = '{}, {}, {}'.format(address['city'],
+                                       address['state'],
+                                       address['country_code'].upper())
+    elif 'town' in address.keys():
+        location = '{}, {}, {}'.format(address['town'],
+                                       address['state'],
+                                       address['country_code'].upper())
+    elif 'county' in address.keys():
+        location = '{}, {}, {}'.format(address['county'],
+                                       address['state'],
+                                       address['country_code'].upper())
+    elif 'city_district' in address.keys():
+        location = '{}, {}'.format(address['city_district'],
+                                   address['country_code'].upper())
+    else:
+        location = 'Unknown'
+
+    return latitude, longitude, location
+
+
+class LocationIQ(Provider):
+    name = 'locationiq'
+    capabilities = frozenset(['geocode'])
+
+    def geocode(self, bot, query):
+        return locationiq_geocode(bot, query)
+
+    def warm_urls(self, bot):
+        # only the configured region's host is ever asked
+        return (LOCATIONIQ_URLS[bot.config.weather.geocoords_region],)
+
+
+PROVIDER = LocationIQ()
@@ -1,23 +1,186 @@
 # coding=utf-8
-import requests
+import time
 from datetime import datetime
 
+from .. import Provider, revalidate
+from ...cache import grid_key
+from ...spatial import GridIndex, in_boxes
+
+AIRNOW_URL = 'https://www.airnowapi.org/aq/observation/latLong/current/'
+# Every reporting area's forecasts and latest observations, republished hourly; no key needed
+AIRNOW_SNAPSHOT_URL = 'https://files.airnowtech.org/airnow/today/reportingarea.dat'
+# Transport provider name for the file host: it has no quota, and its own breaker, so a slow
+# bulk download can't trip the API's (or the API's failures stop the download)
+AIRNOW_FILES = 'airnow-files'
+
+# reportingarea.dat parameter names, and the prefix of the fields they fill
+SNAPSHOT_PARAMETERS = {'OZONE': 'o3', 'O3': 'o3', 'PM2.5': 'pm'}
+# A snapshot this long past its next expected update is answered with its age
+SNAPSHOT_GRACE = 10 * 60
+
+
+def airnow_distances(max_distance):
+    # widen the search geometrically (5, 10, 20, 40...) rather than 5 miles at a time
+    distance = 5
+    while distance < max_distance:
+        yield distance
+        distance *= 2
+    yield max_distance
+
+
+def next_observation(now, publish_delay):
+    # AirNow publishes a new observation once an hour, some minutes past the hour
+    expires = now - now % 3600 + publish_delay
+    if expires <= now:
+        expires += 3600
+    return expires
+
+
+def observation_ttl(bot):
+    """Seconds until AirNow publishes its next observation, for the disk cache."""
+    now = time.time()
+    return next_observation(now, bot.config.weather.airnow_publish_delay) - now
+
+
+def airnow_cached(bot, key):
+    """Return ``(True, observations)`` if grid cell ``key`` can be answered from cache."""
+    # don't repeat a search that already came up empty for this area
+    if key in bot.memory['lookoutside_airnow_miss']:
+        return True, None
+
+    # everyone in the same reporting area shares one fetch per observation hour
+    area = bot.memory['lookoutside_aqi_areas'].get(key)
+    if area is not None:
+        cached = bot.memory['lookoutside_aqi'].lookup(area)
+        if cached is not None:
+            airnow_data, age = cached
+            if age is not None:
+                # answer with the last reading while the new one is fetched
+                latitude, longitude = key.split(',')
+                revalidate(bot, bot.memory['lookoutside_aqi'], area, ('airnow', key),
+                           airnow_search, bot, latitude, longitude, key)
+                airnow_data = dict(airnow_data, age=age)
+            return True, airnow_data
+    return False, None
+
+
+def reporting_areas(text, boxes):
+    """Index the latest observations of each reporting area in ``boxes`` from reportingarea.dat."""
+    areas = {}
+    for line in text.splitlines():
+        # IssueDate|ValidDate|ValidTime|TimeZone|Sequence|DataType|Primary|ReportingArea|StateCode|
+        # Latitude|Longitude|ParameterName|AQIValue|AQICategory|ActionDay|Discussion|ForecastSource
+        fields = line.split('|')
+        if len(fields) < 14 or fields[5] != 'O' or fields[11] not in SNAPSHOT_PARAMETERS:
+            continue
+        try:
+            latitude, longitude = float(fields[9]), float(fields[10])
+        except ValueError:
+            continue
+        if not in_boxes(boxes, latitude, longitude):
+            continue
+
+        area = areas.setdefault((fields[7], fields[8]), (latitude, longitude, {}))[2]
+        if fields[7]:
+            area['reporting_area'] = fields[7]
+        if fields[8]:
+            area['state'] = fields[8]
+        parameter = SNAPSHOT_PARAMETERS[fields[11]]
+        if fields[12].strip().isdigit():
+            area[parameter + '_aqi'] = int(fields[12])
+        if fields[13]:
+            area[parameter + '_status'] = fields[13]
+    return GridIndex(area for area in areas.values() if 'o3_aqi' in area[2] or 'pm_aqi' in area[2])
+
+
+def refresh_snapshot(bot):
+    """Fetch reportingarea.dat and replace the in-memory snapshot for ``airnow_regions``."""
+    r = bot.memory['lookoutside_http'].get(AIRNOW_FILES, AIRNOW_SNAPSHOT_URL, ttl=observation_ttl(bot))
+    if r.status_code != 200:
+        raise Exception('Error: AirNow returned HTTP {}'.format(r.status_code))
+    now = time.time()
+    boxes = bot.memory['lookoutside_airnow_regions']
+    # swapped in whole, so lookups never see a half-built index
+    bot.memory['lookoutside_airnow_snapshot'] = {
+        'index': reporting_areas(r.text, boxes),
+        'boxes': boxes,
+        'fetched': now,
+        'expires': next_observation(now, bot.config.weather.airnow_publish_delay),
+    }
+    return len(bot.memory['lookoutside_airnow_snapshot']['index'])
+
+
+def snapshot_aqi(bot, latitude, longitude):
+    """Return ``(True, observations)`` if the regional snapshot covers this point."""
+    snapshot = bot.memory.get('lookoutside_airnow_snapshot')
+    if snapshot is None or not in_boxes(snapshot['boxes'], latitude, longitude):
+        return False, None
+    now = time.time()
+    late = now - snapshot['expires']
+    # too old to trust; ask about this point until the snapshot is refreshed
+    if late > bot.config.weather.aqi_stale_ttl:
+        return False, None
+
+    nearest = snapshot['index'].nearest(latitude, longitude, bot.config.weather.airnow_max_distance)
+    if nearest is None:
+        return True, None
+    if late > SNAPSHOT_GRACE:
+        return True, dict(nearest[1], age=now - snapshot['fetched'])
+    return True, nearest[1]
+
+
 def airnow_aqi(bot, latitude, longitude):
+    """Return the nearest AirNow observations, or None if no monitor is in range."""
+    covered, airnow_data = snapshot_aqi(bot, latitude, longitude)
+    if covered:
+        return airnow_data
+    key = grid_key(latitude, longitude, bot.config.weather.grid_precision)
+    cached, airnow_data = airnow_cached(bot, key)
+    if cached:
+        return airnow_data
+    return bot.memory['lookoutside_flight'].do(('airnow', key), airnow_search, bot, latitude, longitude, key)
+
+
+async def airnow_aqi_async(bot, latitude, longitude):
+    covered, airnow_data = snapshot_aqi(bot, latitude, longitude)
+    if covered:
+        return airnow_data
+    key = grid_key(latitude, longitude, bot.config.weather.grid_precision)
+    cached, airnow_data = airnow_cached(bot, key)
+    if cached:
+        return airnow_data
+    return await bot.memory['lookoutside_flight'].do_async(
+        ('airnow', key), bot.memory['lookoutside_engine'], airnow_search, bot, latitude, longitude, key)
+
+
+def airnow_search(bot, latitude, longitude, key, force=False):
+    """Search outwards from a point for a monitor; unless ``force``, a fresh cached answer is returned instead."""
+    if not force:
+        if key in bot.memory['lookoutside_airnow_miss']:
+            return None
+        area = bot.memory['lookoutside_aqi_areas'].peek(key)
+        cached = bot.memory['lookoutside_aqi'].peek(area[0]) if area is not None else None
+        if cached is not None:
+            return cached[0]
     lat = '%.2f' % float(latitude)
     lon = '%.2f' % float(longitude)
-    distance = 5
-    success = False
+    max_distance = bot.config.weather.airnow_max_distance
+    transport = bot.memory['lookoutside_http']
 
-    while success is False:
-        url = "https://www.airnowapi.org/aq/observation/latLong/current/?format=application/json&latitude={}&longitude={}&distance={}&API_KEY={}".format(
+    # widening the radius is one lookup, so it costs one request of the quota however many it takes
+    transport.charge('airnow')
+    for distance in airnow_distances(max_distance):
+        url = AIRNOW_URL + "?format=application/json&latitude={}&longitude={}&distance={}&API_KEY={}".format(
             lat,
             lon,
             distance,
             bot.config.weather.airnow_api_key
         )
-        r = requests.get(url)
+        r = transport.get('airnow', url, ttl=observation_ttl(bot), charge=False)
+        if r.status_code != 200:
+            raise Exception('Error: AirNow returned HTTP {}'.format(r.status_code))
         data = r.json()
-        if data and r.status_code == 200:
+        if data:
             # we have to check to see what data is avail:
             airnow_data = {}
             if data[0]['ReportingArea']:
@@ -37,8 +200,45 @@ def airnow_aqi(bot, latitude, longitude):
             
             if len(data) > 1 and data[1]['Category']['Name']:
                 airnow_data['pm_status'] = data[1]['Category']['Name']
-            
-            success = True
+
+            area = '{}|{}'.format(data[0]['ReportingArea'], data[0]['StateCode'])
+            bot.memory['lookoutside_aqi_areas'].set(key, area)
+            bot.memory['lookoutside_aqi'].set(area, airnow_data, expires=next_observation(
+                time.time(), bot.config.weather.airnow_publish_delay))
             return airnow_data
-        else:
-            distance += 5 #increase range by 5 miles until we find results
+
+    bot.memory['lookoutside_airnow_miss'].set(key, True)
+    return None
+
+
+class AirNow(Provider):
+    name = 'airnow'
+    capabilities = frozenset(['aqi'])
+    urls = (AIRNOW_URL,)
+    # observations only change when AirNow publishes, which is when the cached one expires
+    refresh_early = False
+
+    def aqi(self, bot, latitude, longitude):
+        return airnow_aqi(bot, latitude, longitude)
+
+    async def aqi_async(self, bot, latitude, longitude):
+        return await airnow_aqi_async(bot, latitude, longitude)
+
+    def stale_at(self, bot, latitude, longitude):
+        # the regional snapshot is refreshed on its own schedule
+        if snapshot_aqi(bot, latitude, longitude)[0]:
+            return None
+        key = grid_key(latitude, longitude, bot.config.weather.grid_precision)
+        if key in bot.memory['lookoutside_airnow_miss']:
+            return None
+        area = bot.memory['lookoutside_aqi_areas'].peek(key)
+        entry = area and bot.memory['lookoutside_aqi'].peek(area[0])
+        return 0 if entry is None else entry[1]
+
+    def refresh(self, bot, latitude, longitude):
+        key = grid_key(latitude, longitude, bot.config.weather.grid_precision)
+        return bot.memory['lookoutside_flight'].do(('airnow', key), airnow_search, bot, latitude, longitude, key,
+                                                   True)
+
+
+PROVIDER = AirNow()
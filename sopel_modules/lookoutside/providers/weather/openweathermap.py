@@ -1,67 +1,215 @@
 # coding=utf-8
-import requests
+import time
 from datetime import datetime
-import pytz
 
-def openweathermap_forecast(bot, latitude, longitude, location):
-    url = 'https://api.openweathermap.org/data/2.5/onecall?appid={}&lat={}&lon={}'.format(
+from .. import Provider, revalidate
+from ...cache import grid_key
+from ...snapshot import Conditions, Day, Forecast, Hour, Hourly, Series, Snapshot
+from ...solar import sun_times
+from ...timezones import format_time, get_timezone, remember_timezone
+
+ONECALL_URL = 'https://api.openweathermap.org/data/2.5/onecall'
+
+def openweathermap_onecall(bot, latitude, longitude):
+    """Return the OneCall snapshot for a point's grid cell, and its age in seconds if it is stale."""
+    # Current conditions and the daily forecast come from the same OneCall
+    # payload, so fetch both at once and share it across the grid cell
+    precision = bot.config.weather.grid_precision
+    key = grid_key(latitude, longitude, precision)
+    cached = onecall_cached(bot, key)
+    if cached is not None:
+        return cached
+    return bot.memory['lookoutside_flight'].do(('openweathermap', key), fetch_onecall, bot, key), None
+
+
+def onecall_cached(bot, key):
+    cached = bot.memory['lookoutside_onecall'].lookup(key)
+    if cached is not None and cached[1] is not None:
+        # answer now from the stale snapshot, and fetch a fresh one for next time
+        revalidate(bot, bot.memory['lookoutside_onecall'], key, ('openweathermap', key), fetch_onecall, bot, key)
+    return cached
+
+
+def fetch_onecall(bot, key, force=False):
+    """Fetch grid cell ``key``'s snapshot; unless ``force``, a fresh cached one is returned instead."""
+    if not force:
+        cached = bot.memory['lookoutside_onecall'].peek(key)
+        if cached is not None:
+            return cached[0]
+    latitude, longitude = key.split(',')
+    url = ONECALL_URL + '?appid={}&lat={}&lon={}'.format(
         bot.config.weather.weather_api_key,
         latitude,
         longitude
     )
 
     params = {
-        'exclude': 'current,minutely,hourly',
+        'exclude': 'minutely,alerts',
         'units': 'metric'
     }
-    r = requests.get(url, params=params)
+    r = bot.memory['lookoutside_http'].get('openweathermap', url, params=params,
+                                           ttl=bot.config.weather.onecall_cache_ttl)
     data = r.json()
     if r.status_code != 200:
         raise Exception('Error: {}'.format(data['message']))
-    else:
-        weather_data = {'location': location, 'data': []}
-        for day in data['daily'][0:4]:
-            weather_data['data'].append({
-                'dow': datetime.fromtimestamp(day['dt']).strftime('%A'),
-                'summary': day['weather'][0]['main'],
-                'high_temp': day['temp']['max'],
-                'low_temp': day['temp']['min']
-            })
-        return weather_data
 
+    snapshot = onecall_snapshot(data)
+    # a snapshot from the disk cache is only good for as long as it has left there
+    bot.memory['lookoutside_onecall'].set(key, snapshot, expires=getattr(r, 'expires', None))
+    remember_timezone(bot, latitude, longitude, data['timezone'])
+    return snapshot
 
-def openweathermap_weather(bot, latitude, longitude, location):
-    url = 'https://api.openweathermap.org/data/2.5/onecall?appid={}&lat={}&lon={}'.format(
-        bot.config.weather.weather_api_key,
-        latitude,
-        longitude
+
+def onecall_snapshot(data):
+    """Keep the parts of a OneCall response that the views use."""
+    current = data['current']
+    hourly = data.get('hourly', [])
+    daily = data.get('daily', [])
+    return Snapshot(
+        latitude=data['lat'],
+        longitude=data['lon'],
+        timezone=data['timezone'],
+        observed=current['dt'],
+        temp=current['temp'],
+        humidity=current['humidity'],
+        wind_speed=current['wind_speed'],
+        wind_bearing=current['wind_deg'],
+        condition=current['weather'][0]['main'],
+        hourly=Series(
+            times=[hour['dt'] for hour in hourly],
+            conditions=[hour['weather'][0]['main'] for hour in hourly],
+            highs=[hour['temp'] for hour in hourly],
+            pops=[hour.get('pop', 0) for hour in hourly]
+        ),
+        daily=Series(
+            times=[day['dt'] for day in daily],
+            conditions=[day['weather'][0]['main'] for day in daily],
+            highs=[day['temp']['max'] for day in daily],
+            lows=[day['temp']['min'] for day in daily],
+            pops=[day.get('pop', 0) for day in daily]
+        )
     )
 
-    params = {
-        'exclude': 'minutely,hourly,daily',
-        'units': 'metric'
-    }
-    r = requests.get(url, params=params)
-    data = r.json()
 
-    if r.status_code != 200:
-        raise Exception('Error: {}'.format(data['message']))
-    else:
-        weather_data = {
-            'location': location,
-            'weather_tz': data['timezone'],
-            'temp': data['current']['temp'],
-            'condition': data['current']['weather'][0]['main'],
-            'humidity': float(data['current']['humidity'] / 100),  # Normalize this to decimal percentage
-            'wind': {'speed': data['current']['wind_speed'], 'bearing': data['current']['wind_deg']},
-            'sunrise': data['current']['sunrise'],
-            'sunset': data['current']['sunset']
-        }
-
-        # convert the naive timestamp to dt obj with utc tz
-        sr_utc = datetime.fromtimestamp(weather_data['sunrise'], tz=pytz.timezone('UTC'))
-        ss_utc = datetime.fromtimestamp(weather_data['sunset'], tz=pytz.timezone('UTC'))
-        # localize for weather regions timezone
-        weather_data['sunrise'] = sr_utc.astimezone(pytz.timezone(weather_data['weather_tz'])).strftime('%I:%M %p')
-        weather_data['sunset'] = ss_utc.astimezone(pytz.timezone(weather_data['weather_tz'])).strftime('%I:%M %p')
-        return weather_data
+async def openweathermap_onecall_async(bot, latitude, longitude):
+    # answer cache hits on the event loop; only a miss needs a worker thread
+    key = grid_key(latitude, longitude, bot.config.weather.grid_precision)
+    cached = onecall_cached(bot, key)
+    if cached is not None:
+        return cached
+    return await bot.memory['lookoutside_flight'].do_async(
+        ('openweathermap', key), bot.memory['lookoutside_engine'], fetch_onecall, bot, key), None
+
+
+def forecast_view(snapshot, location, age=None):
+    daily = snapshot.daily
+    return Forecast(location=location, age=age, data=[
+        Day(
+            dow=datetime.fromtimestamp(daily.times[day]).strftime('%A'),
+            summary=daily.conditions[day],
+            high_temp=daily.highs[day],
+            low_temp=daily.lows[day]
+        ) for day in range(min(4, len(daily)))
+    ])
+
+
+def hourly_view(snapshot, location, age=None, hours=24, step=3, now=None):
+    """Every ``step`` hours for the next ``hours``, starting with the current hour."""
+    weather_tz = get_timezone(snapshot.timezone)
+    hourly = snapshot.hourly
+    now = time.time() if now is None else now
+    start = hourly.since(now - now % 3600)
+    return Hourly(location=location, age=age, data=[
+        Hour(
+            time=format_time(hourly.times[hour], weather_tz, '%I%p').lstrip('0'),
+            summary=hourly.conditions[hour],
+            temp=hourly.highs[hour],
+            pop=hourly.pops[hour]
+        ) for hour in range(start, min(start + hours, len(hourly)), step)
+    ])
+
+
+def weather_view(snapshot, location, age=None):
+    weather_tz = get_timezone(snapshot.timezone)
+    # sunrise and sunset are worked out locally for the day of the observation
+    today = datetime.fromtimestamp(snapshot.observed, tz=weather_tz).date()
+    sun = sun_times(snapshot.latitude, snapshot.longitude, today)
+
+    return Conditions(
+        location=location,
+        age=age,
+        weather_tz=snapshot.timezone,
+        temp=snapshot.temp,
+        condition=snapshot.condition,
+        humidity=float(snapshot.humidity / 100),  # Normalize this to decimal percentage
+        wind={'speed': snapshot.wind_speed, 'bearing': snapshot.wind_bearing},
+        sunrise=format_time(sun['sunrise'], weather_tz),
+        sunset=format_time(sun['sunset'], weather_tz)
+    )
+
+
+def openweathermap_forecast(bot, latitude, longitude, location):
+    data, age = openweathermap_onecall(bot, latitude, longitude)
+    return forecast_view(data, location, age)
+
+
+def openweathermap_weather(bot, latitude, longitude, location):
+    data, age = openweathermap_onecall(bot, latitude, longitude)
+    return weather_view(data, location, age)
+
+
+def openweathermap_hourly(bot, latitude, longitude, location):
+    data, age = openweathermap_onecall(bot, latitude, longitude)
+    return hourly_view(data, location, age, bot.config.weather.hourly_hours, bot.config.weather.hourly_step)
+
+
+async def openweathermap_hourly_async(bot, latitude, longitude, location):
+    data, age = await openweathermap_onecall_async(bot, latitude, longitude)
+    return hourly_view(data, location, age, bot.config.weather.hourly_hours, bot.config.weather.hourly_step)
+
+
+async def openweathermap_forecast_async(bot, latitude, longitude, location):
+    data, age = await openweathermap_onecall_async(bot, latitude, longitude)
+    return forecast_view(data, location, age)
+
+
+async def openweathermap_weather_async(bot, latitude, longitude, location):
+    data, age = await openweathermap_onecall_async(bot, latitude, longitude)
+    return weather_view(data, location, age)
+
+
+class OpenWeatherMap(Provider):
+    name = 'openweathermap'
+    capabilities = frozenset(['weather', 'forecast', 'hourly'])
+    # OneCall carries a 48 hour block
+    hourly = True
+    urls = (ONECALL_URL,)
+
+    def weather(self, bot, latitude, longitude, location):
+        return openweathermap_weather(bot, latitude, longitude, location)
+
+    def forecast(self, bot, latitude, longitude, location):
+        return openweathermap_forecast(bot, latitude, longitude, location)
+
+    def hourly_forecast(self, bot, latitude, longitude, location):
+        return openweathermap_hourly(bot, latitude, longitude, location)
+
+    def stale_at(self, bot, latitude, longitude):
+        entry = bot.memory['lookoutside_onecall'].peek(grid_key(latitude, longitude, bot.config.weather.grid_precision))
+        return 0 if entry is None else entry[1]
+
+    def refresh(self, bot, latitude, longitude):
+        key = grid_key(latitude, longitude, bot.config.weather.grid_precision)
+        return bot.memory['lookoutside_flight'].do(('openweathermap', key), fetch_onecall, bot, key, True)
+
+    async def weather_async(self, bot, latitude, longitude, location):
+        return await openweathermap_weather_async(bot, latitude, longitude, location)
+
+    async def forecast_async(self, bot, latitude, longitude, location):
+        return await openweathermap_forecast_async(bot, latitude, longitude, location)
+
+    async def hourly_forecast_async(self, bot, latitude, longitude, location):
+        return await openweathermap_hourly_async(bot, latitude, longitude, location)
+
+
+PROVIDER = OpenWeatherMap()
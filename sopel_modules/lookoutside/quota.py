@@ -0,0 +1,107 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+
+# Background work only spends from a bucket at least this full, and a day's budget at most this used
+SPARE_MINUTE = 0.5
+SPARE_DAY = 0.9
+
+
+class Quota(object):
+    """Per-minute token bucket plus a daily budget for one provider.
+
+    A limit of 0 means none. The daily count resets at midnight UTC, and
+    can be saved with :meth:`dump` so a restart doesn't hand out the day's
+    budget again. A request that can't be made at once may wait up to
+    ``timeout`` seconds for a token; one that would break the daily budget
+    is refused outright.
+    """
+
+    def __init__(self, per_minute=0, per_day=0, clock=time.time, sleep=time.sleep):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(per_minute)
+        self.used_today = 0
+        self.rejected = 0
+        self.blocked_until = 0
+        self._updated = clock()
+        self._day = int(self._updated // 86400)
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.per_minute:
+            self.tokens = min(self.per_minute, self.tokens + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+        if int(now // 86400) != self._day:
+            self._day = int(now // 86400)
+            self.used_today = 0
+
+    def _wait(self, now):
+        """Return seconds until a request may be made, or None if not before tomorrow."""
+        if self.per_day and self.used_today >= self.per_day:
+            return None
+        wait = max(0, self.blocked_until - now)
+        if self.per_minute and self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) * 60.0 / self.per_minute)
+        return wait
+
+    def acquire(self, timeout=0):
+        """Take one request from the quota, waiting up to ``timeout`` seconds; False if it can't."""
+        deadline = self.clock() + timeout
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                wait = self._wait(now)
+                if wait is not None and wait <= 0:
+                    if self.per_minute:
+                        self.tokens -= 1
+                    self.used_today += 1
+                    return True
+                if wait is None or now + wait > deadline:
+                    self.rejected += 1
+                    return False
+            self.sleep(wait)
+
+    def backoff(self, seconds):
+        """Hold every request for ``seconds``, after the provider has told us to slow down."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def spare(self):
+        """Return whether there is room for requests nobody is waiting on."""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            if self.blocked_until > now:
+                return False
+            if self.per_minute and self.tokens < self.per_minute * SPARE_MINUTE:
+                return False
+            return not self.per_day or self.used_today < self.per_day * SPARE_DAY
+
+    def remaining(self):
+        """Return ``(requests left this minute, requests left today)``, None where unlimited."""
+        with self._lock:
+            self._refill(self.clock())
+            return (int(self.tokens) if self.per_minute else None,
+                    self.per_day - self.used_today if self.per_day else None)
+
+    def dump(self):
+        """Return ``[day, requests used that day]``."""
+        with self._lock:
+            self._refill(self.clock())
+            return [self._day, self.used_today]
+
+    def load(self, state):
+        """Restore a :meth:`dump`, unless it is from an earlier day."""
+        if not state:
+            return
+        day, used = state
+        with self._lock:
+            self._refill(self.clock())
+            if day == self._day:
+                self.used_today = max(self.used_today, used)
@@ -0,0 +1,171 @@
+# coding=utf-8
+"""Output formatting.
+
+Each preference profile (units plus the fields shown) gets one renderer,
+built the first time it is seen and reused for every snapshot after that,
+so rendering a channel's worth of results does no per-field preference
+checks.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import bisect
+import functools
+
+# Upper bounds (knots) of each Beaufort force, and its name
+BEAUFORT_KNOTS = [1, 4, 7, 11, 16, 22, 28, 34, 41, 48, 56, 64]
+BEAUFORT_NAMES = [
+    'Calm', 'Light air', 'Light breeze', 'Gentle breeze', 'Moderate breeze', 'Fresh breeze',
+    'Strong breeze', 'Near gale', 'Gale', 'Strong gale', 'Storm', 'Violent storm', 'Hurricane',
+]
+
+# Upper bounds (degrees) of each compass sector, and the arrow for wind from that way
+BEARING_DEGREES = [22.5, 67.5, 112.5, 157.5, 202.5, 247.5, 292.5, 337.5]
+BEARING_ARROWS = [u'↓', u'↙', u'←', u'↖', u'↑', u'↗', u'→', u'↘', u'↓']
+
+# Fields .weatherset can hide, in display order
+WEATHER_FIELDS = ['show_condition', 'show_humidity', 'show_sunriseset', 'show_wind']
+
+
+def c_to_f(celsius):
+    return celsius * 9 / 5 + 32
+
+
+TEMPERATURE_FORMATS = {
+    'both': lambda temp: u'%d°C (%d°F)' % (round(temp), round(c_to_f(temp))),
+    'metric': lambda temp: u'%d°C' % round(temp),
+    'imperial': lambda temp: u'%d°F' % round(c_to_f(temp)),
+}
+
+SPEED_FORMATS = {
+    'both': lambda m_s, mph: '{} m/s ({} mph)'.format(m_s, mph),
+    'metric': lambda m_s, mph: '{} m/s'.format(m_s),
+    'imperial': lambda m_s, mph: '{} mph'.format(mph),
+}
+
+
+def get_temp(weather_units, temp):
+    try:
+        temp = float(temp)
+    except (KeyError, TypeError, ValueError):
+        return 'unknown'
+    # default to both if unset
+    return TEMPERATURE_FORMATS.get(weather_units, TEMPERATURE_FORMATS['both'])(temp)
+
+
+def get_humidity(humidity):
+    try:
+        humidity = int(humidity * 100)
+    except (KeyError, TypeError, ValueError):
+        return 'unknown'
+    return "Humidity: %s%%" % humidity
+
+
+def get_wind(weather_units, speed, bearing):
+    m_s = float(round(speed, 1))
+    mph = round(m_s * 2.237)
+    knots = int(round(m_s * 1.94384, 0))
+
+    description = BEAUFORT_NAMES[bisect.bisect_right(BEAUFORT_KNOTS, knots)]
+    arrow = BEARING_ARROWS[bisect.bisect_left(BEARING_DEGREES, int(bearing))]
+    speed = SPEED_FORMATS.get(weather_units, SPEED_FORMATS['both'])(m_s, mph)
+    return description + ' ' + speed + ' (' + arrow + ')'
+
+
+def age_marker(age):
+    """Return " (10 min ago)" for an answer served stale ``age`` seconds after it was fetched, else ''."""
+    if not age:
+        return ''
+    minutes = max(1, int(round(age / 60.0)))
+    if minutes < 120:
+        return ' ({} min ago)'.format(minutes)
+    return ' ({} h ago)'.format(int(round(minutes / 60.0)))
+
+
+def profile(prefs, compact=False):
+    """Return the hashable part of ``prefs`` that decides how output looks."""
+    shown = ['show_condition'] if compact else WEATHER_FIELDS
+    return prefs['units'] or 'both', tuple(name for name in shown if prefs[name])
+
+
+@functools.lru_cache(maxsize=64)
+def compile_weather(weather_units, shown, show_age=False):
+    temperature = TEMPERATURE_FORMATS.get(weather_units, TEMPERATURE_FORMATS['both'])
+    fields = {
+        'show_condition': lambda data: data['condition'],
+        'show_humidity': lambda data: get_humidity(data['humidity']),
+        'show_sunriseset': lambda data: 'Sunrise: {} Sunset: {}'.format(data['sunrise'], data['sunset']),
+        'show_wind': lambda data: get_wind(weather_units, data['wind']['speed'], data['wind']['bearing']),
+    }
+    fields = [fields[name] for name in shown]
+
+    def render(data):
+        try:
+            temp = temperature(float(data['temp']))
+        except (KeyError, TypeError, ValueError):
+            temp = 'unknown'
+        text = ', '.join([u'{}: {}'.format(data['location'], temp)] + [field(data) for field in fields])
+        if show_age:
+            text += age_marker(data.get('age'))
+        return text
+    return render
+
+
+@functools.lru_cache(maxsize=16)
+def compile_forecast(weather_units, compact, show_age=False):
+    if compact:
+        # Seattle, Washington, US: Sat Rain 14°C/8°C, Sun Clear 15°C/9°C
+        day_format, separator, head = u'{dow:.3} {summary} {high}/{low}', ', ', u'{}: '
+    else:
+        # Seattle, Washington, US :: Saturday - Rain - 14°C / 8°C :: Sunday - ...
+        day_format, separator, head = u' :: {dow} - {summary} - {high} / {low}', '', u'{}'
+
+    def render(data):
+        text = head.format(data['location']) + separator.join(day_format.format(
+            dow=day.get('dow') or '',
+            summary=day.get('summary'),
+            high=get_temp(weather_units, day.get('high_temp')),
+            low=get_temp(weather_units, day.get('low_temp'))
+        ) for day in data['data'])
+        if show_age:
+            text += age_marker(data.get('age'))
+        return text
+    return render
+
+
+@functools.lru_cache(maxsize=16)
+def compile_hourly(weather_units, compact, show_age=False):
+    # Seattle, Washington, US: 3PM 14°C Rain (40%), 6PM 12°C Clouds, ...
+    limit = 4 if compact else None
+
+    def hour_text(hour):
+        text = u'{} {} {}'.format(hour.get('time'), get_temp(weather_units, hour.get('temp')), hour.get('summary'))
+        # only worth mentioning once it is a real chance
+        if (hour.get('pop') or 0) >= 0.1:
+            text += ' ({:.0f}%)'.format(hour['pop'] * 100)
+        return text
+
+    def render(data):
+        text = u'{}: {}'.format(data['location'], ', '.join(hour_text(hour) for hour in data['data'][:limit]))
+        if show_age:
+            text += age_marker(data.get('age'))
+        return text
+    return render
+
+
+def weather_renderer(prefs, compact=False, show_age=False):
+    """Return the function that renders a weather snapshot for ``prefs``; compact shows temperature and condition only."""
+    return compile_weather(*profile(prefs, compact), show_age=show_age)
+
+
+def forecast_renderer(prefs, compact=False, show_age=False):
+    return compile_forecast(prefs['units'] or 'both', compact, show_age)
+
+
+def hourly_renderer(prefs, compact=False, show_age=False):
+    return compile_hourly(prefs['units'] or 'both', compact, show_age)
+
+
+def render_many(renderer, results, names):
+    """Render each result, or ``name: error`` for the ones that raised."""
+    return [u'{}: {}'.format(name, result) if isinstance(result, Exception) else renderer(result)
+            for name, result in zip(names, results)]
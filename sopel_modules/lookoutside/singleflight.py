@@ -0,0 +1,78 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import functools
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Collapse concurrent identical calls into one.
+
+    The first caller for a key runs the function; anyone asking for the same
+    key while it is in flight waits and gets the same result, or the same
+    exception. Coroutines use :meth:`do_async`, so only the first of them
+    takes a worker thread and the rest wait on the event loop.
+
+    A caller that missed the cache just as a flight landed starts a new one,
+    so a function that fills a cache should check it again before fetching.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._inflight = {}
+        # key -> asyncio future of the worker running do(); only touched on the event loop
+        self._awaited = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key, engine, function, *args):
+        """Await :meth:`do` on ``engine``'s worker pool, sharing one worker among coroutines asking for ``key``."""
+        import asyncio
+
+        future = self._awaited.get(key)
+        if future is None:
+            future = self._awaited[key] = engine.call(self.do, key, function, *args)
+            future.add_done_callback(functools.partial(self._landed, key))
+        else:
+            with self._lock:
+                self.shared += 1
+        # one caller timing out mustn't cancel the call for the others
+        return await asyncio.shield(future)
+
+    def _landed(self, key, future):
+        if self._awaited.get(key) is future:
+            del self._awaited[key]
@@ -0,0 +1,103 @@
+# coding=utf-8
+"""Typed containers for provider results.
+
+A :class:`Snapshot` is what gets cached for a grid cell: current
+conditions plus hour-by-hour and day-by-day :class:`Series`, each field one
+compact ``array`` instead of a list of dicts, so thousands of cached cells
+stay small. The views built from it for a command (:class:`Conditions`,
+:class:`Forecast`, :class:`Hourly`) are slotted too, and read like the
+dicts other providers may still return, so the renderers take either.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import bisect
+import sys
+from array import array
+
+
+class Record(object):
+    """Slotted record that can also be read like a dict: ``record['temp']``, ``record.get('age')``."""
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError('{} has no field {}'.format(type(self).__name__, ', '.join(sorted(fields))))
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in self.__slots__ else default
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name)) for name in self.__slots__))
+
+
+class Conditions(Record):
+    __slots__ = ('location', 'age', 'weather_tz', 'temp', 'condition', 'humidity', 'wind', 'sunrise', 'sunset')
+
+
+class Day(Record):
+    __slots__ = ('dow', 'summary', 'high_temp', 'low_temp')
+
+
+class Forecast(Record):
+    __slots__ = ('location', 'age', 'data')
+
+
+class Hour(Record):
+    __slots__ = ('time', 'summary', 'temp', 'pop')
+
+
+class Hourly(Record):
+    __slots__ = ('location', 'age', 'data')
+
+
+class Series(object):
+    """Values at successive times, one array per field.
+
+    ``highs`` is the temperature of an hourly series, and the day's high of
+    a daily one; ``lows`` is only filled for daily series. ``pops`` is the
+    probability of precipitation, 0 to 1.
+    """
+    __slots__ = ('times', 'conditions', 'highs', 'lows', 'pops')
+
+    def __init__(self, times=(), conditions=(), highs=(), lows=(), pops=()):
+        self.times = array('q', times)
+        # the same few condition names repeat, so share one string for each
+        self.conditions = tuple(sys.intern(str(condition)) for condition in conditions)
+        self.highs = array('f', highs)
+        self.lows = array('f', lows)
+        self.pops = array('f', pops)
+
+    def __len__(self):
+        return len(self.times)
+
+    def since(self, timestamp):
+        """Return the index of the first entry at or after ``timestamp``."""
+        return bisect.bisect_left(self.times, timestamp)
+
+
+class Snapshot(object):
+    """One grid cell's current conditions and forecast, as cached."""
+    __slots__ = ('latitude', 'longitude', 'timezone', 'observed', 'temp', 'humidity', 'wind_speed',
+                 'wind_bearing', 'condition', 'hourly', 'daily')
+
+    def __init__(self, latitude, longitude, timezone, observed, temp, humidity, wind_speed, wind_bearing,
+                 condition, hourly=None, daily=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+        self.observed = observed
+        self.temp = temp
+        self.humidity = humidity
+        self.wind_speed = wind_speed
+        self.wind_bearing = wind_bearing
+        self.condition = condition
+        self.hourly = Series() if hourly is None else hourly
+        self.daily = Series() if daily is None else daily
@@ -0,0 +1,82 @@
+# coding=utf-8
+"""Sunrise, sunset and twilight worked out from coordinates and a date.
+
+Uses the sunrise equation with the usual refraction and solar disc
+correction, which is good to about a minute away from the poles. No
+upstream request is needed.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import datetime
+import math
+
+# Julian date of 2000-01-01 12:00, and of the Unix epoch
+J2000 = 2451545.0
+JULIAN_UNIX_EPOCH = 2440587.5
+
+# Sun altitude (degrees) at sunrise/sunset, and at the ends of civil twilight
+SUNRISE_ALTITUDE = -0.833
+CIVIL_ALTITUDE = -6.0
+
+EARTH_TILT = 23.4397
+
+
+def _sin(degrees):
+    return math.sin(math.radians(degrees))
+
+
+def _julian_to_timestamp(julian):
+    return (julian - JULIAN_UNIX_EPOCH) * 86400
+
+
+def _hour_angle(latitude, declination, altitude):
+    """Return the sun's hour angle (degrees) at ``altitude``, 'day' if it stays above, 'night' if below."""
+    cos_angle = ((_sin(altitude) - _sin(latitude) * _sin(declination))
+                 / (math.cos(math.radians(latitude)) * math.cos(math.radians(declination))))
+    if cos_angle < -1:
+        return 'day'
+    if cos_angle > 1:
+        return 'night'
+    return math.degrees(math.acos(cos_angle))
+
+
+def sun_times(latitude, longitude, date):
+    """Return solar noon, sunrise, sunset, dawn, dusk and day length for ``date`` at a point.
+
+    Times are Unix timestamps. Where the sun doesn't cross the horizon
+    that day, sunrise and sunset are None and ``polar`` says whether it is
+    'day' or 'night'; dawn and dusk are handled the same way.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+
+    # mean solar noon at this longitude, in days since J2000
+    days = (date - datetime.date(2000, 1, 1)).days
+    mean_noon = days - longitude / 360
+
+    anomaly = (357.5291 + 0.98560028 * mean_noon) % 360
+    center = 1.9148 * _sin(anomaly) + 0.0200 * _sin(2 * anomaly) + 0.0003 * _sin(3 * anomaly)
+    ecliptic = (anomaly + center + 180 + 102.9372) % 360
+    transit = J2000 + mean_noon + 0.0053 * _sin(anomaly) - 0.0069 * _sin(2 * ecliptic)
+    declination = math.degrees(math.asin(_sin(ecliptic) * _sin(EARTH_TILT)))
+
+    times = {
+        'noon': _julian_to_timestamp(transit),
+        'polar': None,
+    }
+    for rise, fall, altitude in (('sunrise', 'sunset', SUNRISE_ALTITUDE),
+                                 ('dawn', 'dusk', CIVIL_ALTITUDE)):
+        angle = _hour_angle(latitude, declination, altitude)
+        if isinstance(angle, float):
+            times[rise] = _julian_to_timestamp(transit - angle / 360)
+            times[fall] = _julian_to_timestamp(transit + angle / 360)
+        else:
+            times[rise] = times[fall] = None
+            if rise == 'sunrise':
+                times['polar'] = angle
+
+    if times['sunrise'] is not None:
+        times['day_length'] = times['sunset'] - times['sunrise']
+    else:
+        times['day_length'] = 86400 if times['polar'] == 'day' else 0
+    return times
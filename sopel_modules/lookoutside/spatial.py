@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Nearest-point lookups over a fixed set of coordinates."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+import math
+
+EARTH_RADIUS_MILES = 3958.8
+# Miles per degree of latitude (and of longitude at the equator)
+MILES_PER_DEGREE = 69.09
+
+
+def distance_miles(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points, in miles."""
+    latitude1, longitude1, latitude2, longitude2 = map(
+        math.radians, (latitude1, longitude1, latitude2, longitude2))
+    a = (math.sin((latitude2 - latitude1) / 2) ** 2
+         + math.cos(latitude1) * math.cos(latitude2) * math.sin((longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1, math.sqrt(a)))
+
+
+class GridIndex(object):
+    """Points bucketed into ``cell``-degree squares.
+
+    A nearest lookup only measures the points in the cells that overlap a
+    ``max_distance`` box around the query, so it costs the same however
+    many points are indexed.
+    """
+
+    def __init__(self, points=(), cell=1.0):
+        self.cell = cell
+        self._cells = collections.defaultdict(list)
+        self._count = 0
+        for latitude, longitude, item in points:
+            self.add(latitude, longitude, item)
+
+    def __len__(self):
+        return self._count
+
+    def _column(self, longitude):
+        return int(math.floor(longitude / self.cell)) % int(round(360 / self.cell))
+
+    def add(self, latitude, longitude, item):
+        key = int(math.floor(latitude / self.cell)), self._column(longitude)
+        self._cells[key].append((latitude, longitude, item))
+        self._count += 1
+
+    def nearest(self, latitude, longitude, max_distance):
+        """Return ``(miles, item)`` for the closest point within ``max_distance`` miles, or None."""
+        latitude, longitude = float(latitude), float(longitude)
+        span = max_distance / MILES_PER_DEGREE
+        # a degree of longitude shrinks towards the poles, so the box widens
+        widest = math.cos(math.radians(min(90, abs(latitude) + span)))
+        lon_span = 180 if widest < 0.01 else min(180, span / widest)
+
+        columns = int(round(360 / self.cell))
+        first, last = (int(math.floor((longitude - lon_span) / self.cell)),
+                       int(math.floor((longitude + lon_span) / self.cell)))
+        column_keys = set(column % columns for column in range(first, min(last, first + columns - 1) + 1))
+
+        best = None
+        for row in range(int(math.floor((latitude - span) / self.cell)),
+                         int(math.floor((latitude + span) / self.cell)) + 1):
+            for column in column_keys:
+                for point_latitude, point_longitude, item in self._cells.get((row, column), ()):
+                    miles = distance_miles(latitude, longitude, point_latitude, point_longitude)
+                    if miles <= max_distance and (best is None or miles < best[0]):
+                        best = (miles, item)
+        return best
+
+
+def parse_boxes(value):
+    """Parse "west,south,east,north; ..." (or "all") into a list of boxes; '' gives an empty list."""
+    if value.strip().lower() == 'all':
+        return [(-180.0, -90.0, 180.0, 90.0)]
+    boxes = []
+    for box in value.split(';'):
+        if not box.strip():
+            continue
+        try:
+            west, south, east, north = [float(edge) for edge in box.split(',')]
+        except ValueError:
+            raise Exception('Error: "{}" is not a west,south,east,north box'.format(box.strip()))
+        boxes.append((west, south, east, north))
+    return boxes
+
+
+def in_boxes(boxes, latitude, longitude):
+    latitude, longitude = float(latitude), float(longitude)
+    return any(south <= latitude <= north and west <= longitude <= east
+               for west, south, east, north in boxes)
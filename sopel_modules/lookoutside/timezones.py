@@ -0,0 +1,39 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import datetime
+import functools
+
+from .cache import grid_key
+
+# Timezones are remembered for cells of about 10km
+TIMEZONE_PRECISION = 1
+
+
+@functools.lru_cache(maxsize=256)
+def get_timezone(name):
+    """Return the pytz timezone called ``name``, building each one only once."""
+    import pytz
+    return pytz.timezone(name)
+
+
+def solar_offset(longitude):
+    """Return a fixed UTC offset, in whole hours, following the sun at ``longitude``."""
+    import pytz
+    return pytz.FixedOffset(int(round(float(longitude) / 15)) * 60)
+
+
+def remember_timezone(bot, latitude, longitude, name):
+    bot.memory['lookoutside_timezones'].set(grid_key(latitude, longitude, TIMEZONE_PRECISION), name)
+
+
+def resolve_timezone(bot, latitude, longitude):
+    """Return the name of the timezone at a point, if a weather lookup nearby has told us."""
+    return bot.memory['lookoutside_timezones'].get(grid_key(latitude, longitude, TIMEZONE_PRECISION))
+
+
+def format_time(timestamp, tz, time_format='%I:%M %p'):
+    """Format a Unix timestamp as local time in ``tz``; None (no sunrise or sunset that day) is 'none'."""
+    if timestamp is None:
+        return 'none'
+    return datetime.datetime.fromtimestamp(timestamp, tz=tz).strftime(time_format)
@@ -0,0 +1,162 @@
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .httpcache import cache_key, freshness
+
+
+def cached_response(url, headers, body):
+    """Rebuild a 200 response from a disk cache entry."""
+    r = requests.Response()
+    r.status_code = 200
+    r.reason = 'OK'
+    r.url = url
+    r.headers = CaseInsensitiveDict(headers)
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r._content = body
+    return r
+
+
+class Transport(object):
+    """Shared HTTP session used by every provider.
+
+    Connections are kept alive and pooled per host, and every request gets a
+    ``(connect, read)`` timeout so a hung upstream can't hold a handler thread
+    forever. Requests for a provider with an entry in ``quotas`` are held to
+    its limits, waiting at most ``quota_wait`` seconds for room, and
+    requests for a provider whose breaker in ``breakers`` is open fail at
+    once.
+
+    With a :class:`~.httpcache.DiskCache`, successful responses are kept for
+    as long as upstream's ``Cache-Control``/``Expires`` allow (or the
+    caller's ``ttl`` when it says nothing) and revalidated with
+    ``If-None-Match``/``If-Modified-Since`` once stale. A response served
+    from the cache has an ``expires`` attribute.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10, pool_size=10, metrics=None,
+                 quotas=None, quota_wait=2, cache=None, breakers=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.breakers = breakers or {}
+        self.cache = cache
+        self.metrics = metrics
+        self.quotas = quotas or {}
+        self.quota_wait = quota_wait
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, provider, url, params=None, ttl=0, charge=True):
+        # ``provider`` names the upstream the request is made on behalf of; with ``charge=False``
+        # the caller has already taken it from the quota with charge()
+        if self.cache is None:
+            return self._fetch(provider, url, params, charge=charge)
+
+        url = requests.Request('GET', url, params=params).prepare().url
+        key = cache_key(url)
+        entry = self.cache.get(key)
+        if entry is not None and entry[2] > time.time():
+            self.cache.count('hits')
+            r = cached_response(url, entry[0], entry[1])
+            r.expires = entry[2]
+            return r
+
+        conditional = {}
+        if entry is not None and entry[3]:
+            conditional['If-None-Match'] = entry[3]
+        if entry is not None and entry[4]:
+            conditional['If-Modified-Since'] = entry[4]
+        try:
+            r = self._fetch(provider, url, headers=conditional, charge=charge)
+        except Exception:
+            if entry is None:
+                raise
+            # upstream is down: a stale copy beats no answer
+            r = None
+        if entry is not None and (r is None or r.status_code >= 500):
+            self.cache.count('stale')
+            r = cached_response(url, entry[0], entry[1])
+            r.expires = entry[2]
+            return r
+        now = time.time()
+
+        if r.status_code == 304 and entry is not None:
+            self.cache.count('revalidated')
+            headers = CaseInsensitiveDict(entry[0])
+            headers.update(r.headers)
+            self.cache.refresh(key, freshness(headers, now, ttl) or now)
+            return cached_response(url, entry[0], entry[1])
+
+        self.cache.count('misses')
+        if r.status_code == 200:
+            expires = freshness(r.headers, now, ttl)
+            if expires is None:
+                self.cache.delete(key)
+            elif expires > now or 'ETag' in r.headers or 'Last-Modified' in r.headers:
+                self.cache.set(key, r.headers, r.content, expires)
+        return r
+
+    def charge(self, provider):
+        """Take one request from ``provider``'s quota for a series of requests that counts as one."""
+        quota = self.quotas.get(provider)
+        if quota is not None and not quota.acquire(self.quota_wait):
+            raise Exception('Error: {} request limit reached, try again later'.format(provider))
+
+    def _fetch(self, provider, url, params=None, headers=None, charge=True):
+        breaker = self.breakers.get(provider)
+        if breaker is not None and not breaker.allow():
+            raise Exception('Error: {} is not responding, try again later'.format(provider))
+        quota = self.quotas.get(provider)
+        if charge:
+            try:
+                self.charge(provider)
+            except Exception:
+                if breaker is not None:
+                    breaker.cancel()
+                raise
+
+        start = time.perf_counter()
+        try:
+            r = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except requests.RequestException as error:
+            elapsed = time.perf_counter() - start
+            if self.metrics is not None:
+                self.metrics.observe_request(provider, elapsed, type(error).__name__)
+            if breaker is not None:
+                breaker.record(False, elapsed)
+            raise
+        elapsed = time.perf_counter() - start
+        if self.metrics is not None:
+            self.metrics.observe_request(provider, elapsed, r.status_code)
+        if breaker is not None:
+            breaker.record(r.status_code < 500, elapsed)
+        if r.status_code == 429 and quota is not None:
+            retry_after = r.headers.get('Retry-After', '')
+            quota.backoff(int(retry_after) if retry_after.isdigit() else 60)
+        return r
+
+    def warm(self, urls):
+        """Open a connection to each of ``urls`` (any iterable, consumed lazily) in the background."""
+        def _warm():
+            for url in urls:
+                try:
+                    self.session.head(url, timeout=self.timeout)
+                except requests.RequestException:
+                    pass
+
+        thread = threading.Thread(target=_warm, name='lookoutside-warm')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,90 @@
+# coding=utf-8
+"""Shared fixtures for the lookoutside tests"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import pytest
+
+from sopel_modules.lookoutside import lookoutside
+
+
+TMP_CONFIG = """
+[core]
+owner = Bar
+nick = Sopel
+enable = lookoutside
+
+[weather]
+weather_provider = openweathermap
+weather_api_key = 123456
+geocoords_api_key = abcdef
+airnow_api_key = 7890
+http_warm = false
+"""
+
+# matches ":.command args" at the end of a raw PRIVMSG line
+COMMAND_PATTERN = r'.*:\.(\S+)(?: +(.*))?$'
+
+LOCATIONIQ_URL = 'https://us1.locationiq.com/v1/search.php'
+ONECALL_URL = 'https://api.openweathermap.org/data/2.5/onecall'
+AIRNOW_URL = 'https://www.airnowapi.org/aq/observation/latLong/current/'
+
+LOCATIONIQ_SEATTLE = [{
+    'lat': '47.6038321',
+    'lon': '-122.3300624',
+    'address': {'city': 'Seattle', 'state': 'Washington', 'country_code': 'us'},
+}]
+
+ONECALL_SEATTLE = {
+    'lat': 47.6038,
+    'lon': -122.3301,
+    'timezone': 'America/Los_Angeles',
+    'timezone_offset': -25200,
+    'current': {
+        'dt': 1602957600,
+        'sunrise': 1602944623,
+        'sunset': 1602983103,
+        'temp': 12.3,
+        'humidity': 81,
+        'wind_speed': 4.6,
+        'wind_deg': 200,
+        'weather': [{'id': 500, 'main': 'Rain', 'description': 'light rain'}],
+    },
+    'daily': [
+        {'dt': 1602964800 + day * 86400,
+         'temp': {'min': 8.0 + day, 'max': 14.0 + day},
+         'weather': [{'id': 500, 'main': 'Rain', 'description': 'light rain'}]}
+        for day in range(8)
+    ],
+}
+
+AIRNOW_SEATTLE = [
+    {'ReportingArea': 'Seattle-Bellevue-Kent Valley', 'StateCode': 'WA',
+     'ParameterName': 'O3', 'AQI': 17, 'Category': {'Number': 1, 'Name': 'Good'}},
+    {'ReportingArea': 'Seattle-Bellevue-Kent Valley', 'StateCode': 'WA',
+     'ParameterName': 'PM2.5', 'AQI': 38, 'Category': {'Number': 1, 'Name': 'Good'}},
+]
+
+
+@pytest.fixture
+def tmpconfig(configfactory):
+    return configfactory('test.cfg', TMP_CONFIG)
+
+
+@pytest.fixture
+def mockbot(tmpconfig, botfactory):
+    bot = botfactory(tmpconfig)
+    lookoutside.setup(bot)
+    yield bot
+    lookoutside.shutdown(bot)
+
+
+@pytest.fixture
+def command(mockbot, triggerfactory):
+    """Return a function that runs a lookoutside command and returns what the bot sent."""
+    def run(handler, line, nick='Foo', target='#channel'):
+        raw = ':{nick}!foo@example.com PRIVMSG {target} :{line}'.format(nick=nick, target=target, line=line)
+        wrapper = triggerfactory.wrapper(mockbot, raw, pattern=COMMAND_PATTERN)
+        del mockbot.backend.message_sent[:]
+        handler(wrapper, wrapper._trigger)
+        return [message.decode('utf-8').strip() for message in mockbot.backend.message_sent]
+    return run
@@ -0,0 +1,141 @@
+# coding=utf-8
+"""Tests for the AirNow provider"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import pytest
+import requests_mock
+
+from sopel_modules.lookoutside import lookoutside
+from sopel_modules.lookoutside.providers.weather.airnow import (
+    AIRNOW_SNAPSHOT_URL, airnow_aqi, airnow_distances, next_observation, refresh_snapshot, snapshot_aqi
+)
+from sopel_modules.lookoutside.quota import Quota
+from sopel_modules.lookoutside.spatial import parse_boxes
+
+from conftest import AIRNOW_SEATTLE, AIRNOW_URL
+
+
+def test_distances_are_bounded():
+    assert list(airnow_distances(100)) == [5, 10, 20, 40, 80, 100]
+    assert list(airnow_distances(5)) == [5]
+
+
+def test_widens_until_found(mockbot):
+    def observations(request, context):
+        return AIRNOW_SEATTLE if request.qs['distance'] == ['20'] else []
+
+    with requests_mock.mock() as m:
+        m.get(AIRNOW_URL, json=observations)
+        data = airnow_aqi(mockbot, '47.6', '-122.3')
+
+    assert m.call_count == 3
+    assert data['reporting_area'] == 'Seattle-Bellevue-Kent Valley'
+    assert data['pm_aqi'] == 38
+
+
+def test_search_is_one_request_of_quota(mockbot):
+    quota = mockbot.memory['lookoutside_quotas']['airnow'] = Quota(per_minute=1)
+    with requests_mock.mock() as m:
+        m.get(AIRNOW_URL, json=[])
+        assert airnow_aqi(mockbot, '51.5', '-0.12') is None
+
+    assert m.call_count == 6
+    assert quota.remaining() == (0, None)
+
+
+def test_no_monitor_is_remembered(mockbot):
+    with requests_mock.mock() as m:
+        m.get(AIRNOW_URL, json=[])
+        assert airnow_aqi(mockbot, '51.5', '-0.12') is None
+        assert airnow_aqi(mockbot, '51.501', '-0.119') is None
+
+    assert m.call_count == 6
+
+
+def test_aqi_command_no_monitor(mockbot, command):
+    mockbot.memory['lookoutside_airnow_miss'].set('51.50,-0.12', True)
+    lookoutside.set_prefs(mockbot, 'Foo', latitude='51.5', longitude='-0.12', location='London, England, GB')
+
+    sent = command(lookoutside.aqi_command, '.aqi')
+    assert sent[-1] == 'PRIVMSG #channel :No air quality monitor within 100 miles'
+
+
+def test_next_observation():
+    # 14:10 -> 14:20, 14:35 -> 15:20
+    assert next_observation(14 * 3600 + 600, 1200) == 14 * 3600 + 1200
+    assert next_observation(14 * 3600 + 2100, 1200) == 15 * 3600 + 1200
+
+
+def test_observations_cached_per_area(mockbot):
+    with requests_mock.mock() as m:
+        m.get(AIRNOW_URL, json=AIRNOW_SEATTLE)
+        airnow_aqi(mockbot, '47.6', '-122.3')
+        airnow_aqi(mockbot, '47.601', '-122.299')
+
+    assert m.call_count == 1
+    assert mockbot.memory['lookoutside_aqi'].hits == 1
+    assert mockbot.memory['lookoutside_aqi_areas'].get('47.60,-122.30') == 'Seattle-Bellevue-Kent Valley|WA'
+
+
+REPORTING_AREAS = '\n'.join([
+    '10/17/20|10/17/20|10:00|PST|0|O|Y|Seattle-Bellevue-Kent Valley|WA|47.5633|-122.3405|OZONE|17|Good|||AirNow',
+    '10/17/20|10/17/20|10:00|PST|0|O|Y|Seattle-Bellevue-Kent Valley|WA|47.5633|-122.3405|PM2.5|38|Good|||AirNow',
+    '10/17/20|10/18/20||PST|1|F|Y|Seattle-Bellevue-Kent Valley|WA|47.5633|-122.3405|PM2.5|45|Good|||PSCAA',
+    '10/17/20|10/17/20|10:00|PST|0|O|Y|Portland|OR|45.5152|-122.6784|PM2.5|61|Moderate|||AirNow',
+    '10/17/20|10/17/20|13:00|EST|0|O|Y|Boston|MA|42.3601|-71.0589|PM2.5|12|Good|||AirNow',
+])
+
+
+def test_regional_snapshot(mockbot):
+    mockbot.memory['lookoutside_airnow_regions'] = [(-125.0, 42.0, -116.0, 49.0)]
+    with requests_mock.mock() as m:
+        m.get(AIRNOW_SNAPSHOT_URL, text=REPORTING_AREAS)
+        assert refresh_snapshot(mockbot) == 2
+
+        m.get(AIRNOW_URL, json=[])
+        data = airnow_aqi(mockbot, '47.6', '-122.3')
+        assert airnow_aqi(mockbot, '45.4', '-122.6')['pm_status'] == 'Moderate'
+        # out in the Pacific, more than 100 miles from either area
+        assert airnow_aqi(mockbot, '46.0', '-124.9') is None
+        assert m.call_count == 1
+
+        # outside the regions, the point is looked up on its own
+        airnow_aqi(mockbot, '42.36', '-71.06')
+        assert m.call_count > 1
+
+    assert data == {'reporting_area': 'Seattle-Bellevue-Kent Valley', 'state': 'WA',
+                    'o3_aqi': 17, 'o3_status': 'Good', 'pm_aqi': 38, 'pm_status': 'Good'}
+
+
+def test_regional_snapshot_goes_stale(mockbot):
+    mockbot.memory['lookoutside_airnow_regions'] = parse_boxes('all')
+    with requests_mock.mock() as m:
+        m.get(AIRNOW_SNAPSHOT_URL, text=REPORTING_AREAS)
+        refresh_snapshot(mockbot)
+
+    snapshot = mockbot.memory['lookoutside_airnow_snapshot']
+    snapshot['fetched'] -= 2 * 3600
+    snapshot['expires'] -= 2 * 3600
+    assert airnow_aqi(mockbot, '42.36', '-71.06')['age'] >= 2 * 3600
+
+    snapshot['expires'] -= mockbot.config.weather.aqi_stale_ttl
+    assert snapshot_aqi(mockbot, '42.36', '-71.06') == (False, None)
+
+
+def test_snapshot_download_kept_apart_from_api(mockbot, monkeypatch):
+    # set up again with regions, without the download setup() would start
+    monkeypatch.setattr(lookoutside, 'refresh_airnow_snapshot', lambda bot: None)
+    lookoutside.shutdown(mockbot)
+    mockbot.config.weather.airnow_regions = 'all'
+    lookoutside.setup(mockbot)
+    quota = mockbot.memory['lookoutside_quotas']['airnow'] = Quota(per_minute=1)
+    with requests_mock.mock() as m:
+        m.get(AIRNOW_SNAPSHOT_URL, status_code=503)
+        for _ in range(mockbot.config.weather.breaker_min_calls):
+            with pytest.raises(Exception):
+                refresh_snapshot(mockbot)
+
+    breakers = mockbot.memory['lookoutside_breakers']
+    assert breakers['airnow-files'].state == 'open'
+    assert breakers['airnow'].state == 'closed'
+    assert quota.remaining() == (1, None)
@@ -0,0 +1,88 @@
+# coding=utf-8
+"""Tests for the channel weather board"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import requests_mock
+
+from sopel.tools import Identifier
+from sopel.tools.target import Channel, User
+
+from sopel_modules.lookoutside import lookoutside
+from sopel_modules.lookoutside.providers import get_provider
+
+from conftest import ONECALL_SEATTLE, ONECALL_URL
+
+SEATTLE = ('47.6038321', '-122.3300624', 'Seattle, Washington, US')
+
+
+def join(bot, channel, nicks):
+    bot.channels[Identifier(channel)] = Channel(Identifier(channel))
+    for nick in nicks:
+        bot.channels[Identifier(channel)].add_user(User(Identifier(nick), 'user', 'example.com'))
+
+
+def save(bot, nick, latitude, longitude, location):
+    lookoutside.set_prefs(bot, nick, latitude=latitude, longitude=longitude, location=location)
+
+
+def test_board_fetches_each_area_once(mockbot, command):
+    join(mockbot, '#channel', ['Foo', 'alice', 'bob', 'carol', 'dave'])
+    save(mockbot, 'alice', *SEATTLE)
+    save(mockbot, 'bob', '47.6041', '-122.3298', 'Seattle, Washington, US')
+    save(mockbot, 'carol', '45.5152', '-122.6784', 'Portland, Oregon, US')
+
+    with requests_mock.mock() as m:
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        sent = command(lookoutside.weather_board, '.wboard')
+
+    assert m.call_count == 2
+    assert sent == [
+        'PRIVMSG #channel :Seattle, Washington, US: 12°C (54°F), Rain (2) | '
+        'Portland, Oregon, US: 12°C (54°F), Rain (1)'
+    ]
+    # nobody gets a record just for being in the channel
+    assert mockbot.db.get_nick_value('dave', 'lookoutside') is None
+
+
+def test_weather_channel_argument(mockbot, command):
+    join(mockbot, '#other', ['Foo', 'alice'])
+    save(mockbot, 'alice', *SEATTLE)
+
+    with requests_mock.mock() as m:
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        sent = command(lookoutside.weather_command, '.weather #other')
+
+    assert sent == ['PRIVMSG #channel :Seattle, Washington, US: 12°C (54°F), Rain (1)']
+    assert command(lookoutside.weather_command, '.weather #nowhere') == [
+        "PRIVMSG #channel :Foo: I'm not in #nowhere."]
+
+
+def test_board_members_only(mockbot, command):
+    join(mockbot, '#private', ['alice'])
+    save(mockbot, 'alice', *SEATTLE)
+
+    with requests_mock.mock() as m:
+        sent = command(lookoutside.weather_board, '.wboard #private', target='Sopel')
+
+    assert m.call_count == 0
+    assert sent == ["PRIVMSG Foo :Foo: You're not in #private."]
+
+
+def test_board_uses_multi_point(mockbot, command, monkeypatch):
+    join(mockbot, '#channel', ['Foo', 'alice', 'carol'])
+    save(mockbot, 'alice', *SEATTLE)
+    save(mockbot, 'carol', '45.5152', '-122.6784', 'Portland, Oregon, US')
+    batches = []
+
+    async def weather_many_async(bot, points):
+        batches.append(points)
+        return [{'location': location, 'temp': 10, 'condition': 'Clear'} for _, _, location in points]
+
+    provider = get_provider('openweathermap')
+    monkeypatch.setattr(provider, 'multi_point', True, raising=False)
+    monkeypatch.setattr(provider, 'weather_many_async', weather_many_async, raising=False)
+    sent = command(lookoutside.weather_board, '.wboard')
+
+    assert len(batches) == 1 and len(batches[0]) == 2
+    assert sent == ['PRIVMSG #channel :Seattle, Washington, US: 10°C (50°F), Clear (1) | '
+                    'Portland, Oregon, US: 10°C (50°F), Clear (1)']
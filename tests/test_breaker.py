@@ -0,0 +1,100 @@
+# coding=utf-8
+"""Tests for circuit breakers and provider failover"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import pytest
+import requests
+import requests_mock
+
+from sopel_modules.lookoutside import lookoutside, providers
+from sopel_modules.lookoutside.breaker import CircuitBreaker
+from sopel_modules.lookoutside.httpcache import DiskCache
+from sopel_modules.lookoutside.transport import Transport
+
+from conftest import ONECALL_URL
+
+
+class Backup(providers.Provider):
+    name = 'backup'
+    capabilities = frozenset(['weather'])
+
+    def weather(self, bot, latitude, longitude, location):
+        return {'location': location, 'temp': 10, 'condition': 'Backup', 'humidity': 0.5,
+                'sunrise': '07:31 AM', 'sunset': '06:17 PM', 'wind': {'speed': 1.0, 'bearing': 0}}
+
+
+def test_opens_on_error_rate_and_recovers():
+    clock = [0.0]
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=4, reset_timeout=30, clock=lambda: clock[0])
+    for ok in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(ok)
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    # one trial request after the reset timeout; the rest still fail fast
+    clock[0] += 30
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open'
+
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == 'closed'
+    assert (breaker.trips, breaker.refused) == (2, 2)
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(min_calls=2, slow_call=1.0)
+    breaker.record(True, 0.2)
+    breaker.record(True, 3.0)
+    assert breaker.state == 'open'
+
+
+def test_transport_fails_fast_when_open():
+    breaker = CircuitBreaker(min_calls=2)
+    transport = Transport(breakers={'example': breaker})
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/data', exc=requests.exceptions.ConnectTimeout)
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectTimeout):
+                transport.get('example', 'https://api.example.com/data')
+        with pytest.raises(Exception, match='example is not responding'):
+            transport.get('example', 'https://api.example.com/data')
+
+    assert m.call_count == 2
+
+
+def test_disk_cache_answers_while_down(tmpdir):
+    breaker = CircuitBreaker(min_calls=1)
+    transport = Transport(cache=DiskCache(str(tmpdir.join('http.sqlite'))), breakers={'example': breaker})
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/data', json={'ok': True}, headers={'ETag': '"v1"', 'Cache-Control': 'no-cache'})
+        transport.get('example', 'https://api.example.com/data')
+        m.get('https://api.example.com/data', status_code=503)
+        assert transport.get('example', 'https://api.example.com/data').json() == {'ok': True}
+        # the breaker is open now, and the copy on disk still answers
+        assert transport.get('example', 'https://api.example.com/data').json() == {'ok': True}
+
+    assert m.call_count == 2
+    assert transport.cache.stale == 2
+
+
+def test_weather_fails_over(mockbot, command, monkeypatch):
+    monkeypatch.setitem(providers._loaded, 'backup', Backup())
+    mockbot.config.weather.weather_fallback = 'backup'
+    mockbot.memory['lookoutside_breakers']['openweathermap'].min_calls = 1
+    lookoutside.set_prefs(mockbot, 'Foo', latitude='47.6', longitude='-122.3', location='Seattle, WA, US',
+                          show_aqi=False)
+    with requests_mock.mock() as m:
+        m.get(ONECALL_URL, status_code=502, json={'message': 'Bad Gateway'})
+        command(lookoutside.weather_command, '.weather')
+        sent = command(lookoutside.weather_command, '.weather')
+
+    # the second command didn't wait on OpenWeatherMap at all
+    assert m.call_count == 1
+    assert mockbot.memory['lookoutside_breakers']['openweathermap'].state == 'open'
+    assert sent[-1].startswith('PRIVMSG #channel :Seattle, WA, US: 10°C (50°F), Backup')
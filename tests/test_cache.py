@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Tests for the lookoutside caches"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import pytest
+import requests_mock
+
+from sopel_modules.lookoutside import lookoutside
+from sopel_modules.lookoutside.cache import TTLCache
+
+from conftest import LOCATIONIQ_URL, LOCATIONIQ_SEATTLE
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttlcache_expiry():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    clock.now += 61
+    assert cache.get('a') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_ttlcache_stale_window():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock, stale_ttl=600)
+    cache.set('a', 1)
+    assert cache.lookup('a') == (1, None)
+
+    clock.now += 120
+    assert cache.get('a') is None
+    assert 'a' not in cache
+    assert cache.lookup('a') == (1, 120)
+
+    clock.now += 600
+    assert cache.lookup('a') is None
+    assert cache.stats()['stale_hits'] == 1
+    assert len(cache) == 0
+
+
+def test_ttlcache_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.evictions == 1
+
+
+def test_ttlcache_dump_load():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', [1, 2])
+    cache.set('b', [3, 4], ttl=5)
+    clock.now += 10
+
+    restored = TTLCache(maxsize=10, ttl=60, clock=clock)
+    restored.load(cache.dump())
+    assert restored.get('a') == [1, 2]
+    assert 'b' not in restored
+
+
+@pytest.mark.parametrize('query, key', [
+    ('Seattle, US', 'seattle us'),
+    ('  seattle   US ', 'seattle us'),
+    ('90210-1234', '90210'),
+    ('90210, USA', '90210'),
+    ('St. Louis, MO', 'st louis mo'),
+    ('-33.86, 151.21', '-33.86 151.21'),
+])
+def test_normalize_location(query, key):
+    assert lookoutside.normalize_location(query) == key
+
+
+def geocode(bot, query):
+    return bot.memory['lookoutside_engine'].run(lookoutside.lookup_geocoords_async(bot, query), 5)
+
+
+def test_geocoords_cached(mockbot):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        first = geocode(mockbot, 'Seattle, US')
+        second = geocode(mockbot, 'seattle us')
+
+    assert m.call_count == 1
+    assert first == second == ('47.6038321', '-122.3300624', 'Seattle, Washington, US')
+    assert mockbot.memory['lookoutside_geocache'].hits == 1
+
+
+def test_geocoords_cache_survives_restart(mockbot):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        geocode(mockbot, 'Seattle, US')
+
+    # shutdown() saves the cache; setup() again reloads it from the database into a fresh one
+    lookoutside.shutdown(mockbot)
+    lookoutside.setup(mockbot)
+    with requests_mock.mock() as m:
+        location = geocode(mockbot, 'Seattle US')
+
+    assert m.call_count == 0
+    assert location[2] == 'Seattle, Washington, US'
@@ -0,0 +1,49 @@
+# coding=utf-8
+"""Tests for the event-loop provider engine"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from sopel_modules.lookoutside.engine import Engine
+
+
+@pytest.fixture
+def engine():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    engine = Engine(executor)
+    yield engine
+    engine.stop()
+    executor.shutdown()
+
+
+def test_run_gathers_blocking_calls(engine):
+    async def fan_out():
+        return await asyncio.gather(
+            engine.call(time.sleep, 0.2),
+            engine.call(time.sleep, 0.2),
+            engine.call(time.sleep, 0.2),
+        )
+
+    start = time.time()
+    engine.run(fan_out(), timeout=5)
+    assert time.time() - start < 0.5
+
+
+def test_coroutines_run_on_loop_thread(engine):
+    async def where():
+        return threading.current_thread().name
+
+    assert engine.run(where(), timeout=5) == 'lookoutside-loop'
+
+
+def test_run_timeout_cancels(engine):
+    async def forever():
+        await asyncio.sleep(60)
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        engine.run(forever(), timeout=0.05)
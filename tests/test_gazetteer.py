@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Tests for the offline gazetteer"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import pytest
+import requests_mock
+
+from sopel_modules.lookoutside import lookoutside
+from sopel_modules.lookoutside.gazetteer import Gazetteer, build, geonames_entries, parse_coordinates
+
+from conftest import LOCATIONIQ_SEATTLE, LOCATIONIQ_URL, ONECALL_SEATTLE, ONECALL_URL
+
+# country, postal code, place, state, state code, county, county code, -, -, latitude, longitude, accuracy
+GEONAMES = [
+    'US\t98101\tSeattle\tWashington\tWA\tKing\t033\t\t\t47.6101\t-122.3421\t4\n',
+    'US\t98109\tSeattle\tWashington\tWA\tKing\t033\t\t\t47.6340\t-122.3420\t4\n',
+    'US\t97201\tPortland\tOregon\tOR\tMultnomah\t051\t\t\t45.5077\t-122.6900\t4\n',
+    'US\t97202\tPortland\tOregon\tOR\tMultnomah\t051\t\t\t45.4842\t-122.6364\t4\n',
+    'US\t04101\tPortland\tMaine\tME\tCumberland\t005\t\t\t43.6615\t-70.2553\t4\n',
+]
+
+
+@pytest.fixture
+def index(tmpdir):
+    path = str(tmpdir.join('gazetteer.idx'))
+    build(geonames_entries(GEONAMES), path)
+    gazetteer = Gazetteer(path)
+    yield gazetteer
+    gazetteer.close()
+
+
+def test_lookup(index):
+    assert index.lookup('98101') == ('47.6101', '-122.3421', 'Seattle, Washington, US')
+    assert index.lookup('04101') == ('43.6615', '-70.2553', 'Portland, Maine, US')
+    assert index.lookup('seattle wa')[2] == 'Seattle, Washington, US'
+    assert index.lookup('portland maine us')[2] == 'Portland, Maine, US'
+    # a bare name could be anywhere, so it is left to the geocoder
+    assert index.lookup('portland') is None
+    assert index.lookup('tacoma') is None
+    assert index.lookup('zzz') is None
+    assert (index.hits, index.misses) == (4, 3)
+
+
+def test_coordinates():
+    assert parse_coordinates(lookoutside.normalize_location('47.6038, -122.3301')) == (
+        '47.6038', '-122.3301', '47.6038, -122.3301')
+    assert parse_coordinates('91 10') is None
+    assert parse_coordinates('seattle') is None
+
+
+def test_not_a_gazetteer(tmpdir):
+    path = tmpdir.join('other.idx')
+    path.write_binary(b'\0' * 2048)
+    with pytest.raises(Exception, match='not a lookoutside gazetteer'):
+        Gazetteer(str(path))
+
+
+def test_geocoded_without_locationiq(mockbot, index, command):
+    mockbot.memory['lookoutside_gazetteer'] = index
+    with requests_mock.mock() as m:
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        sent = command(lookoutside.forecast_command, '.forecast 98101')
+        command(lookoutside.forecast_command, '.forecast 47.6038, -122.3301')
+        assert not any(request.url.startswith(LOCATIONIQ_URL) for request in m.request_history)
+
+        # misses still go to the geocoder
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        command(lookoutside.forecast_command, '.forecast Space Needle')
+        assert m.request_history[-1].url.startswith(LOCATIONIQ_URL)
+
+    assert sent[-1].startswith('PRIVMSG #channel :Seattle, Washington, US :: ')
+    mockbot.memory['lookoutside_gazetteer'] = None
+
+
+def test_bare_names_go_upstream(tmpdir, mockbot):
+    path = str(tmpdir.join('gazetteer.idx'))
+    build(geonames_entries([
+        'US\t40741\tLondon\tKentucky\tKY\tLaurel\t125\t\t\t37.1200\t-84.0800\t4\n',
+    ]), path)
+    mockbot.memory['lookoutside_gazetteer'] = Gazetteer(path)
+    try:
+        assert lookoutside.geocode_locally(mockbot, 'london') is None
+        assert lookoutside.geocode_locally(mockbot, 'london ky')[2] == 'London, Kentucky, US'
+    finally:
+        mockbot.memory['lookoutside_gazetteer'].close()
+        mockbot.memory['lookoutside_gazetteer'] = None
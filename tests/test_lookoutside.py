@@ -0,0 +1,239 @@
+# coding=utf-8
+"""Tests for the lookoutside commands"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import asyncio
+import subprocess
+import time
+import sys
+
+import requests_mock
+
+from sopel_modules.lookoutside import lookoutside
+from sopel_modules.lookoutside.providers.weather.airnow import airnow_search
+from sopel_modules.lookoutside.providers.weather.openweathermap import fetch_onecall, onecall_snapshot
+
+from conftest import (
+    AIRNOW_SEATTLE, AIRNOW_URL, LOCATIONIQ_SEATTLE, LOCATIONIQ_URL, ONECALL_SEATTLE, ONECALL_URL
+)
+
+
+def test_weather_command_place(mockbot, command):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        m.get(AIRNOW_URL, json=AIRNOW_SEATTLE)
+        sent = command(lookoutside.weather_command, '.weather Seattle, US')
+
+    assert sent[-1] == (
+        'PRIVMSG #channel :Seattle, Washington, US: 12°C (54°F), Rain, Humidity: 81%, '
+        'Sunrise: 07:31 AM Sunset: 06:17 PM, Gentle breeze 4.6 m/s (10 mph) (↑), '
+        'O3 Good (AQI: 17) PM2.5 Good (AQI: 38)'
+    )
+
+
+def test_weather_command_fetches_concurrently(mockbot, command, monkeypatch):
+    running = []
+    overlapped = []
+    get_weather_async = lookoutside.get_weather_async
+    get_aqi_async = lookoutside.get_aqi_async
+
+    async def track(coro):
+        running.append(1)
+        await asyncio.sleep(0.05)
+        overlapped.append(len(running) == 2)
+        return await coro
+
+    monkeypatch.setattr(lookoutside, 'get_weather_async', lambda *args: track(get_weather_async(*args)))
+    monkeypatch.setattr(lookoutside, 'get_aqi_async', lambda *args: track(get_aqi_async(*args)))
+    mockbot.db.set_nick_value('Foo', 'latitude', '47.6038321')
+    mockbot.db.set_nick_value('Foo', 'longitude', '-122.3300624')
+    mockbot.db.set_nick_value('Foo', 'location', 'Seattle, Washington, US')
+    with requests_mock.mock() as m:
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        m.get(AIRNOW_URL, json=AIRNOW_SEATTLE)
+        sent = command(lookoutside.weather_command, '.weather')
+
+    # both lookups were in flight before either finished
+    assert overlapped == [True, True]
+    assert sent[-1].startswith('PRIVMSG #channel :Seattle, Washington, US: 12°C')
+    assert sent[-1].endswith('O3 Good (AQI: 17) PM2.5 Good (AQI: 38)')
+
+
+def test_weather_command_without_aqi(mockbot, command):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        m.get(AIRNOW_URL, status_code=500)
+        sent = command(lookoutside.weather_command, '.weather Seattle, US')
+
+    assert sent[-1].startswith('PRIVMSG #channel :Seattle, Washington, US: 12°C')
+    assert sent[-1].endswith(', AQI unavailable')
+
+
+def test_weather_command_one_deadline(mockbot, command, monkeypatch):
+    cancelled = []
+
+    async def slow_weather(*args):
+        await asyncio.sleep(0.4)
+        return {'location': 'Seattle, Washington, US', 'temp': 12, 'condition': 'Rain'}
+
+    async def hung_aqi(*args):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    monkeypatch.setattr(lookoutside, 'get_weather_async', slow_weather)
+    monkeypatch.setattr(lookoutside, 'get_aqi_async', hung_aqi)
+    mockbot.config.weather.command_timeout = 0.5
+    lookoutside.set_prefs(mockbot, 'Foo', latitude='47.6', longitude='-122.3', units='metric',
+                          show_humidity=False, show_sunriseset=False, show_wind=False)
+
+    start = time.time()
+    sent = command(lookoutside.weather_command, '.weather')
+    assert time.time() - start < 0.8
+    assert sent[-1].endswith(', AQI unavailable')
+    time.sleep(0.05)
+    assert cancelled == [True]
+
+
+def test_weather_command_no_location(mockbot, command):
+    sent = command(lookoutside.weather_command, '.weather')
+    assert "I don't know where you live" in sent[-1]
+
+
+def test_forecast_command(mockbot, command):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        sent = command(lookoutside.forecast_command, '.forecast Seattle')
+
+    assert sent[-1].startswith('PRIVMSG #channel :Seattle, Washington, US :: ')
+    assert sent[-1].count(' :: ') == 4
+
+
+def test_aqi_command(mockbot, command):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        m.get(AIRNOW_URL, json=AIRNOW_SEATTLE)
+        sent = command(lookoutside.aqi_command, '.aqi Seattle')
+
+    assert sent[-1] == ('PRIVMSG #channel :Seattle-Bellevue-Kent Valley, WA:  O3 Good (AQI: 17) '
+                        'PM2.5 Good (AQI: 38)')
+
+
+def test_weather_and_forecast_share_onecall(mockbot, command):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        m.get(AIRNOW_URL, json=AIRNOW_SEATTLE)
+        command(lookoutside.weather_command, '.weather Seattle')
+        command(lookoutside.forecast_command, '.forecast Seattle')
+        onecall_requests = [r for r in m.request_history if r.url.startswith(ONECALL_URL)]
+
+    assert len(onecall_requests) == 1
+    # the request is made for the grid cell, not the exact coordinates
+    assert onecall_requests[0].qs['lat'] == ['47.60']
+    assert onecall_requests[0].qs['lon'] == ['-122.33']
+
+
+def test_late_leaders_check_the_cache(mockbot):
+    # a caller that missed the cache while another's fetch was landing leads the next flight
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        m.get(AIRNOW_URL, json=AIRNOW_SEATTLE)
+        for _ in range(2):
+            lookoutside.fetch_geocoords(mockbot, 'Seattle', 'seattle')
+            fetch_onecall(mockbot, '47.60,-122.33')
+            airnow_search(mockbot, '47.6', '-122.3', '47.60,-122.30')
+
+    assert m.call_count == 3
+
+
+def test_geocache_saved_in_background(mockbot, command):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        m.get(AIRNOW_URL, json=AIRNOW_SEATTLE)
+        command(lookoutside.aqi_command, '.aqi Seattle')
+    assert mockbot.db.get_plugin_value('lookoutside', 'geocode-cache') is None
+
+    lookoutside.save_geocache(mockbot)
+    assert [entry[0] for entry in mockbot.db.get_plugin_value('lookoutside', 'geocode-cache')] == ['seattle']
+    assert not mockbot.memory['lookoutside_geocache_dirty']
+
+
+def test_plugin_import_defers_heavy_modules():
+    code = ('import sys; import sopel.config.types, sopel.module, sopel.tools; '
+            'before = set(sys.modules); import sopel_modules.lookoutside; '
+            'print(sorted(m for m in set(sys.modules) - before '
+            'if m.split(".")[0] in ("requests", "asyncio", "pytz", "urllib3")))')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b'[]'
+
+
+def test_split_locations_drops_repeats():
+    assert lookoutside.split_locations('Seattle, US; portland;  seattle us ;; 90210-1234; 90210') == [
+        'Seattle, US', 'portland', '90210-1234']
+
+
+def test_pack_lines_keeps_parts_whole():
+    assert lookoutside.pack_lines(['aaaa', 'bbbb', 'cccc'], limit=11) == ['aaaa | bbbb', 'cccc']
+
+
+def test_weather_command_many_places(mockbot, command):
+    def geocode(request, context):
+        if request.qs['q'] == ['atlantis']:
+            context.status_code = 404
+            return {'error': 'Unable to geocode'}
+        return LOCATIONIQ_SEATTLE
+
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=geocode)
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        sent = command(lookoutside.weather_command, '.weather Seattle; Seattle, WA; Atlantis')
+
+    # two places in the same grid cell share one OneCall request
+    assert [request.url.split('?')[0] for request in m.request_history].count(ONECALL_URL) == 1
+    assert sent == [
+        'PRIVMSG #channel :Seattle, Washington, US: 12°C (54°F), Rain | '
+        'Seattle, Washington, US: 12°C (54°F), Rain | Atlantis: Unable to geocode'
+    ]
+
+
+def test_forecast_command_many_places(mockbot, command):
+    with requests_mock.mock() as m:
+        m.get(LOCATIONIQ_URL, json=LOCATIONIQ_SEATTLE)
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        sent = command(lookoutside.forecast_command, '.forecast Seattle; 98101')
+
+    assert len(sent) == 1
+    assert sent[0].count('Seattle, Washington, US: ') == 2
+    assert ' Rain 14°C (57°F)/8°C (46°F), ' in sent[0]
+
+
+def test_too_many_places(mockbot, command):
+    sent = command(lookoutside.weather_command, '.weather a; b; c; d; e; f')
+    assert sent == ['PRIVMSG #channel :Foo: I can look up at most 5 locations at once.']
+
+
+def test_weather_served_stale_while_refreshing(mockbot, command):
+    lookoutside.set_prefs(mockbot, 'Foo', latitude='47.6038321', longitude='-122.3300624',
+                          location='Seattle, Washington, US', show_aqi=False)
+    onecall = mockbot.memory['lookoutside_onecall']
+    # fetched 15 minutes ago, so five minutes past the fresh TTL
+    onecall._data['47.60,-122.33'] = (onecall_snapshot(ONECALL_SEATTLE), time.time() - 300, time.time() - 900)
+
+    with requests_mock.mock() as m:
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        sent = command(lookoutside.weather_command, '.weather')
+        for _ in range(50):
+            if m.call_count and '47.60,-122.33' in onecall:
+                break
+            time.sleep(0.05)
+
+    assert sent[-1].endswith(' (15 min ago)')
+    assert m.call_count == 1
+    assert onecall.lookup('47.60,-122.33')[1] is None
@@ -0,0 +1,87 @@
+# coding=utf-8
+"""Tests for the metrics surface"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import requests
+import requests_mock
+
+from sopel_modules.lookoutside import lookoutside
+from sopel_modules.lookoutside.cache import TTLCache
+from sopel_modules.lookoutside.metrics import Histogram, Metrics
+from sopel_modules.lookoutside.transport import Transport
+
+from conftest import AIRNOW_URL
+
+
+def test_histogram_quantile():
+    histogram = Histogram()
+    for value in [0.003] * 90 + [0.3] * 10:
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == 0.005
+    assert histogram.quantile(0.95) == 0.5
+    assert list(histogram.cumulative())[-1] == ('+Inf', 100)
+
+
+def test_transport_records_status_and_errors():
+    metrics = Metrics()
+    transport = Transport(metrics=metrics)
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/ok', json={})
+        m.get('https://api.example.com/down', status_code=503)
+        m.get('https://api.example.com/slow', exc=requests.exceptions.ConnectTimeout)
+        transport.get('example', 'https://api.example.com/ok')
+        transport.get('example', 'https://api.example.com/down')
+        try:
+            transport.get('example', 'https://api.example.com/slow')
+        except requests.exceptions.ConnectTimeout:
+            pass
+
+    assert metrics.latency['example'].count == 3
+    assert metrics.statuses['example', '200'] == 1
+    assert metrics.statuses['example', 'ConnectTimeout'] == 1
+    assert metrics.errors['example'] == 2
+
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.observe_request('airnow', 0.2, 200)
+    metrics.observe_command('aqi', 0.3, error=True)
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.get('missing')
+
+    text = metrics.prometheus({'aqi': cache})
+    assert 'lookoutside_upstream_request_duration_seconds_bucket{provider="airnow",le="0.25"} 1' in text
+    assert 'lookoutside_upstream_requests_total{provider="airnow",status="200"} 1' in text
+    assert 'lookoutside_command_errors_total{command="aqi"} 1' in text
+    assert 'lookoutside_cache_misses_total{cache="aqi"} 1' in text
+
+
+def test_commands_are_timed(mockbot, command):
+    lookoutside.set_prefs(mockbot, 'Foo', latitude='51.5', longitude='-0.12', location='London, England, GB')
+    with requests_mock.mock() as m:
+        m.get(AIRNOW_URL, json=[])
+        command(lookoutside.aqi_command, '.aqi')
+
+    metrics = mockbot.memory['lookoutside_metrics']
+    assert metrics.commands['aqi'].count == 1
+    assert metrics.latency['airnow'].count == 6
+
+    sent = command(lookoutside.weather_stats, '.weatherstats', nick='Bar')
+    stats = ' | '.join(line.split(' :', 1)[1] for line in sent).split(' | ')
+    assert any(line.startswith('airnow: 6 requests, ') for line in stats)
+    assert any(line.startswith('.aqi: 1 runs, ') for line in stats)
+
+
+def test_weatherstats_owner_only(mockbot, command):
+    assert command(lookoutside.weather_stats, '.weatherstats') == []
+    sent = command(lookoutside.weather_stats, '.weatherstats', nick='Bar')
+    assert sent[0].startswith('PRIVMSG Bar :aqi: 0/500 entries, 0 hits, 0 misses (0% hit rate), 0 evictions, 0 served stale | ')
+
+
+def test_metrics_file(mockbot, tmpdir):
+    path = tmpdir.join('lookoutside.prom')
+    mockbot.config.weather.metrics_file = str(path)
+    lookoutside.write_metrics(mockbot)
+
+    assert 'lookoutside_singleflight_calls_total 0' in path.read()
@@ -0,0 +1,82 @@
+# coding=utf-8
+"""Tests for the hot-cell prefetcher"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import time
+
+import requests_mock
+
+from sopel_modules.lookoutside.prefetch import HeavyHitters, due, record
+
+from conftest import ONECALL_SEATTLE, ONECALL_URL
+
+
+def test_heavy_hitter_survives_noise():
+    hot = HeavyHitters(capacity=3)
+    for i in range(20):
+        hot.add('seattle', i)
+        hot.add('noise-{}'.format(i))
+
+    key, count, payload = hot.top()[0]
+    assert (key, payload) == ('seattle', 19)
+    assert count >= 20
+    assert len(hot) == 3
+
+
+def test_decay_forgets_one_offs():
+    hot = HeavyHitters()
+    for _ in range(4):
+        hot.add('seattle')
+    hot.add('london')
+    hot.decay()
+
+    assert [(key, count) for key, count, _ in hot.top()] == [('seattle', 2)]
+
+
+def test_due_near_expiry(mockbot):
+    onecall = mockbot.memory['lookoutside_onecall']
+    record(mockbot, 'weather', '47.6038', '-122.3301')
+    onecall.set('47.60,-122.33', ONECALL_SEATTLE, ttl=30)
+    # asked for once: not worth an upstream call yet
+    assert due(mockbot, time.time()) == []
+
+    record(mockbot, 'weather', '47.6041', '-122.3298')
+    assert [point[1:] for point in due(mockbot, time.time())] == [('47.6041', '-122.3298')]
+
+    onecall.set('47.60,-122.33', ONECALL_SEATTLE, ttl=600)
+    assert due(mockbot, time.time()) == []
+
+
+def test_due_respects_budget(mockbot):
+    mockbot.config.weather.prefetch_budget = 2
+    for cell in range(5):
+        for _ in range(3):
+            record(mockbot, 'weather', '10.{}'.format(cell), '20.0')
+
+    assert len(due(mockbot, time.time())) == 2
+
+
+def test_airnow_not_refreshed_before_publication(mockbot):
+    record(mockbot, 'aqi', '47.6', '-122.3')
+    record(mockbot, 'aqi', '47.6', '-122.3')
+    mockbot.memory['lookoutside_aqi_areas'].set('47.60,-122.30', 'Seattle|WA')
+    mockbot.memory['lookoutside_aqi'].set('Seattle|WA', {'o3_aqi': 17}, ttl=30)
+    assert due(mockbot, time.time()) == []
+
+    mockbot.memory['lookoutside_aqi'].pop('Seattle|WA')
+    assert len(due(mockbot, time.time())) == 1
+
+
+def test_refresh_replaces_cached_snapshot(mockbot):
+    onecall = mockbot.memory['lookoutside_onecall']
+    onecall.set('47.60,-122.33', {'stale': True}, ttl=30)
+    record(mockbot, 'weather', '47.6038', '-122.3301')
+    record(mockbot, 'weather', '47.6038', '-122.3301')
+
+    with requests_mock.mock() as m:
+        m.get(ONECALL_URL, json=ONECALL_SEATTLE)
+        for provider, latitude, longitude in due(mockbot, time.time()):
+            provider.refresh(mockbot, latitude, longitude)
+
+    assert m.call_count == 1
+    assert onecall.peek('47.60,-122.33')[0].temp == ONECALL_SEATTLE['current']['temp']
@@ -0,0 +1,92 @@
+# coding=utf-8
+"""Tests for the per-nick preference record"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+from sopel_modules.lookoutside import lookoutside, prefs
+
+
+def test_migrates_legacy_keys(mockbot):
+    mockbot.db.set_nick_value('Foo', 'latitude', '47.6')
+    mockbot.db.set_nick_value('Foo', 'longitude', '-122.3')
+    mockbot.db.set_nick_value('Foo', 'location', 'Seattle, Washington, US')
+    mockbot.db.set_nick_value('Foo', 'weather-units', 'metric')
+    mockbot.db.set_nick_value('Foo', 'weather-show-wind', 'false')
+    mockbot.db.set_nick_value('Foo', 'weather-show-aqi', 'true')
+
+    record = prefs.get_prefs(mockbot, 'Foo')
+
+    assert record['location'] == 'Seattle, Washington, US'
+    assert record['units'] == 'metric'
+    assert record['show_wind'] is False
+    assert record['show_aqi'] is True
+    assert record['show_humidity'] is True
+    assert mockbot.db.get_nick_value('Foo', 'weather-units') is None
+    assert mockbot.db.get_nick_value('Foo', prefs.PREFS_KEY)['units'] == 'metric'
+
+
+def test_new_nick_deletes_nothing(mockbot, monkeypatch):
+    deleted = []
+    monkeypatch.setattr(mockbot.db, 'delete_nick_value', lambda *args: deleted.append(args))
+    prefs.get_prefs(mockbot, 'Newcomer')
+    assert deleted == []
+
+
+def test_cached_after_first_load(mockbot, monkeypatch):
+    prefs.set_prefs(mockbot, 'Foo', units='imperial')
+    mockbot.memory['lookoutside_prefs'].clear()
+
+    calls = []
+    get_nick_value = mockbot.db.get_nick_value
+
+    def counting_get_nick_value(*args, **kwargs):
+        calls.append(args)
+        return get_nick_value(*args, **kwargs)
+
+    monkeypatch.setattr(mockbot.db, 'get_nick_value', counting_get_nick_value)
+    for _ in range(5):
+        assert prefs.get_prefs(mockbot, 'foo')['units'] == 'imperial'
+
+    assert len(calls) == 1
+
+
+def test_missing_record_is_cached(mockbot, monkeypatch):
+    calls = []
+    get_nick_value = mockbot.db.get_nick_value
+
+    def counting_get_nick_value(*args, **kwargs):
+        calls.append(args)
+        return get_nick_value(*args, **kwargs)
+
+    monkeypatch.setattr(mockbot.db, 'get_nick_value', counting_get_nick_value)
+    for _ in range(5):
+        assert prefs.saved_prefs(mockbot, 'Lurker') is None
+    assert len(calls) == 2
+
+    # saving a record replaces the cached absence
+    prefs.set_prefs(mockbot, 'Lurker', location='Seattle, Washington, US')
+    assert prefs.saved_prefs(mockbot, 'lurker')['location'] == 'Seattle, Washington, US'
+
+
+def test_location_shared_with_other_plugins(mockbot):
+    mockbot.db.set_nick_value('Foo', 'location', 'Seattle, Washington, US')
+    prefs.set_prefs(mockbot, 'Foo', latitude='45.5', longitude='-122.7', location='Portland, Oregon, US')
+
+    assert mockbot.db.get_nick_value('Foo', 'latitude') == '45.5'
+    assert mockbot.db.get_nick_value('Foo', 'longitude') == '-122.7'
+    assert mockbot.db.get_nick_value('Foo', 'location') == 'Portland, Oregon, US'
+
+
+def test_weatherset_and_reset(mockbot, command):
+    prefs.set_prefs(mockbot, 'Foo', location='Seattle, Washington, US')
+
+    command(lookoutside.weather_set, '.weatherset units metric', target='Sopel')
+    command(lookoutside.weather_set, '.weatherset wind false', target='Sopel')
+    record = prefs.get_prefs(mockbot, 'Foo')
+    assert record['units'] == 'metric'
+    assert record['show_wind'] is False
+
+    command(lookoutside.weather_set, '.weatherset reset true', target='Sopel')
+    record = prefs.get_prefs(mockbot, 'Foo')
+    assert record['units'] is None
+    assert record['show_wind'] is True
+    assert record['location'] == 'Seattle, Washington, US'
@@ -0,0 +1,65 @@
+# coding=utf-8
+"""Tests for the provider registry"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import subprocess
+import sys
+
+import pkg_resources
+import pytest
+
+from sopel_modules.lookoutside import providers
+
+
+class FakeEntryPoint(object):
+    def __init__(self, provider):
+        self.provider = provider
+
+    def load(self):
+        return self.provider
+
+
+class Regional(providers.Provider):
+    name = 'regional'
+    capabilities = frozenset(['weather'])
+
+    def weather(self, bot, latitude, longitude, location):
+        return {'location': location}
+
+
+def test_builtin_capabilities():
+    assert providers.get_provider('openweathermap', 'forecast').hourly is True
+    assert providers.get_provider('airnow', 'aqi').name == 'airnow'
+    assert providers.get_provider('locationiq', 'geocode').name == 'locationiq'
+
+
+def test_unsupported_capability():
+    with pytest.raises(Exception, match='Unsupported Provider'):
+        providers.get_provider('airnow', 'weather')
+
+
+def test_warms_configured_region_only(mockbot):
+    mockbot.config.weather.geocoords_region = 'eu'
+    assert providers.get_provider('locationiq').warm_urls(mockbot) == (
+        'https://eu1.locationiq.com/v1/search.php',)
+    assert providers.get_provider('airnow').warm_urls(mockbot) == providers.get_provider('airnow').urls
+
+
+def test_entry_point_provider(monkeypatch):
+    def iter_entry_points(group, name):
+        assert group == providers.ENTRY_POINT_GROUP
+        return [FakeEntryPoint(Regional())] if name == 'regional' else []
+
+    monkeypatch.setattr(pkg_resources, 'iter_entry_points', iter_entry_points)
+    monkeypatch.setattr(providers, '_loaded', {})
+
+    assert providers.get_provider('regional', 'weather').weather(None, 0, 0, 'Here') == {'location': 'Here'}
+    with pytest.raises(Exception, match='Unknown Provider'):
+        providers.get_provider('nowhere')
+
+
+def test_providers_imported_lazily():
+    code = ('import sys; import sopel_modules.lookoutside; '
+            'print([m for m in sys.modules if ".providers." in m])')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b'[]'
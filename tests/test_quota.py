@@ -0,0 +1,87 @@
+# coding=utf-8
+"""Tests for the provider quota governor"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import pytest
+import requests_mock
+
+from sopel_modules.lookoutside.quota import Quota
+from sopel_modules.lookoutside.transport import Transport
+
+
+class Clock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_bucket_refills():
+    clock = Clock()
+    quota = Quota(per_minute=2, clock=clock, sleep=clock.sleep)
+    assert quota.acquire() and quota.acquire()
+    assert not quota.acquire()
+    assert quota.rejected == 1
+
+    clock.now += 30
+    assert quota.acquire()
+    assert quota.remaining() == (0, None)
+
+
+def test_waits_briefly_for_a_token():
+    clock = Clock()
+    quota = Quota(per_minute=60, clock=clock, sleep=clock.sleep)
+    for _ in range(60):
+        quota.acquire()
+
+    assert quota.acquire(timeout=2)
+    assert clock.now == pytest.approx(1001.0)
+    assert not quota.acquire(timeout=0.5)
+
+
+def test_daily_budget_resets_at_midnight():
+    clock = Clock(86400 * 3 - 10)
+    quota = Quota(per_day=2, clock=clock, sleep=clock.sleep)
+    assert quota.acquire() and quota.acquire()
+    assert not quota.acquire(timeout=60)
+    assert not quota.spare()
+
+    clock.now += 20
+    assert quota.spare()
+    assert quota.remaining() == (None, 2)
+
+
+def test_transport_refuses_and_backs_off():
+    clock = Clock()
+    quota = Quota(per_minute=10, clock=clock, sleep=clock.sleep)
+    transport = Transport(quotas={'example': quota}, quota_wait=0)
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/data', status_code=429, headers={'Retry-After': '30'})
+        transport.get('example', 'https://api.example.com/data')
+        with pytest.raises(Exception, match='example request limit reached'):
+            transport.get('example', 'https://api.example.com/data')
+        # other providers are unaffected
+        transport.get('other', 'https://api.example.com/data')
+
+    assert m.call_count == 2
+
+
+def test_daily_use_survives_restart():
+    clock = Clock()
+    quota = Quota(per_day=2, clock=clock, sleep=clock.sleep)
+    quota.acquire()
+    state = quota.dump()
+
+    restarted = Quota(per_day=2, clock=clock, sleep=clock.sleep)
+    restarted.load(state)
+    assert restarted.remaining() == (None, 1)
+
+    # yesterday's count is not carried over
+    clock.now += 24 * 60 * 60
+    tomorrow = Quota(per_day=2, clock=clock, sleep=clock.sleep)
+    tomorrow.load(state)
+    assert tomorrow.remaining() == (None, 2)
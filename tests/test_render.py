@@ -0,0 +1,65 @@
+# coding=utf-8
+"""Tests for the output renderers"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+from sopel_modules.lookoutside.prefs import DEFAULTS
+from sopel_modules.lookoutside.render import (
+    compile_weather, forecast_renderer, get_temp, get_wind, render_many, weather_renderer
+)
+
+SNAPSHOT = {
+    'location': 'Seattle, Washington, US',
+    'temp': 12.3,
+    'condition': 'Rain',
+    'humidity': 0.81,
+    'wind': {'speed': 4.6, 'bearing': 200},
+    'sunrise': '07:31 AM',
+    'sunset': '06:17 PM',
+}
+
+
+def test_wind_tables():
+    assert get_wind('both', 0.2, 0) == 'Calm 0.2 m/s (0 mph) (↓)'
+    assert get_wind('imperial', 0.6, 22.5) == 'Light air 1 mph (↓)'
+    assert get_wind('imperial', 0.6, 23) == 'Light air 1 mph (↙)'
+    assert get_wind('imperial', 10.8, 337) == 'Fresh breeze 24 mph (↘)'
+    assert get_wind('imperial', 11.4, 337.5) == 'Strong breeze 26 mph (↘)'
+    assert get_wind('imperial', 33, 338) == 'Hurricane 74 mph (↓)'
+
+
+def test_metric_wind_has_no_stray_paren():
+    assert get_wind('metric', 4.6, 200) == 'Gentle breeze 4.6 m/s (↑)'
+
+
+def test_temp_units():
+    assert get_temp('both', 12.3) == '12°C (54°F)'
+    assert get_temp('imperial', '-40') == '-40°F'
+    assert get_temp('metric', None) == 'unknown'
+
+
+def test_weather_renderer_per_profile():
+    prefs = dict(DEFAULTS, units='metric', show_humidity=False, show_sunriseset=False)
+    assert weather_renderer(prefs)(SNAPSHOT) == 'Seattle, Washington, US: 12°C, Rain, Gentle breeze 4.6 m/s (↑)'
+    assert weather_renderer(dict(DEFAULTS))(SNAPSHOT) == (
+        'Seattle, Washington, US: 12°C (54°F), Rain, Humidity: 81%, '
+        'Sunrise: 07:31 AM Sunset: 06:17 PM, Gentle breeze 4.6 m/s (10 mph) (↑)')
+
+    hits = compile_weather.cache_info().hits
+    assert weather_renderer(dict(prefs)) is weather_renderer(prefs)
+    assert compile_weather.cache_info().hits == hits + 2
+
+
+def test_render_many():
+    render = weather_renderer(dict(DEFAULTS, show_condition=False), compact=True)
+    assert render_many(render, [SNAPSHOT, Exception('Unable to geocode')], ['seattle', 'atlantis']) == [
+        'Seattle, Washington, US: 12°C (54°F)', 'atlantis: Unable to geocode']
+
+
+def test_forecast_renderer():
+    data = {'location': 'Seattle', 'data': [
+        {'dow': 'Saturday', 'summary': 'Rain', 'high_temp': 14, 'low_temp': 8},
+        {'dow': 'Sunday', 'summary': 'Clear', 'high_temp': 15, 'low_temp': 9},
+    ]}
+    prefs = dict(DEFAULTS, units='metric')
+    assert forecast_renderer(prefs)(data) == 'Seattle :: Saturday - Rain - 14°C / 8°C :: Sunday - Clear - 15°C / 9°C'
+    assert forecast_renderer(prefs, compact=True)(data) == 'Seattle: Sat Rain 14°C/8°C, Sun Clear 15°C/9°C'
@@ -0,0 +1,109 @@
+# coding=utf-8
+"""Tests for single-flight request coalescing"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from sopel_modules.lookoutside.engine import Engine
+from sopel_modules.lookoutside.singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, function, count):
+    """Start ``count`` callers for ``key`` and return (threads, results, errors)."""
+    results = []
+    errors = []
+
+    def caller():
+        try:
+            results.append(flight.do(key, function))
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=caller) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for_waiters(flight, count):
+    # spin until the followers have joined the in-flight call
+    while flight.shared < count:
+        threading.Event().wait(0.001)
+
+
+def test_concurrent_calls_share_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return 'sunny'
+
+    threads, results, errors = run_concurrently(flight, ('owm', 'x'), upstream, 4)
+    wait_for_waiters(flight, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ['sunny'] * 4
+    assert errors == []
+    assert (flight.calls, flight.shared) == (1, 3)
+
+
+def test_concurrent_calls_share_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def upstream():
+        release.wait(5)
+        raise Exception('Error: upstream down')
+
+    threads, results, errors = run_concurrently(flight, ('owm', 'x'), upstream, 3)
+    wait_for_waiters(flight, 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == []
+    assert [str(error) for error in errors] == ['Error: upstream down'] * 3
+
+
+def test_sequential_calls_are_not_shared():
+    flight = SingleFlight()
+    assert flight.do('k', lambda: 1) == 1
+    assert flight.do('k', lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do('k', int, 'x')
+    assert flight.shared == 0
+
+
+def test_coroutines_share_one_worker():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    engine = Engine(executor)
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def upstream():
+        release.wait(5)
+        return 'sunny'
+
+    async def callers():
+        waiting = asyncio.gather(*[flight.do_async(('owm', 'x'), engine, upstream) for _ in range(5)])
+        # the followers wait on the loop, so the second worker is still free
+        other = await flight.do_async(('owm', 'y'), engine, lambda: 'rain')
+        release.set()
+        return await waiting, other
+
+    try:
+        assert engine.run(callers(), timeout=5) == (['sunny'] * 5, 'rain')
+        assert (flight.calls, flight.shared) == (2, 4)
+    finally:
+        engine.stop()
+        executor.shutdown()
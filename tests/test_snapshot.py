@@ -0,0 +1,74 @@
+# coding=utf-8
+"""Tests for slotted snapshots and .hourly"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import time
+
+import pytest
+import requests_mock
+
+from sopel_modules.lookoutside import lookoutside
+from sopel_modules.lookoutside.providers.weather.openweathermap import (
+    forecast_view, hourly_view, onecall_snapshot, weather_view
+)
+from sopel_modules.lookoutside.snapshot import Conditions
+
+from conftest import ONECALL_SEATTLE, ONECALL_URL
+
+
+def with_hourly(start):
+    return dict(ONECALL_SEATTLE, hourly=[
+        {'dt': start + hour * 3600, 'temp': 12.0 - hour / 4.0, 'pop': 0.4 if hour < 6 else 0,
+         'weather': [{'id': 500, 'main': 'Rain' if hour < 6 else 'Clouds', 'description': ''}]}
+        for hour in range(48)
+    ])
+
+
+def test_snapshot_is_compact():
+    snapshot = onecall_snapshot(with_hourly(1602957600))
+    assert not hasattr(snapshot, '__dict__')
+    assert snapshot.hourly.times.typecode == 'q' and len(snapshot.hourly) == 48
+    assert snapshot.daily.lows[0] == 8.0
+    # repeated condition names are one string
+    assert snapshot.hourly.conditions[0] is snapshot.hourly.conditions[1]
+
+
+def test_views_read_like_dicts():
+    snapshot = onecall_snapshot(ONECALL_SEATTLE)
+    weather = weather_view(snapshot, 'Seattle, Washington, US')
+    assert weather['condition'] == weather.condition == 'Rain'
+    assert weather.get('age') is None and weather.get('missing', 1) == 1
+    with pytest.raises(KeyError):
+        weather['missing']
+    with pytest.raises(TypeError):
+        Conditions(missing=1)
+
+    forecast = forecast_view(snapshot, 'Seattle, Washington, US')
+    assert [day['high_temp'] for day in forecast['data']] == [14.0, 15.0, 16.0, 17.0]
+
+
+def test_hourly_view_starts_at_current_hour():
+    snapshot = onecall_snapshot(with_hourly(1602957600))
+    hourly = hourly_view(snapshot, 'Seattle', hours=24, step=3, now=1602957600 + 2 * 3600 + 600)
+    # 18:00 UTC is 11 AM in Seattle; two hours on is 1 PM
+    assert [hour['time'] for hour in hourly['data']] == ['1PM', '4PM', '7PM', '10PM', '1AM', '4AM', '7AM', '10AM']
+    assert hourly['data'][0]['summary'] == 'Rain'
+
+
+def test_hourly_command(mockbot, command):
+    lookoutside.set_prefs(mockbot, 'Foo', latitude='47.6038321', longitude='-122.3300624',
+                          location='Seattle, Washington, US', units='metric')
+    now = time.time()
+    with requests_mock.mock() as m:
+        m.get(ONECALL_URL, json=with_hourly(int(now - now % 3600)))
+        sent = command(lookoutside.hourly_command, '.hourly')
+        command(lookoutside.forecast_command, '.forecast')
+
+    # .forecast was answered from the same OneCall snapshot
+    assert m.call_count == 1
+    assert m.last_request.qs['exclude'] == ['minutely,alerts']
+    assert sent[-1].startswith('PRIVMSG #channel :Seattle, Washington, US: ')
+    hours = sent[-1].split('US: ', 1)[1].split(', ')
+    assert hours[0].endswith(' 12°C Rain (40%)')
+    assert hours[2].endswith(' 10°C Clouds')
+    assert len(hours) == 8
@@ -0,0 +1,44 @@
+# coding=utf-8
+"""Tests for the offline solar calculations and .sun"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import datetime
+
+import pytz
+
+from sopel_modules.lookoutside import lookoutside
+from sopel_modules.lookoutside.solar import sun_times
+from sopel_modules.lookoutside.timezones import format_time, remember_timezone
+
+
+def test_seattle_october():
+    sun = sun_times('47.6038', '-122.3301', datetime.date(2020, 10, 17))
+    tz = pytz.timezone('America/Los_Angeles')
+
+    # published times for that day: 7:32 AM and 6:16 PM
+    assert format_time(sun['sunrise'], tz) == '07:31 AM'
+    assert format_time(sun['sunset'], tz) == '06:17 PM'
+    assert sun['dawn'] < sun['sunrise'] < sun['noon'] < sun['sunset'] < sun['dusk']
+    assert 10 * 3600 < sun['day_length'] < 11 * 3600
+
+
+def test_polar_day_and_night():
+    summer = sun_times(78.2, 15.6, datetime.date(2020, 6, 21))
+    winter = sun_times(78.2, 15.6, datetime.date(2020, 12, 21))
+
+    assert (summer['polar'], summer['sunrise'], summer['day_length']) == ('day', None, 86400)
+    assert (winter['polar'], winter['sunset'], winter['day_length']) == ('night', None, 0)
+    assert format_time(winter['sunrise'], pytz.utc) == 'none'
+
+
+def test_sun_command_uses_learned_timezone(mockbot, command):
+    lookoutside.set_prefs(mockbot, 'Foo', latitude='47.6038', longitude='-122.3301',
+                          location='Seattle, Washington, US')
+    sent = command(lookoutside.sun_command, '.sun')
+    assert sent[-1].startswith('PRIVMSG #channel :Seattle, Washington, US: Dawn ')
+    assert sent[-1].endswith(' (UTC-8)')
+
+    remember_timezone(mockbot, '47.6038', '-122.3301', 'America/Los_Angeles')
+    sent = command(lookoutside.sun_command, '.sun')
+    assert 'm (UTC' not in sent[-1]
+    assert ', Day length ' in sent[-1]
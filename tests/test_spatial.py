@@ -0,0 +1,43 @@
+# coding=utf-8
+"""Tests for the nearest-point index"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import random
+
+import pytest
+
+from sopel_modules.lookoutside.spatial import GridIndex, distance_miles, in_boxes, parse_boxes
+
+
+def test_distance():
+    # Seattle to Portland, OR
+    assert 140 < distance_miles(47.6062, -122.3321, 45.5152, -122.6784) < 150
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(1)
+    points = [(rng.uniform(20, 65), rng.uniform(-170, -60), n) for n in range(2000)]
+    index = GridIndex(points)
+    assert len(index) == 2000
+
+    for _ in range(200):
+        latitude, longitude = rng.uniform(20, 65), rng.uniform(-170, -60)
+        distances = [(distance_miles(latitude, longitude, point[0], point[1]), point[2]) for point in points]
+        expected = min(distance for distance in distances if distance[0] <= 100) if any(
+            distance[0] <= 100 for distance in distances) else None
+        assert index.nearest(latitude, longitude, 100) == expected
+
+
+def test_nearest_across_antimeridian():
+    index = GridIndex([(52.0, 179.9, 'east'), (52.0, -150.0, 'far')])
+    assert index.nearest(52.0, -179.9, 50)[1] == 'east'
+
+
+def test_boxes():
+    boxes = parse_boxes('-125,45,-116,49; -80,40,-70,45')
+    assert in_boxes(boxes, '47.6', '-122.3')
+    assert not in_boxes(boxes, '34.05', '-118.24')
+    assert parse_boxes('') == []
+    assert in_boxes(parse_boxes('all'), 0, 0)
+    with pytest.raises(Exception, match='not a west,south,east,north box'):
+        parse_boxes('-125,45,-116')
@@ -0,0 +1,114 @@
+# coding=utf-8
+"""Tests for the shared HTTP transport"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import time
+
+import requests_mock
+
+from sopel_modules.lookoutside.httpcache import DiskCache, freshness
+from sopel_modules.lookoutside.transport import Transport
+
+
+def test_transport_timeouts():
+    transport = Transport(connect_timeout=1.5, read_timeout=4)
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/data', json={'ok': True})
+        r = transport.get('example', 'https://api.example.com/data', params={'q': 'x'})
+
+    assert r.json() == {'ok': True}
+    assert m.last_request.timeout == (1.5, 4)
+    assert m.last_request.qs == {'q': ['x']}
+
+
+def test_transport_reuses_session():
+    transport = Transport()
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/data', json={})
+        transport.get('example', 'https://api.example.com/data')
+        transport.get('example', 'https://api.example.com/data')
+
+    assert m.call_count == 2
+    assert transport.session.get_adapter('https://api.example.com') is \
+        transport.session.get_adapter('https://other.example.com')
+
+
+def test_disk_cache_survives_restart(tmpdir):
+    path = str(tmpdir.join('http.sqlite'))
+    transport = Transport(cache=DiskCache(path))
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/data', json={'ok': True})
+        transport.get('example', 'https://api.example.com/data', params={'key': 'secret'}, ttl=600)
+        transport.close()
+
+        # a new process, reading the same file
+        transport = Transport(cache=DiskCache(path))
+        r = transport.get('example', 'https://api.example.com/data', params={'key': 'secret'}, ttl=600)
+
+    assert m.call_count == 1
+    assert r.json() == {'ok': True}
+    assert r.expires > time.time()
+    assert (transport.cache.hits, transport.cache.misses) == (1, 0)
+    # the query string (and its API key) is only stored hashed
+    with open(path, 'rb') as stored:
+        assert b'secret' not in stored.read()
+
+
+def test_disk_cache_honors_upstream(tmpdir):
+    transport = Transport(cache=DiskCache(str(tmpdir.join('http.sqlite'))))
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/private', json={}, headers={'Cache-Control': 'no-store'})
+        m.get('https://api.example.com/short', json={}, headers={'Cache-Control': 'max-age=0'})
+        for _ in range(2):
+            transport.get('example', 'https://api.example.com/private', ttl=600)
+            transport.get('example', 'https://api.example.com/short', ttl=600)
+
+    assert m.call_count == 4
+    assert len(transport.cache) == 0
+
+
+def test_disk_cache_revalidates(tmpdir):
+    transport = Transport(cache=DiskCache(str(tmpdir.join('http.sqlite'))))
+
+    def conditional(request, context):
+        if request.headers.get('If-None-Match') == '"v1"':
+            context.status_code = 304
+            return ''
+        context.headers = {'ETag': '"v1"', 'Cache-Control': 'no-cache'}
+        return '{"version": 1}'
+
+    with requests_mock.mock() as m:
+        m.get('https://api.example.com/data', text=conditional)
+        transport.get('example', 'https://api.example.com/data')
+        r = transport.get('example', 'https://api.example.com/data')
+
+    assert m.call_count == 2
+    assert m.last_request.headers['If-None-Match'] == '"v1"'
+    assert r.status_code == 200 and r.json() == {'version': 1}
+    assert transport.cache.revalidated == 1
+
+
+def test_disk_cache_evicts_least_recently_used(tmpdir):
+    clock = [1000.0]
+    cache = DiskCache(str(tmpdir.join('http.sqlite')), max_bytes=350, clock=lambda: clock[0])
+    for name in ('a', 'b', 'c'):
+        clock[0] += 1
+        cache.set(name, {}, b'x' * 100, expires=clock[0] + 60)
+    clock[0] += 1
+    assert cache.get('a') is not None
+    clock[0] += 1
+    cache.set('d', {}, b'x' * 100, expires=clock[0] + 60)
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None and cache.get('d') is not None
+    assert cache.evictions == 1
+
+
+def test_freshness():
+    now = 1000000
+    assert freshness({'Cache-Control': 'public, max-age=300'}, now, 60) == now + 300
+    assert freshness({'Cache-Control': 'max-age=300', 'Age': '100'}, now) == now + 200
+    assert freshness({'Expires': 'Thu, 01 Jan 1970 12:00:00 GMT'}, now) == 12 * 3600
+    assert freshness({'Expires': '0'}, now) == now
+    assert freshness({'Cache-Control': 'private'}, now, 60) is None
+    assert freshness({}, now, 60) == now + 60